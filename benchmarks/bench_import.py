@@ -0,0 +1,113 @@
+"""Cold import time of yscreener, each run in a fresh interpreter.
+
+    python benchmarks/bench_import.py                   # fails over budget
+    python benchmarks/bench_import.py --top 20 --budget-scale 2
+    python benchmarks/bench_import.py -o base.json      # record a baseline
+    python benchmarks/bench_import.py --baseline base.json --headroom 0.5
+
+A case's time is the median over --repeat runs of the statement, timed
+in-process. The modules it imports and their self times come from
+python -X importtime, the startup imports (site, encodings) left out.
+
+The fixed budgets are loose enough for run-to-run variance on a typical
+machine. With --baseline, a case's budget is instead its time in an
+earlier -o output times 1 + --headroom (at least 5 ms over it), so a regression is measured
+against the same machine.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# name -> (statement, budget in ms)
+CASES = {
+    'package': ('import yscreener', 10),
+    'client': ('from yscreener import YahooFClient', 150),
+    'first client': ('from yscreener import YahooFClient; YahooFClient()', 160),
+}
+
+MIN_SLACK_MS = 5
+
+_TIMER = 'import time; _t = time.perf_counter(); {}; print(time.perf_counter() - _t)'
+
+
+def _python(args, importtime=False):
+    flags = ['-X', 'importtime'] if importtime else []
+    env = {**os.environ, 'PYTHONPATH': ROOT}
+    return subprocess.run([sys.executable, *flags, *args], capture_output=True, text=True, env=env, check=True)
+
+
+def _importtime(stderr):
+    # module -> self time in us
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(self_us)
+    return modules
+
+
+def run_case(statement, repeat):
+    startup = _importtime(_python(['-c', 'pass'], importtime=True).stderr)
+    seconds = [float(_python(['-c', _TIMER.format(statement)]).stdout) for _ in range(repeat)]
+    modules = _importtime(_python(['-c', statement], importtime=True).stderr)
+    modules = {name: us for name, us in modules.items() if name not in startup}
+    return {
+        'statement': statement,
+        'ms': statistics.median(seconds) * 1000,
+        'modules': len(modules),
+        'top': sorted(modules.items(), key=lambda item: -item[1]),
+    }
+
+
+def load_budgets(path, headroom):
+    with open(path) as f:
+        cases = json.load(f)['cases']
+    # a few ms of slack too, or sub-ms cases fail on noise
+    return {name: max(case['ms'] * (1 + headroom), case['ms'] + MIN_SLACK_MS) for name, case in cases.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=9)
+    parser.add_argument('--top', type=int, default=10, help='slowest modules listed per case')
+    parser.add_argument('--budget-scale', type=float, default=1.0, help='multiplies every budget, for slow machines')
+    parser.add_argument('--baseline', help='an earlier -o output to take the budgets from')
+    parser.add_argument('--headroom', type=float, default=0.5, help='allowed slowdown over the baseline, as a fraction')
+    parser.add_argument('-o', '--output')
+    args = parser.parse_args()
+
+    budgets = {name: budget for name, (_, budget) in CASES.items()}
+    if args.baseline:
+        budgets.update(load_budgets(args.baseline, args.headroom))
+
+    results = {}
+    failures = []
+    for name, (statement, _) in CASES.items():
+        result = run_case(statement, args.repeat)
+        result['budget_ms'] = budgets[name] * args.budget_scale
+        results[name] = result
+        over = result['ms'] > result['budget_ms']
+        print(f"{name:<14} {result['ms']:7.1f} ms  budget {result['budget_ms']:6.1f} ms  "
+              f"{result['modules']:>4} modules  {'OVER' if over else 'ok'}")
+        for module, us in result['top'][:args.top]:
+            print(f'    {us / 1000:7.2f} ms  {module}')
+        if over:
+            failures.append(name)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'created': time.time(), 'python': sys.version, 'cases': results}, f, indent=2)
+    for name in failures:
+        print('FAIL', name, 'over budget')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
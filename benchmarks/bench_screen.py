@@ -0,0 +1,344 @@
+"""End-to-end benchmark of YahooFClient.screen() against the mock server.
+
+    python benchmarks/bench_screen.py run [-o results.json]
+    python benchmarks/bench_screen.py compare base.json new.json
+    python benchmarks/bench_screen.py chunks [--tickers 1000 5000]
+
+The mock server runs in its own process and so does every benchmark case,
+so CPU time and peak RSS are the client's alone.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Response modes are server profiles
+MODES = {
+    'local': {},
+    'wan': {'latency': 0.02, 'jitter': 0.01},
+    'faulty': {'latency': 0.02, 'jitter': 0.01, 'rate_429': 0.02, 'retry_after': 0.05, 'crumb_ttl': 2.0},
+}
+SIZES = (100, 1_000, 10_000, 60_000)
+CONCURRENCY = (1, 4)
+UNIVERSE_SIZE = 60_000
+
+# relative change counted as a regression by compare
+TOLERANCE = 0.10
+# IN_CHUNK_SIZE values and 'ticker in [...]' list lengths of the chunks sweep
+CHUNK_SIZES = (25, 50, 100, 150, 250, 500, 1000)
+IN_LIST_SIZES = (1_000, 5_000)
+
+
+def _serve(config, sizes, queue):
+    from yscreener.mock_server import MockYahooServer
+
+    async def main():
+        server = MockYahooServer(n_records=UNIVERSE_SIZE, **config)
+        await server.start()
+        caps = sorted((r['marketCap']['raw'] for r in server.records), reverse=True)
+        # the smallest market cap of the size largest, screening for
+        # intradaymarketcap >= it selects exactly size records
+        queue.put((server.url, {size: caps[size - 1] for size in sizes}))
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values) + 0.5) - 1))]
+
+
+def _peak_rss():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def _run_case(url, query, concurrency, repeat, queue):
+    from aiohttp import ClientSession, TraceConfig
+
+    from yscreener import YahooFClient
+
+    async def main():
+        n_requests = 0
+
+        async def on_request_end(session, context, params):
+            nonlocal n_requests
+            if params.method == 'POST':
+                n_requests += 1
+
+        trace = TraceConfig()
+        trace.on_request_end.append(on_request_end)
+        client = YahooFClient(base_url=url)
+        async with ClientSession(trace_configs=[trace]) as session:
+            # cookie and crumb outside the measurement
+            await client.count(session, query)
+            n_requests = 0
+
+            latencies = []
+            n_records = 0
+
+            async def screen():
+                start = time.perf_counter()
+                rv = await client.screen(session, query)
+                latencies.append(time.perf_counter() - start)
+                return len(rv)
+
+            cpu = time.process_time()
+            wall = time.perf_counter()
+            for _ in range(repeat):
+                n_records += sum(await asyncio.gather(*(screen() for _ in range(concurrency))))
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+
+        return {
+            'records': n_records,
+            'requests': n_requests,
+            'seconds': wall,
+            'records_per_s': n_records / wall,
+            'requests_per_s': n_requests / wall,
+            'p50': _percentile(latencies, 50),
+            'p95': _percentile(latencies, 95),
+            'p99': _percentile(latencies, 99),
+            'cpu_per_1k_records': cpu / n_records * 1000 if n_records else None,
+            'peak_rss': _peak_rss(),
+        }
+
+    queue.put(asyncio.run(main()))
+
+
+def _run_chunk_case(url, lists, chunk_size, queue):
+    from aiohttp import ClientSession, TraceConfig
+
+    from yscreener import YahooFClient
+
+    async def main():
+        n_requests = 0
+        n_bytes = 0
+
+        async def on_request_chunk_sent(session, context, params):
+            nonlocal n_requests, n_bytes
+            if params.method == 'POST':
+                n_requests += 1
+                n_bytes = max(n_bytes, len(params.chunk))
+
+        trace = TraceConfig()
+        trace.on_request_chunk_sent.append(on_request_chunk_sent)
+        client = YahooFClient(base_url=url)
+        client.IN_CHUNK_SIZE = chunk_size
+        async with ClientSession(trace_configs=[trace]) as session:
+            await client.count(session, 'intradaymarketcap > 0')
+            n_requests = 0
+
+            latencies = []
+            # a different list each time, the server caches screened queries
+            for tickers in lists:
+                query = {"operator": "or", "operands": [
+                    {"operator": "eq", "operands": ["ticker", ticker]} for ticker in tickers
+                ]}
+                start = time.perf_counter()
+                rv = await client.screen(session, query)
+                latencies.append(time.perf_counter() - start)
+                assert len(rv) == len(tickers), (len(rv), len(tickers))
+
+        return {
+            'requests': n_requests / len(lists),
+            'max_request_bytes': n_bytes,
+            'p50': _percentile(latencies, 50),
+            'seconds': sum(latencies) / len(latencies),
+        }
+
+    queue.put(asyncio.run(main()))
+
+
+def chunks(args):
+    """Screen time of 'ticker in [...]' lists per IN_CHUNK_SIZE."""
+    from yscreener.mock_server import synthetic_universe
+
+    tickers = [r['ticker'] for r in synthetic_universe(UNIVERSE_SIZE)]
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+    for mode in args.modes:
+        queue = ctx.Queue()
+        server = ctx.Process(target=_serve, args=(MODES[mode], (1,), queue), daemon=True)
+        server.start()
+        try:
+            url, _ = queue.get(timeout=120)
+            for n_tickers in args.tickers:
+                for chunk_size in args.chunk_sizes:
+                    step = UNIVERSE_SIZE // (args.repeat * n_tickers) or 1
+                    lists = [tickers[i * n_tickers * step:(i + 1) * n_tickers * step:step] for i in range(args.repeat)]
+                    case = ctx.Process(target=_run_chunk_case, args=(url, lists, chunk_size, queue))
+                    case.start()
+                    result = queue.get()
+                    case.join()
+                    result = {'mode': mode, 'tickers': n_tickers, 'chunk_size': chunk_size, **result}
+                    results.append(result)
+                    print(
+                        f"{mode:>6} {n_tickers:>5} tickers chunk {chunk_size:>5}: "
+                        f"{result['seconds'] * 1000:8.1f} ms {result['requests']:6.1f} req "
+                        f"largest request {result['max_request_bytes'] / 1024:7.1f} KiB"
+                    )
+        finally:
+            server.terminate()
+            server.join()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'commit': _git_commit(), 'created': time.time(), 'results': results}, f, indent=2)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+    for mode in args.modes:
+        queue = ctx.Queue()
+        server = ctx.Process(target=_serve, args=(MODES[mode], args.sizes, queue), daemon=True)
+        server.start()
+        try:
+            url, thresholds = queue.get(timeout=120)
+            for size in args.sizes:
+                query = {"operator": "gte", "operands": ["intradaymarketcap", thresholds[size]]}
+                for concurrency in args.concurrency:
+                    case = ctx.Process(target=_run_case, args=(url, query, concurrency, args.repeat, queue))
+                    case.start()
+                    result = queue.get()
+                    case.join()
+                    result = {'mode': mode, 'size': size, 'concurrency': concurrency, **result}
+                    results.append(result)
+                    print(
+                        f"{mode:>6} {size:>6} rows x{concurrency}: "
+                        f"{result['records_per_s']:>9.0f} rec/s {result['requests_per_s']:>6.1f} req/s "
+                        f"p50 {result['p50'] * 1000:7.1f} ms p95 {result['p95'] * 1000:7.1f} ms "
+                        f"p99 {result['p99'] * 1000:7.1f} ms "
+                        f"cpu {result['cpu_per_1k_records'] * 1000:6.2f} ms/1k "
+                        f"rss {(result['peak_rss'] or 0) / 2**20:6.1f} MiB"
+                    )
+        finally:
+            server.terminate()
+            server.join()
+
+    doc = {
+        'commit': _git_commit(),
+        'created': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'results': results,
+    }
+    output = args.output or f'bench-{doc["commit"] or "unknown"}.json'
+    with open(output, 'w') as f:
+        json.dump(doc, f, indent=2)
+    print(f'saved {output}')
+
+
+# metric: True if higher is better
+_METRICS = {
+    'records_per_s': True,
+    'requests_per_s': True,
+    'p50': False,
+    'p95': False,
+    'p99': False,
+    'cpu_per_1k_records': False,
+    'peak_rss': False,
+}
+
+
+def compare(args):
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    def key(r):
+        return r['mode'], r['size'], r['concurrency']
+
+    base_results = {key(r): r for r in base['results']}
+    regressions = 0
+    print(f"{base['commit']} -> {new['commit']}")
+    for r in new['results']:
+        b = base_results.get(key(r))
+        if b is None:
+            continue
+        changes = []
+        for metric, higher_is_better in _METRICS.items():
+            if not b.get(metric) or r.get(metric) is None:
+                continue
+            change = r[metric] / b[metric] - 1
+            worse = -change if higher_is_better else change
+            flag = ''
+            if worse > args.tolerance:
+                flag = '!'
+                regressions += 1
+            changes.append(f'{metric} {change:+.1%}{flag}')
+        print(f"{r['mode']:>6} {r['size']:>6} rows x{r['concurrency']}: " + ', '.join(changes))
+    print(f'{regressions} regression(s) beyond {args.tolerance:.0%}')
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('run')
+    p.add_argument('-o', '--output')
+    p.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES))
+    p.add_argument('--sizes', nargs='+', type=int, default=list(SIZES))
+    p.add_argument('--concurrency', nargs='+', type=int, default=list(CONCURRENCY))
+    p.add_argument('--repeat', type=int, default=3)
+
+    p = commands.add_parser('chunks')
+    p.add_argument('-o', '--output')
+    p.add_argument('--modes', nargs='+', default=['local', 'wan'], choices=list(MODES))
+    p.add_argument('--tickers', nargs='+', type=int, default=list(IN_LIST_SIZES))
+    p.add_argument('--chunk-sizes', nargs='+', type=int, default=list(CHUNK_SIZES))
+    p.add_argument('--repeat', type=int, default=3)
+
+    p = commands.add_parser('compare')
+    p.add_argument('base')
+    p.add_argument('new')
+    p.add_argument('--tolerance', type=float, default=TOLERANCE)
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        if max(args.sizes) > UNIVERSE_SIZE:
+            parser.error(f'sizes are limited to {UNIVERSE_SIZE}')
+        run(args)
+        return 0
+    if args.command == 'chunks':
+        if max(args.tickers) * args.repeat > UNIVERSE_SIZE:
+            parser.error(f'tickers times repeat is limited to {UNIVERSE_SIZE}')
+        chunks(args)
+        return 0
+    return compare(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""Load generator: many YahooFClients on one event loop against the mock server.
+
+    python benchmarks/loadgen.py --clients 50 100 200 500 --screens 4
+    python benchmarks/loadgen.py --arrival poisson --rate 0.5 -o load.json
+    python benchmarks/loadgen.py --baseline load.json       # regression gate
+
+Every step runs N clients with M screens each, and reports throughput,
+screen latency, event loop lag and memory per client. The saturation point
+is the step with the highest throughput whose p95 latency stays within
+--slo times the p95 of the first step.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_screen import MODES, _git_commit, _percentile, _serve
+
+# rows selected by the screens of the mix, one of them per screen
+SCREEN_SIZES = (50, 250, 1_000, 2_500)
+TOLERANCE = 0.10
+
+
+def _rss():
+    # current resident set size, Linux only
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+async def _monitor_loop(lags, interval=0.01):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - start - interval)
+
+
+async def _step(url, queries, n_clients, args, rng):
+    from aiohttp import ClientSession, TCPConnector, TraceConfig
+
+    from yscreener import YahooFClient
+
+    n_requests = 0
+
+    async def on_request_end(session, context, params):
+        nonlocal n_requests
+        n_requests += 1
+
+    def new_session():
+        trace = TraceConfig()
+        trace.on_request_end.append(on_request_end)
+        return ClientSession(connector=TCPConnector(limit=args.connector_limit), trace_configs=[trace])
+
+    rss = _rss()
+    clients = [YahooFClient(base_url=url) for _ in range(n_clients)]
+    if args.session_per_client:
+        sessions = [new_session() for _ in clients]
+    else:
+        sessions = [new_session()] * n_clients
+
+    latencies = []
+    lags = []
+    n_records = 0
+    n_errors = 0
+
+    async def run_client(client, session, seed):
+        nonlocal n_records, n_errors
+        client_rng = random.Random(seed)
+        for i in range(args.screens):
+            if args.arrival == 'poisson':
+                await asyncio.sleep(client_rng.expovariate(args.rate))
+            elif args.arrival == 'uniform':
+                # spread the clients over the first interval
+                await asyncio.sleep((client_rng.random() if i == 0 else 1) / args.rate)
+            start = time.perf_counter()
+            try:
+                rv = await client.screen(session, client_rng.choice(queries))
+            except Exception:
+                n_errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            n_records += len(rv)
+
+    monitor = asyncio.ensure_future(_monitor_loop(lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        run_client(client, session, rng.random())
+        for client, session in zip(clients, sessions)
+    ))
+    seconds = time.perf_counter() - start
+    monitor.cancel()
+    rss_after = _rss()
+    for session in set(sessions):
+        await session.close()
+
+    n_screens = len(latencies)
+    return {
+        'clients': n_clients,
+        'offered_per_s': None if args.arrival == 'closed' else n_clients * args.rate,
+        'screens': n_screens,
+        'errors': n_errors,
+        'requests': n_requests,
+        'seconds': seconds,
+        'screens_per_s': n_screens / seconds,
+        'records_per_s': n_records / seconds,
+        'requests_per_s': n_requests / seconds,
+        'p50': _percentile(latencies, 50),
+        'p95': _percentile(latencies, 95),
+        'p99': _percentile(latencies, 99),
+        'loop_lag_p99': _percentile(lags, 99),
+        'loop_lag_max': max(lags) if lags else None,
+        'rss_per_client': (rss_after - rss) / n_clients if rss is not None else None,
+    }
+
+
+def saturation(steps, slo):
+    """Step with the highest throughput whose p95 is within slo x the first step's."""
+    if not steps or steps[0]['p95'] is None:
+        return None
+    limit = slo * steps[0]['p95']
+    within = [s for s in steps if s['p95'] is not None and s['p95'] <= limit]
+    return max(within, key=lambda s: s['screens_per_s']) if within else None
+
+
+def run(args, url, thresholds):
+    queries = [
+        {"operator": "gte", "operands": ["intradaymarketcap", thresholds[size]]}
+        for size in SCREEN_SIZES
+    ]
+    rng = random.Random(args.seed)
+    steps = []
+    for n_clients in args.clients:
+        step = asyncio.run(_step(url, queries, n_clients, args, rng))
+        steps.append(step)
+        print(
+            f"{n_clients:>5} clients: {step['screens_per_s']:7.1f} screens/s "
+            f"{step['requests_per_s']:7.1f} req/s p50 {step['p50'] * 1000:7.1f} ms "
+            f"p95 {step['p95'] * 1000:7.1f} ms p99 {step['p99'] * 1000:7.1f} ms "
+            f"lag p99 {step['loop_lag_p99'] * 1000:6.1f} ms "
+            f"{(step['rss_per_client'] or 0) / 1024:7.1f} KiB/client {step['errors']} errors"
+        )
+    return steps
+
+
+def gate(result, baseline, tolerance):
+    failures = []
+    cur, base = result['saturation'], baseline['saturation']
+    if cur is None:
+        failures.append('no step within the latency SLO')
+    elif base is not None:
+        if cur['screens_per_s'] < base['screens_per_s'] * (1 - tolerance):
+            failures.append(
+                f"saturation throughput {cur['screens_per_s']:.1f} < {base['screens_per_s']:.1f} screens/s"
+            )
+        if cur['p95'] > base['p95'] * (1 + tolerance):
+            failures.append(f"p95 at saturation {cur['p95'] * 1000:.1f} > {base['p95'] * 1000:.1f} ms")
+    if any(s['errors'] for s in result['steps']):
+        failures.append('screens failed')
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', nargs='+', type=int, default=[50, 100, 200, 500])
+    parser.add_argument('--screens', type=int, default=4, help='screens per client')
+    parser.add_argument('--arrival', choices=('closed', 'poisson', 'uniform'), default='closed')
+    parser.add_argument('--rate', type=float, default=1.0, help='screens/s per client, poisson and uniform')
+    parser.add_argument('--mode', choices=list(MODES), default='wan')
+    parser.add_argument('--connector-limit', type=int, default=100)
+    parser.add_argument('--session-per-client', action='store_true')
+    parser.add_argument('--slo', type=float, default=3.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    server = ctx.Process(target=_serve, args=(MODES[args.mode], SCREEN_SIZES, queue), daemon=True)
+    server.start()
+    try:
+        url, thresholds = queue.get(timeout=120)
+        steps = run(args, url, thresholds)
+    finally:
+        server.terminate()
+        server.join()
+
+    knee = saturation(steps, args.slo)
+    if knee is None:
+        print('saturated at every step')
+    else:
+        print(f"saturation: {knee['clients']} clients, {knee['screens_per_s']:.1f} screens/s")
+
+    result = {
+        'commit': _git_commit(),
+        'created': time.time(),
+        'args': vars(args),
+        'steps': steps,
+        'saturation': knee,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failures = gate(result, baseline, args.tolerance)
+        for failure in failures:
+            print('FAIL', failure)
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import asyncio
+import math
+import random
+
+import aiohttp
+import pytest
+
+from yscreener import YahooFClient
+from yscreener.aggregate import Aggregation, QuantileSketch
+from yscreener.mock_server import MockYahooServer
+from yscreener.screener_eval import raw_value
+
+QUANTILES = (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 0.999)
+
+
+def exact_quantile(values, q):
+    # the sketch returns the value of rank floor(q * (n - 1))
+    return sorted(values)[int(q * (len(values) - 1))]
+
+
+def assert_within(sketch, values, accuracy):
+    for q in QUANTILES:
+        exact = exact_quantile(values, q)
+        assert abs(sketch.quantile(q) - exact) <= accuracy * abs(exact) + 1e-12, q
+
+
+@pytest.mark.parametrize('accuracy', [0.01, 0.05])
+def test_quantiles_within_relative_accuracy(accuracy):
+    rng = random.Random(0)
+    values = [rng.lognormvariate(20, 2) for _ in range(20_000)]
+    values += [-rng.expovariate(1e-3) for _ in range(5_000)] + [0.0] * 100
+    sketch = QuantileSketch(accuracy)
+    for v in values:
+        sketch.add(v)
+    assert sketch.count == len(values)
+    assert sketch.quantile(0) == min(values) and sketch.quantile(1) == max(values)
+    assert_within(sketch, values, accuracy)
+
+
+def test_merged_sketches_answer_like_one():
+    rng = random.Random(1)
+    parts = [[rng.paretovariate(1.5) for _ in range(3000)] for _ in range(4)]
+    merged = QuantileSketch()
+    for part in parts:
+        sketch = QuantileSketch()
+        for v in part:
+            sketch.add(v)
+        merged.merge(sketch)
+    whole = QuantileSketch()
+    for v in sum(parts, []):
+        whole.add(v)
+    assert [merged.quantile(q) for q in QUANTILES] == [whole.quantile(q) for q in QUANTILES]
+    assert_within(merged, sum(parts, []), 0.01)
+    with pytest.raises(ValueError):
+        merged.merge(QuantileSketch(0.05))
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        QuantileSketch(0)
+    with pytest.raises(ValueError):
+        QuantileSketch().quantile(1.5)
+    assert QuantileSketch().quantile(0.5) is None
+    for spec in ('sum', 'p101(x)', 'avg(x)'):
+        with pytest.raises(ValueError):
+            Aggregation(aggregates=[spec])
+
+
+def test_aggregate_matches_the_records():
+    aggregates = ['count', 'count(beta)', 'sum(marketCap)', 'mean(beta)', 'min(beta)', 'max(marketCap)', 'p90(marketCap)']
+
+    async def main():
+        async with MockYahooServer(n_records=3000) as server, aiohttp.ClientSession() as session:
+            client = YahooFClient(base_url=server.url)
+            agg = await client.aggregate(session, 'region=="kr"', 'sector', aggregates)
+            records = await client.screen(session, 'region=="kr"')
+        return agg, records
+
+    agg, records = asyncio.run(main())
+    result = agg.result()
+    assert agg.n_records == len(records)
+    sectors = {r.get('sector') for r in records}
+    assert set(result) == sectors
+    for sector in sectors:
+        group = [r for r in records if r.get('sector') == sector]
+
+        def values(field):
+            rv = [raw_value(r.get(field)) for r in group]
+            return [v for v in rv if isinstance(v, (int, float)) and not isinstance(v, bool) and not math.isnan(v)]
+
+        row = result[sector]
+        caps, betas = values('marketCap'), values('beta')
+        assert row['count'] == len(group)
+        assert row['count(beta)'] == len(betas)
+        assert row['sum(marketCap)'] == pytest.approx(sum(caps))
+        assert row['mean(beta)'] == pytest.approx(sum(betas) / len(betas) if betas else None)
+        assert row['min(beta)'] == (min(betas) if betas else None)
+        assert row['max(marketCap)'] == (max(caps) if caps else None)
+        if caps:
+            exact = exact_quantile(caps, 0.9)
+            assert abs(row['p90(marketCap)'] - exact) <= 0.01 * exact
@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+from yscreener import bitmap as bitmap_module
+from yscreener.bitmap import Bitmap, SymbolIndex
+
+
+@pytest.fixture(params=['numpy', 'pure'])
+def backend(request, monkeypatch):
+    if request.param == 'pure':
+        monkeypatch.setattr(bitmap_module, 'np', None)
+    elif bitmap_module.np is None:
+        pytest.skip('numpy not installed')
+
+
+def random_sets(n, seed=0):
+    rng = random.Random(seed)
+    return [set(rng.sample(range(5000), rng.randint(0, 800))) for _ in range(n)]
+
+
+def test_set_algebra_matches_python_sets(backend):
+    sets = random_sets(6) + [set(), {0}, {4999}]
+    for a in sets:
+        for b in sets:
+            x, y = Bitmap.from_ids(a), Bitmap.from_ids(b)
+            assert (x & y).ids() == sorted(a & b)
+            assert (x | y).ids() == sorted(a | b)
+            assert (x - y).ids() == sorted(a - b)
+            assert (x ^ y).ids() == sorted(a ^ b)
+            assert len(x & y) == len(a & b)
+            assert (x == y) == (a == b)
+    assert Bitmap.union(*map(Bitmap.from_ids, sets)).ids() == sorted(set().union(*sets))
+    assert Bitmap.intersection(*map(Bitmap.from_ids, sets[:3])).ids() == sorted(sets[0] & sets[1] & sets[2])
+
+
+def test_membership_and_truth(backend):
+    bitmap = Bitmap.from_ids([3, 64, 3, 1000])
+    assert list(bitmap) == [3, 64, 1000]
+    assert 64 in bitmap and 65 not in bitmap
+    assert bitmap and not Bitmap.from_ids([])
+    assert len(Bitmap()) == 0 and Bitmap().ids() == []
+
+
+def test_bytes_and_file_round_trip(tmp_path):
+    for ids in random_sets(3, seed=1) + [set()]:
+        bitmap = Bitmap.from_ids(ids)
+        assert Bitmap.from_bytes(bitmap.to_bytes()) == bitmap
+    bitmap.save(tmp_path / 'a.bm')
+    assert Bitmap.load(tmp_path / 'a.bm') == bitmap
+
+
+def test_symbol_ids_are_stable_across_saves(tmp_path):
+    path = str(tmp_path / 'symbols.txt')
+    index = SymbolIndex(path)
+    a = index.bitmap_of([{'ticker': 'AAA'}, {'ticker': 'BBB'}, {'ticker': None}])
+    index.save()
+    b = index.bitmap(['BBB', 'CCC'])
+    index.save()
+
+    reloaded = SymbolIndex(path)
+    assert len(reloaded) == 3
+    assert [reloaded.id(s) for s in ('AAA', 'BBB', 'CCC')] == [0, 1, 2]
+    assert reloaded.symbols(a & b) == ['BBB']
+    assert reloaded.symbols(a | b) == ['AAA', 'BBB', 'CCC']
+    with pytest.raises(ValueError):
+        index.id('A\nB')
@@ -0,0 +1,29 @@
+import asyncio
+
+import aiohttp
+
+from yscreener import ScreenCache, YahooFClient
+from yscreener.mock_server import RECORD_KEYS, MockYahooServer
+
+
+def tickers(records):
+    return sorted(record['ticker'] for record in records)
+
+
+def test_narrower_screen_is_answered_by_the_cache():
+    async def main():
+        async with MockYahooServer(n_records=2000) as server, aiohttp.ClientSession() as session:
+            cache = ScreenCache(fields=RECORD_KEYS)
+            client = YahooFClient(base_url=server.url, cache=cache)
+            await client.screen(session, 'region=="us"')
+            served = server.stats['served']
+            narrow = 'region=="us" && intradaymarketcap > 1B && intradayprice < 50'
+            rv = await client.screen(session, narrow)
+            requests = server.stats['served'] - served
+            expected = await YahooFClient(base_url=server.url).screen(session, narrow)
+        return cache, rv, requests, expected
+
+    cache, rv, requests, expected = asyncio.run(main())
+    assert requests == 0
+    assert cache.subsumed == 1
+    assert expected and tickers(rv) == tickers(expected)
@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+import aiohttp
+import pytest
+
+from yscreener import Cassette, YahooFClient
+from yscreener.cassette import interaction_key
+from yscreener.mock_server import MockYahooServer
+
+EXPR = 'region=="kr" && intradaymarketcap > 100M'
+
+
+def record(path, **server_kwargs):
+    async def main():
+        async with MockYahooServer(n_records=12_000, **server_kwargs) as server, aiohttp.ClientSession() as session:
+            cassette = Cassette(path)
+            client = YahooFClient(base_url=server.url)
+            records = await client.screen(cassette.recorder(session), EXPR)
+            cassette.save()
+            return records, server.stats['served']
+
+    return asyncio.run(main())
+
+
+def replay(path, expr=EXPR):
+    # the mock server is gone, every response comes from the cassette
+    return asyncio.run(YahooFClient().screen(Cassette(path).player(), expr))
+
+
+def test_replay_returns_the_recorded_records(tmp_path):
+    path = str(tmp_path / 'kr.cassette.gz')
+    recorded, served = record(path)
+    assert len(recorded) > 250
+    assert len(Cassette(path)) >= served + 2   # cookie and crumb too
+    assert replay(path) == recorded
+    # the same screen written differently has the same key
+    assert replay(path, 'intradaymarketcap > 100M && region=="kr"') == recorded
+
+
+def test_responses_replay_in_recorded_order(tmp_path):
+    path = str(tmp_path / 'kr.cassette.gz')
+    recorded, _ = record(path, rate_429=0.3, seed=1)
+    statuses = [r['status'] for responses in Cassette(path).interactions.values() for r in responses]
+    assert 429 in statuses
+    assert replay(path) == recorded
+
+
+def test_unrecorded_request_fails(tmp_path):
+    path = str(tmp_path / 'kr.cassette.gz')
+    record(path)
+    with pytest.raises(KeyError):
+        replay(path, 'region=="jp"')
+
+
+def test_key_ignores_host_crumb_and_term_order():
+    a = {'offset': 0, 'size': 250, 'query': {'operator': 'and', 'operands': [
+        {'operator': 'eq', 'operands': ['region', 'kr']},
+        {'operator': 'gt', 'operands': ['intradaymarketcap', 1e8]},
+    ]}}
+    b = {**a, 'query': {**a['query'], 'operands': a['query']['operands'][::-1]}}
+    key = interaction_key('post', 'https://query1.example/v1/finance/screener?crumb=x', json.dumps(a))
+    assert key == interaction_key('POST', 'http://127.0.0.1:1/v1/finance/screener?crumb=y', json.dumps(b))
+    assert key != interaction_key('POST', '/v1/finance/screener', json.dumps({**a, 'offset': 250}))
+    assert interaction_key('GET', 'https://fc.yahoo.com/?x=1') == 'GET /'
@@ -0,0 +1,84 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from yscreener import CrawlCheckpoint, YahooFClient
+from yscreener.checkpoint import crawl_fingerprint
+from yscreener.mock_server import MockYahooServer
+
+EXPR = 'region=="us"'
+
+
+def test_resume_fetches_only_missing_pages(tmp_path):
+    async def main():
+        async with MockYahooServer(n_records=5000, drop_after=3) as server:
+            client = YahooFClient(base_url=server.url, checkpoint=CrawlCheckpoint(str(tmp_path / 'crawl.db')))
+            async with aiohttp.ClientSession() as session:
+                with pytest.raises(aiohttp.ClientPayloadError):
+                    await client.screen(session, EXPR)
+                assert server.stats['dropped'] == 1
+
+                server.drop_after = None
+                served = server.stats['served']
+                rv = await client.screen(session, EXPR)
+                refetched = server.stats['served'] - served
+
+                expected = await YahooFClient(base_url=server.url).screen(session, EXPR)
+        n_pages = -(-len(expected) // YahooFClient.MAX_ITEM)
+        assert n_pages > 3
+        assert refetched == n_pages - 3
+        assert rv == expected
+
+    asyncio.run(main())
+
+
+def test_completed_crawl_is_discarded(tmp_path):
+    async def main():
+        checkpoint = CrawlCheckpoint(str(tmp_path / 'crawl.db'))
+        async with MockYahooServer(n_records=2000) as server:
+            client = YahooFClient(base_url=server.url, checkpoint=checkpoint)
+            async with aiohttp.ClientSession() as session:
+                first = await client.screen(session, EXPR)
+                served = server.stats['served']
+                second = await client.screen(session, EXPR)
+                # nothing left to resume, the crawl runs in full again
+                assert server.stats['served'] - served == -(-len(first) // YahooFClient.MAX_ITEM)
+        assert first == second
+
+    asyncio.run(main())
+
+
+def test_changed_result_fails_the_resume(tmp_path):
+    async def main():
+        async with MockYahooServer(n_records=5000, drop_after=3) as server:
+            client = YahooFClient(base_url=server.url, checkpoint=CrawlCheckpoint(str(tmp_path / 'crawl.db')))
+            async with aiohttp.ClientSession() as session:
+                with pytest.raises(aiohttp.ClientPayloadError):
+                    await client.screen(session, EXPR)
+
+                # records leave the result, the saved pages don't fit the new one
+                server.drop_after = None
+                server.set_records([r for r in server.records if not r['ticker'].startswith('S000')])
+                with pytest.raises(Exception, match='Result changed while crawling'):
+                    await client.screen(session, EXPR)
+
+                rv = await client.screen(session, EXPR)
+                expected = await YahooFClient(base_url=server.url).screen(session, EXPR)
+        assert rv == expected
+
+    asyncio.run(main())
+
+
+def test_short_pages_are_not_saved(tmp_path):
+    async def main():
+        # the server answers fewer records than asked for
+        async with MockYahooServer(n_records=2000, max_size=100) as server:
+            checkpoint = CrawlCheckpoint(str(tmp_path / 'crawl.db'))
+            client = YahooFClient(base_url=server.url, checkpoint=checkpoint)
+            async with aiohttp.ClientSession() as session:
+                with pytest.raises(Exception, match='Short first page'):
+                    await client.screen(session, EXPR)
+        assert checkpoint.load(crawl_fingerprint(client._to_query(EXPR), {})) == (None, {})
+
+    asyncio.run(main())
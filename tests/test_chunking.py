@@ -0,0 +1,96 @@
+import asyncio
+
+import aiohttp
+
+from yscreener import YahooFClient
+from yscreener.mock_server import MockYahooServer
+
+
+def tickers(records):
+    return sorted(record['ticker'] for record in records)
+
+
+def in_list(values):
+    return 'ticker in [' + ', '.join(f'"{v}"' for v in values) + ']'
+
+
+def in_flight_counter():
+    state = {'now': 0, 'max': 0}
+
+    async def start(session, context, params):
+        if params.method == 'POST':
+            state['now'] += 1
+            state['max'] = max(state['max'], state['now'])
+
+    async def end(session, context, params):
+        if params.method == 'POST':
+            state['now'] -= 1
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(start)
+    trace_config.on_request_end.append(end)
+    trace_config.on_request_exception.append(end)
+    return trace_config, state
+
+
+def test_long_in_list_is_chunked():
+    async def main():
+        async with MockYahooServer(n_records=2000) as server, aiohttp.ClientSession() as session:
+            client = YahooFClient(base_url=server.url)
+            wanted = [record['ticker'] for record in server.records[:600]]
+            expr = in_list(wanted) + ' && intradaymarketcap > 0'
+
+            rv = await client.screen(session, expr)
+            served = server.stats['served']
+            n = await client.count(session, expr)
+            n_count_requests = server.stats['served'] - served
+        return wanted, rv, served, n, n_count_requests
+
+    wanted, rv, served, n, n_count_requests = asyncio.run(main())
+    chunks = -(-len(wanted) // YahooFClient.IN_CHUNK_SIZE)
+    assert chunks > 1
+    assert tickers(rv) == sorted(wanted)
+    # one page per chunk, the chunks' counts add up
+    assert served == chunks
+    assert n == len(wanted)
+    assert n_count_requests == chunks
+
+
+def test_requests_in_flight_stay_within_max_concurrency():
+    async def main():
+        async with MockYahooServer(n_records=20000, latency=0.01) as server:
+            trace_config, state = in_flight_counter()
+            client = YahooFClient(base_url=server.url)
+            all_tickers = [record['ticker'] for record in server.records]
+            # chunked lists and multi-page screens, all at once
+            exprs = [in_list(all_tickers[i * 600:(i + 1) * 600]) for i in range(3)]
+            exprs += ['region=="us"', 'region=="jp"']
+            async with aiohttp.ClientSession(trace_configs=[trace_config]) as session:
+                rv = await client.screen_many(session, exprs)
+        return rv, state
+
+    rv, state = asyncio.run(main())
+    assert [len(r) for r in rv[:3]] == [600] * 3
+    assert state['max'] == YahooFClient.MAX_CONCURRENCY
+
+
+def test_chunked_screen_keeps_the_sort_order():
+    async def main():
+        async with MockYahooServer(n_records=2000) as server, aiohttp.ClientSession() as session:
+            client = YahooFClient(base_url=server.url)
+            # chunks of interleaved symbols, each sorted on its own
+            wanted = [record['ticker'] for record in server.records[:900]]
+            rv = []
+            for opt in ({}, {'sortField': 'intradayprice', 'sortType': 'asc'}, {'sortField': 'beta'}):
+                chunked = await client.screen(session, in_list(wanted), opt)
+                whole = YahooFClient(base_url=server.url)
+                whole.IN_CHUNK_SIZE = len(wanted)
+                whole.MAX_ITEM = server.max_size = len(wanted)
+                expected = await whole.screen(session, in_list(wanted), opt)
+                server.max_size = YahooFClient.MAX_ITEM
+                rv.append((chunked, expected))
+        return rv
+
+    for chunked, expected in asyncio.run(main()):
+        assert len(chunked) == 900
+        assert [r['ticker'] for r in chunked] == [r['ticker'] for r in expected]
@@ -0,0 +1,42 @@
+import asyncio
+import copy
+
+import aiohttp
+
+from yscreener import YahooFClient
+from yscreener.mock_server import MockYahooServer
+
+
+def tickers(records):
+    return sorted(record['ticker'] for record in records)
+
+
+def test_screen_delta_reports_entries_exits_and_moves():
+    fields = ['regularMarketPrice']
+
+    async def main():
+        async with MockYahooServer(n_records=2000) as server, aiohttp.ClientSession() as session:
+            client = YahooFClient(base_url=server.url)
+            expr = 'region=="kr"'
+            first = await client.screen_delta(session, expr, fields, rtol=0.01)
+            unchanged = await client.screen_delta(session, expr, fields, rtol=0.01)
+
+            records = copy.deepcopy(server.records)
+            kr = [r for r in records if r['region'] == 'kr']
+            gone, small, large, joined = kr[0], kr[1], kr[2], next(r for r in records if r['region'] != 'kr')
+            records.remove(gone)
+            small['regularMarketPrice']['raw'] *= 1.005
+            large['regularMarketPrice']['raw'] *= 1.05
+            joined['region'] = 'kr'
+            server.set_records(records)
+
+            delta = await client.screen_delta(session, expr, fields, rtol=0.01)
+        return first, unchanged, delta, gone, large, joined, len(kr)
+
+    first, unchanged, delta, gone, large, joined, n_kr = asyncio.run(main())
+    assert len(first.added) == n_kr and not first.removed and not first.changed
+    assert not unchanged
+    assert tickers(delta.added) == [joined['ticker']]
+    assert tickers(delta.removed) == [gone['ticker']]
+    # the 0.5% move is within rtol
+    assert tickers(delta.changed) == [large['ticker']]
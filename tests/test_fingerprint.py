@@ -0,0 +1,46 @@
+import random
+
+import pytest
+
+from yscreener import YahooFClient
+from yscreener.fingerprint import BROWSER_TYPES, header_profile, random_user_agent
+
+
+@pytest.mark.parametrize('browser_type', BROWSER_TYPES)
+def test_profile_is_shared_and_read_only(browser_type):
+    profile = header_profile(browser_type)
+    assert header_profile(browser_type) is profile
+    assert profile.browser_type == browser_type
+    for headers in (profile.headers, profile.json_post_headers):
+        with pytest.raises(TypeError):
+            headers['User-Agent'] = 'changed'
+        with pytest.raises(TypeError):
+            del headers['Accept']
+        assert 'changed' not in headers.values()
+    with pytest.raises(AttributeError):
+        profile.cookie = 'A=1'
+    assert profile.json_post_headers == {**profile.headers, 'Content-Type': 'application/json'}
+    assert 'Content-Type' not in profile.headers
+
+
+def test_clients_share_their_browser_type_headers():
+    clients = [YahooFClient() for _ in range(20)]
+    profiles = {profile.browser_type: profile for profile in map(header_profile, BROWSER_TYPES)}
+    for client in clients:
+        matches = [p for p in profiles.values() if p.headers is client._headers]
+        assert len(matches) == 1
+        assert client._post_headers is matches[0].json_post_headers
+        headers, _ = client._json_request({'query': {}})
+        assert headers is client._post_headers
+
+
+def test_unknown_browser_type():
+    with pytest.raises(ValueError):
+        header_profile('lynx')
+
+
+def test_random_user_agent_is_seedable():
+    rng_a, rng_b = random.Random(1), random.Random(1)
+    agents = [random_user_agent(rng_a) for _ in range(50)]
+    assert agents == [random_user_agent(rng_b) for _ in range(50)]
+    assert len(set(agents)) > 1 and all(agent.startswith('Mozilla/') for agent in agents)
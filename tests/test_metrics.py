@@ -0,0 +1,83 @@
+import asyncio
+import math
+
+import aiohttp
+
+from yscreener import Metrics, ScreenCache, YahooFClient
+from yscreener.metrics import SECONDS_BUCKETS, Histogram
+from yscreener.mock_server import MockYahooServer
+
+EXPR = 'region=="us"'
+
+
+def test_screen_events():
+    metrics = Metrics()
+    events = []
+
+    async def main():
+        async with MockYahooServer(n_records=8000, rate_429=0.2, seed=2) as server:
+            client = YahooFClient(base_url=server.url, cache=ScreenCache(ttl=60),
+                                  hooks=[metrics, lambda *event: events.append(event)])
+            async with aiohttp.ClientSession(trace_configs=[client.trace_config()]) as session:
+                records = await client.screen(session, EXPR)
+                await client.screen(session, EXPR)
+            return records, dict(server.stats)
+
+    records, stats = asyncio.run(main())
+    n_pages = math.ceil(len(records) / YahooFClient.MAX_ITEM)
+    assert stats['429'] > 0
+    assert metrics.counter('retries_total', reason='429') == stats['429']
+    assert metrics.counter('cache_misses_total') == 1
+    assert metrics.counter('cache_hits_total') == 1
+    assert metrics.histogram('screen_pages').sum == n_pages
+    assert metrics.histogram('screen_seconds').count == 1
+    assert metrics.histogram('http_response_bytes', endpoint='screener').count == stats['served']
+    assert metrics.histogram('decode_seconds').count == stats['served']
+    assert metrics.histogram('auth_seconds', step='cookie').count == 1
+    assert metrics.histogram('auth_seconds', step='crumb').count == 1
+    # one TTFB per request, the retried ones included
+    ttfb = sum(metrics.histogram('http_ttfb_seconds', endpoint=e).count for e in ('cookie', 'crumb', 'screener'))
+    assert ttfb == stats['cookie'] + stats['crumb'] + stats['screener']
+    assert metrics.histogram('http_connect_seconds', endpoint='cookie').count >= 1
+    assert all(isinstance(labels, dict) for _, _, labels in events)
+
+
+def test_no_hooks_no_events():
+    async def main():
+        async with MockYahooServer(n_records=2000) as server, aiohttp.ClientSession() as session:
+            client = YahooFClient(base_url=server.url)
+            assert client._hooks == []
+            return await client.screen(session, EXPR)
+
+    assert asyncio.run(main())
+
+
+def test_histogram_buckets_and_quantile():
+    h = Histogram(SECONDS_BUCKETS)
+    for value in (0.0005, 0.003, 0.003, 0.2, 30):
+        h.observe(value)
+    assert h.count == 5 and h.sum == sum((0.0005, 0.003, 0.003, 0.2, 30))
+    assert h.counts[0] == 1 and h.counts[-1] == 1
+    assert h.quantile(0.5) == 0.005
+    assert h.quantile(1) == float('inf')
+    assert Histogram(SECONDS_BUCKETS).quantile(0.5) is None
+
+
+def test_prometheus_text():
+    metrics = Metrics(prefix='ys')
+    metrics('retries_total', 1, {'reason': '429'})
+    metrics('retries_total', 2, {'reason': '429'})
+    metrics('http_response_bytes', 3000, {'endpoint': 'screener'})
+    metrics('screen_seconds', 0.02, {})
+    lines = metrics.prometheus().splitlines()
+    assert '# TYPE ys_retries_total counter' in lines
+    assert 'ys_retries_total{reason="429"} 3' in lines
+    assert '# TYPE ys_http_response_bytes histogram' in lines
+    assert 'ys_http_response_bytes_bucket{endpoint="screener",le="1024"} 0' in lines
+    assert 'ys_http_response_bytes_bucket{endpoint="screener",le="4096"} 1' in lines
+    assert 'ys_http_response_bytes_bucket{endpoint="screener",le="+Inf"} 1' in lines
+    assert 'ys_http_response_bytes_sum{endpoint="screener"} 3000.0' in lines
+    assert 'ys_screen_seconds_bucket{le="0.025"} 1' in lines
+    assert 'ys_screen_seconds_count 1' in lines
+    metrics.clear()
+    assert metrics.prometheus() == '\n'
@@ -0,0 +1,63 @@
+import asyncio
+
+import aiohttp
+
+from yscreener import Planner, YahooFClient
+from yscreener.mock_server import RECORD_KEYS, MockYahooServer
+from yscreener.screener_builder import Field
+
+EXPRS = [f'region=="us" && intradaymarketcap > {cap}B' for cap in (0.1, 0.2, 0.5, 1)] + [
+    'region=="kr" && intradayprice > 10',
+    'region=="gb"',
+]
+
+
+def tickers(records):
+    return sorted(record['ticker'] for record in records)
+
+
+def test_unrelated_screen_keeps_broad_plan():
+    async def main():
+        async with MockYahooServer(n_records=5000) as server, aiohttp.ClientSession() as session:
+            client = YahooFClient(base_url=server.url)
+            planner = Planner(client, fields=RECORD_KEYS, local_fields=RECORD_KEYS.values())
+            plan = await planner.plan(session, EXPRS)
+            rv = await plan.execute(session)
+            expected = [await client.screen(session, expr) for expr in EXPRS]
+
+            # a single screen, as text or built, is planned like a batch of one
+            assert (await planner.explain(session, EXPRS[-1])).startswith('Plan: 1 screen(s)')
+            built = Field('region').eq('kr') & (Field('intradayprice') > 10)
+            assert (await planner.explain(session, built)).startswith('Plan: 1 screen(s)')
+        return plan, rv, expected
+
+    plan, rv, expected = asyncio.run(main())
+    assert [step.kind for step in plan.steps] == ['broad', 'crawl', 'crawl']
+    assert plan.steps[0].targets == [0, 1, 2, 3]
+    assert [tickers(r) for r in rv] == [tickers(r) for r in expected]
+
+
+def test_screens_without_a_shared_group_are_not_probed():
+    async def served(server, run):
+        start = server.stats['served']
+        await run
+        return server.stats['served'] - start
+
+    async def main():
+        async with MockYahooServer(n_records=5000) as server, aiohttp.ClientSession() as session:
+            client = YahooFClient(base_url=server.url)
+            planner = Planner(client, fields=RECORD_KEYS, local_fields=RECORD_KEYS.values())
+            rv = []
+            for exprs in (['region=="gb"'], ['region=="gb"', 'region=="kr" && intradayprice > 10']):
+                direct = await served(server, client.screen_many(session, exprs))
+                planned = await served(server, planner.screen_many(session, exprs))
+                rv.append((direct, planned))
+            plan = await planner.plan(session, ['region=="gb"'])
+        return rv, plan
+
+    rv, plan = asyncio.run(main())
+    # as many requests as screening directly, no count probes
+    for direct, planned in rv:
+        assert planned == direct
+    assert plan.n_probes == 0
+    assert 'at least 1 request(s)' in plan.explain()
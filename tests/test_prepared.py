@@ -0,0 +1,39 @@
+import asyncio
+
+import aiohttp
+
+from yscreener import YahooFClient, prepare_screener_expr
+from yscreener.mock_server import MockYahooServer
+
+PAYLOAD = {'quoteType': 'equity', 'sortField': 'intradayprice', 'sortType': 'asc'}
+
+
+def tickers(records):
+    return [record['ticker'] for record in records]
+
+
+def test_screen_takes_encoded_bytes():
+    async def main():
+        async with MockYahooServer(n_records=5000) as server, aiohttp.ClientSession() as session:
+            client = YahooFClient(base_url=server.url)
+            query_only = prepare_screener_expr('region==$r')
+            whole = prepare_screener_expr('region==$r', PAYLOAD)
+
+            expected = await client.screen(session, query_only.bind(r='us'))
+            expected_sorted = await client.screen(session, whole.bind(r='us'), PAYLOAD)
+
+            def serialize(*args):
+                raise AssertionError('encoded payload was serialized again')
+
+            client._payload_text = serialize
+            rv = await client.screen(session, query_only.encode(r='us'))
+            rv_sorted = await client.screen(session, whole.encode(r='us'))
+            n = await client.count(session, whole.encode(r='us'))
+        return expected, expected_sorted, rv, rv_sorted, n
+
+    expected, expected_sorted, rv, rv_sorted, n = asyncio.run(main())
+    assert len(expected) > YahooFClient.MAX_ITEM
+    assert tickers(rv) == tickers(expected)
+    assert tickers(rv_sorted) == tickers(expected_sorted)
+    assert tickers(rv_sorted) != tickers(rv)
+    assert n == len(expected)
@@ -0,0 +1,77 @@
+import asyncio
+import json
+import sys
+import threading
+
+import aiohttp
+
+from yscreener import Profiler, YahooFClient
+from yscreener.mock_server import MockYahooServer
+from yscreener.profiling import compare, phase
+from yscreener.screener_expr import parse_screener_expr
+
+EXPR = 'region=="us" && beta < 1'
+
+
+def test_threads_profile_separately():
+    profiler = Profiler(memory=False)
+    barrier = threading.Barrier(2)
+    profiles = {}
+
+    def work(name, repeat):
+        with profiler.profile(name) as profile:
+            # both recordings are running from here on
+            barrier.wait()
+            for _ in range(repeat):
+                with phase('parse'):
+                    parse_screener_expr('a > 3 && b < 4')
+        profiles[name] = profile
+
+    threads = [threading.Thread(target=work, args=(name, repeat)) for name, repeat in (('a', 50), ('b', 80))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # phases follow each thread's own context
+    assert profiles['a'].phases['parse'][1] == 50
+    assert profiles['b'].phases['parse'][1] == 80
+    if sys.version_info < (3, 12):
+        # one cProfile per thread, both run
+        assert profiles['a'].functions and profiles['b'].functions
+    assert not getattr(profiler._cpu, 'busy', False)
+
+
+def test_nested_recording_gets_no_cpu_profile():
+    profiler = Profiler(memory=False)
+    with profiler.profile('outer') as outer:
+        _, inner = profiler.parse('a > 3', repeat=20)
+    assert outer.functions and not inner.functions
+    assert inner.phases['parse'][1] == 20 and 'parse' not in outer.phases
+
+
+def test_overlapping_screens_on_a_loop(tmp_path):
+    profiler = Profiler(str(tmp_path), top=5)
+
+    async def main():
+        async with MockYahooServer(n_records=6000) as server, aiohttp.ClientSession() as session:
+            client = YahooFClient(base_url=server.url, profiler=profiler)
+            await client.screen(session, 'region=="gb"')
+            await asyncio.gather(client.screen(session, EXPR), client.screen(session, 'region=="kr"'))
+
+    asyncio.run(main())
+    first, a, b = profiler.profiles
+    for profile in (first, a, b):
+        assert {'serialize', 'network', 'decode'} <= set(profile.phases)
+        assert profile.peak_memory is not None
+    assert first.functions and len(first.functions) <= 5
+    # cProfile ran for one of the overlapping screens only
+    assert bool(a.functions) != bool(b.functions)
+
+    with open(first.path, encoding='utf-8') as f:
+        assert json.load(f)['label'] == 'region=="gb"'
+    names = sorted(p.name for p in tmp_path.iterdir())
+    assert [name[:4] for name in names if name.endswith('.json')] == ['0001', '0002', '0003']
+    assert len([name for name in names if name.endswith('.prof')]) == 2
+    text = compare(first.path, first.path)
+    assert text.startswith('region=="gb": ') and '+0.0%' in text
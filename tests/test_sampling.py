@@ -0,0 +1,70 @@
+import asyncio
+
+import aiohttp
+
+from yscreener import YahooFClient
+from yscreener.mock_server import MockYahooServer
+from yscreener.screener_eval import raw_value
+
+STATS = ['mean(beta)', 'sum(marketCap)', 'share(dividendyield > 4)', 'count(beta < 1)']
+
+
+def exact_values(records):
+    betas = [raw_value(r['beta']) for r in records]
+    caps = [raw_value(r['marketCap']) for r in records]
+    yields = [raw_value(r.get('dividendyield')) for r in records]
+    return {
+        'mean(beta)': sum(betas) / len(betas),
+        'sum(marketCap)': sum(caps),
+        'share(dividendyield > 4)': sum(1 for y in yields if y is not None and y > 4) / len(records),
+        'count(beta < 1)': sum(1 for b in betas if b < 1),
+    }
+
+
+def run(expr, stats=STATS, **kwargs):
+    async def main():
+        async with MockYahooServer(n_records=60_000) as server, aiohttp.ClientSession() as session:
+            client = YahooFClient(base_url=server.url)
+            result = await client.estimate(session, expr, stats, **kwargs)
+            records = await client.screen(session, expr)
+        return result, records
+
+    return asyncio.run(main())
+
+
+def test_estimates_cover_the_exact_values():
+    # pages hold consecutive market caps, a sum of them needs most pages
+    stats = [spec for spec in STATS if not spec.startswith('sum')]
+
+    async def main():
+        async with MockYahooServer(n_records=60_000) as server, aiohttp.ClientSession() as session:
+            client = YahooFClient(base_url=server.url)
+            results = [
+                await client.estimate(session, 'region=="us"', stats, precision=0.02, seed=seed)
+                for seed in range(8)
+            ]
+            records = await client.screen(session, 'region=="us"')
+        return results, records
+
+    results, records = asyncio.run(main())
+    exact = exact_values(records)
+    for result in results:
+        assert result.total == len(records)
+        assert not result.exact and 10 <= result.n_sampled < result.n_pages
+        for spec in stats:
+            estimate, value = result[spec], exact[spec]
+            # 95% intervals, twice as wide leaves next to no misses
+            assert abs(estimate.value - value) <= 2 * estimate.half_width, spec
+
+
+def test_sampling_every_page_is_exact():
+    result, records = run('region=="gb"', precision=0, seed=1)
+    assert result.exact and result.n_sampled == result.n_pages
+    for spec, value in exact_values(records).items():
+        assert abs(result[spec].value - value) <= 1e-9 * abs(value), spec
+        assert result[spec].half_width == 0
+
+
+def test_max_pages_bounds_the_sample():
+    result, _ = run('region=="us"', precision=0, max_pages=5, seed=2)
+    assert result.n_sampled == 5
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+
+import aiohttp
+
+from yscreener import Scheduler, YahooFClient
+from yscreener import scheduler as scheduler_module
+from yscreener.mock_server import MockYahooServer
+
+EXPR = 'region=="kr"'
+
+
+async def run_for(scheduler, seconds):
+    task = asyncio.ensure_future(scheduler.run())
+    await asyncio.sleep(seconds)
+    scheduler.stop()
+    await task
+
+
+def test_every_standing_screen_runs():
+    async def main():
+        async with MockYahooServer(n_records=2000) as server, aiohttp.ClientSession() as session:
+            client = YahooFClient(base_url=server.url)
+            # market hours and backoff left out, every screen is due every 0.3 s
+            scheduler = Scheduler(client, session, off_hours_factor=1, max_backoff=1.0, min_spacing=0.05)
+            deltas = {}
+            screens = [
+                scheduler.add(EXPR, freshness=0.3, fields=fields,
+                              callback=lambda screen, delta: deltas.setdefault(screen, []).append(delta))
+                for fields in ([], ['regularMarketPrice'], ['marketCap'])
+            ]
+            await run_for(scheduler, 2)
+
+            own = await client.screen_delta(session, EXPR)
+
+        expected = len(own.added)
+        assert expected > 0
+        for screen in screens:
+            assert screen.errors == 0
+            assert screen.runs >= 4
+            # each screen diffs against its own last result only
+            assert len(deltas[screen][0].added) == expected
+            assert not any(deltas[screen][1:])
+        # so does the client's screen_delta()
+        assert not own.removed and not own.changed
+
+    asyncio.run(main())
+
+
+def test_failing_screen_is_logged_and_rescheduled(caplog):
+    def callback(screen, delta):
+        raise RuntimeError('callback failed')
+
+    async def main():
+        async with MockYahooServer(n_records=500) as server, aiohttp.ClientSession() as session:
+            scheduler = Scheduler(YahooFClient(base_url=server.url), session, off_hours_factor=1, max_backoff=1.0)
+            screen = scheduler.add(EXPR, freshness=0.2, callback=callback)
+            await run_for(scheduler, 1)
+        return screen
+
+    with caplog.at_level(logging.ERROR, logger='yscreener.scheduler'):
+        screen = asyncio.run(main())
+    assert screen.errors >= 2
+    assert isinstance(screen.last_error, RuntimeError)
+    assert len(caplog.records) == screen.errors
+    assert caplog.records[0].exc_info is not None
+
+
+def test_missing_time_zone_is_logged_once(monkeypatch, caplog):
+    def not_found(name):
+        raise scheduler_module.ZoneInfoNotFoundError(name)
+
+    monkeypatch.setattr(scheduler_module, 'ZoneInfo', not_found)
+    monkeypatch.setattr(scheduler_module, '_missing_zones', set())
+    with caplog.at_level(logging.WARNING, logger='yscreener.scheduler'):
+        assert scheduler_module.is_market_open('kr')
+        assert scheduler_module.is_market_open('kr')
+    assert len(caplog.records) == 1
+    assert 'Asia/Seoul' in caplog.records[0].getMessage()
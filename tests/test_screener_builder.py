@@ -0,0 +1,67 @@
+import math
+
+import pytest
+
+from yscreener import F
+from yscreener.screener_builder import Expr
+from yscreener.screener_expr import parse_screener_expr
+
+
+@pytest.mark.parametrize('expr, expected', [
+    (F.region.eq('kr'), {'operator': 'eq', 'operands': ['region', 'kr']}),
+    (F.region == 'kr', {'operator': 'eq', 'operands': ['region', 'kr']}),
+    (F.x.lt(1), {'operator': 'lt', 'operands': ['x', 1.0]}),
+    (F.x < 1, {'operator': 'lt', 'operands': ['x', 1.0]}),
+    (F.x > 2, {'operator': 'gt', 'operands': ['x', 2.0]}),
+    (F.x <= 3, {'operator': 'lte', 'operands': ['x', 3.0]}),
+    (F.x >= -4.5, {'operator': 'gte', 'operands': ['x', -4.5]}),
+    (F.beta[0.8:1.2], {'operator': 'btwn', 'operands': ['beta', 0.8, 1.2]}),
+    (F.beta.between(0, 1), {'operator': 'btwn', 'operands': ['beta', 0.0, 1.0]}),
+    (F.short_interest.value > 1, {'operator': 'gt', 'operands': ['short_interest.value', 1.0]}),
+    (F['peratio.lasttwelvemonths'] < 20, {'operator': 'lt', 'operands': ['peratio.lasttwelvemonths', 20.0]}),
+    (F.ticker.isin(['A']), {'operator': 'eq', 'operands': ['ticker', 'A']}),
+    (F.ticker.isin(['A', 'B']), {'operator': 'or', 'operands': [
+        {'operator': 'eq', 'operands': ['ticker', 'A']},
+        {'operator': 'eq', 'operands': ['ticker', 'B']},
+    ]}),
+    ((F.x > 1) & (F.y < 2), {'operator': 'and', 'operands': [
+        {'operator': 'gt', 'operands': ['x', 1.0]},
+        {'operator': 'lt', 'operands': ['y', 2.0]},
+    ]}),
+    ((F.x > 1) | F.s.eq('a "b"'), {'operator': 'or', 'operands': [
+        {'operator': 'gt', 'operands': ['x', 1.0]},
+        {'operator': 'eq', 'operands': ['s', 'a "b"']},
+    ]}),
+])
+def test_builder_output(expr, expected):
+    assert isinstance(expr, Expr)
+    assert expr.to_dict() == expected
+    # the text form parses back to the same query
+    assert parse_screener_expr(str(expr)) == expected
+
+
+def test_or_inside_and_keeps_its_parentheses():
+    expr = F.region.eq('us') & ((F.beta < 0) | (F.beta > 2))
+    assert parse_screener_expr(str(expr)) == expr.to_dict()
+
+
+def test_missing_parentheses_are_named():
+    with pytest.raises(TypeError, match='parentheses'):
+        F.intradaymarketcap > 600e9 & F.region.eq('kr')
+    with pytest.raises(TypeError, match='parentheses'):
+        F.a > 1 & F.b < 2
+
+
+def test_no_not_equal_and_no_hash():
+    with pytest.raises(TypeError):
+        F.region != 'kr'
+    with pytest.raises(TypeError):
+        hash(F.region)
+
+
+def test_literals_without_text_form():
+    assert str(F.x < math.inf) == 'x < 1e999'
+    assert parse_screener_expr(str(F.x > -math.inf)) == {'operator': 'gt', 'operands': ['x', -math.inf]}
+    for value in (True, math.nan, None):
+        with pytest.raises(ValueError):
+            str(F.x.eq(value))
@@ -0,0 +1,52 @@
+import math
+
+import pytest
+
+from yscreener.screener_eval import Evaluator, columns_from_records
+
+np = pytest.importorskip('numpy')
+
+VALUES = [1, 1.0, 2, 2.5, -1, 0, True, False, None, math.nan, 'x', 'y', '1', {'raw': 1, 'fmt': '1'}, {'raw': None}]
+
+
+def records():
+    rv = [{'ticker': f'T{i}', 'v': value} for i, value in enumerate(VALUES)]
+    # a record without the field
+    rv.append({'ticker': 'missing'})
+    return rv
+
+
+def matched(text):
+    evaluator = Evaluator(text)
+    rows = records()
+    by_filter = [row['ticker'] for row in evaluator.filter(rows)]
+    mask = evaluator.mask(columns_from_records(rows, ['v']), len(rows))
+    by_mask = [row['ticker'] for row, hit in zip(rows, mask) if hit]
+    assert by_filter == by_mask, text
+    return by_filter
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('v == 1', ['T0', 'T1', 'T13']),
+    ('v in [1, 2]', ['T0', 'T1', 'T2', 'T13']),
+    ('v in [1, "x"]', ['T0', 'T1', 'T10', 'T13']),
+    ('v in ["x", "1"]', ['T10', 'T12']),
+    ('v == "x"', ['T10']),
+    ('v[0:2]', ['T0', 'T1', 'T2', 'T5', 'T13']),
+    ('v > 0', ['T0', 'T1', 'T2', 'T3', 'T13']),
+    ('v <= 0', ['T4', 'T5']),
+    ('v < "y"', ['T10', 'T12']),
+    ('v == 0 || v == 2', ['T2', 'T5']),
+    ('v == 0 || v > 2', ['T3', 'T5']),
+    ('v > 0 && v < 2', ['T0', 'T1', 'T13']),
+])
+def test_filter_and_mask_agree(text, expected):
+    assert matched(text) == expected
+
+
+def test_bool_matches_no_number():
+    rows = [{'v': True}, {'v': False}, {'v': {'raw': True}}]
+    for text in ('v == 1', 'v == 0', 'v in [0, 1]', 'v[0:1]', 'v >= 0'):
+        evaluator = Evaluator(text)
+        assert evaluator.filter(rows) == []
+        assert not evaluator.mask(columns_from_records(rows, ['v'])).any()
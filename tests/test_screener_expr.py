@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from yscreener import screener_expr
+from yscreener.screener_expr import parse_screener_expr, prepare_screener_expr
+
+
+def test_prepared_dumps_matches_bind():
+    prepared = prepare_screener_expr('a=="\x00r\x00" && b==$r && c<$n')
+    text = prepared.dumps(r='Z', n=3)
+    assert json.loads(text) == prepared.bind(r='Z', n=3)
+    assert '"\\u0000r\\u0000"' in text
+
+
+def test_prepared_sentinel_collision(monkeypatch):
+    # the first token is in a string literal, the second one is used
+    tokens = iter(['aa', 'bb'])
+    monkeypatch.setattr(screener_expr.secrets, 'token_hex', lambda n: next(tokens))
+    prepared = prepare_screener_expr('a=="\x00aa:r\x00" && b==$r')
+    assert json.loads(prepared.dumps(r='Z')) == prepared.bind(r='Z')
+    assert next(tokens, None) is None
+
+
+@pytest.mark.parametrize('text', ['x>3-2', 'a > 3 b < 4', 'a > 3)', 'a > 3 && b < 4 ]'])
+def test_trailing_tokens_are_rejected(text):
+    with pytest.raises(ValueError, match='Unexpected'):
+        parse_screener_expr(text)
+    with pytest.raises(ValueError, match='Unexpected'):
+        prepare_screener_expr(text)
+
+
+def test_whole_expression_is_parsed():
+    query = parse_screener_expr('(a > 3 || b < 4) && c in ["x", "y"]')
+    assert query['operator'] == 'and'
+
+
+def comparison(operator, field, value):
+    return {'operator': operator, 'operands': [field, value]}
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('short_interest.value > 1', comparison('gt', 'short_interest.value', 1.0)),
+    ('a.b.c == "x"', comparison('eq', 'a.b.c', 'x')),
+    ('pe >= 10', comparison('gte', 'pe', 10.0)),
+    ('pe <= 10', comparison('lte', 'pe', 10.0)),
+    ('pe<=10', comparison('lte', 'pe', 10.0)),
+    ('beta > -1.5', comparison('gt', 'beta', -1.5)),
+    ('beta > -.5', comparison('gt', 'beta', -0.5)),
+    ('x > 6e+11', comparison('gt', 'x', 6e11)),
+    ('x < 1E3', comparison('lt', 'x', 1000.0)),
+    ('x > 2.5e-3', comparison('gt', 'x', 0.0025)),
+    ('x > 10K', comparison('gt', 'x', 1e4)),
+    ('x > 2.5B', comparison('gt', 'x', 2.5e9)),
+    ('x > 1t', comparison('gt', 'x', 1e12)),
+    ('x <= 10%', comparison('lte', 'x', 10.0)),
+    ('x >= -2.5%', comparison('gte', 'x', -2.5)),
+    ('beta[-1:2]', {'operator': 'btwn', 'operands': ['beta', -1.0, 2.0]}),
+])
+def test_grammar(text, expected):
+    assert parse_screener_expr(text) == expected
+
+
+@pytest.mark.parametrize('text', ['a.b. > 1', 'x > 1e', 'x > -', 'x => 1'])
+def test_grammar_errors(text):
+    with pytest.raises(ValueError):
+        parse_screener_expr(text)
+
+
+def test_bind_payload():
+    payload = {'quoteType': 'equity', 'sortField': 'intradayprice', 'sortType': 'asc'}
+    prepared = prepare_screener_expr('region==$r && x > $n', payload)
+    bound = prepared.bind_payload(r='kr', n=3)
+    assert bound == {**payload, 'query': prepared.bind(r='kr', n=3)}
+    assert bound == json.loads(prepared.dumps(r='kr', n=3))
+    # without a template, the payload is the query
+    assert prepare_screener_expr('x > $n').bind_payload(n=1) == {'operator': 'gt', 'operands': ['x', 1.0]}
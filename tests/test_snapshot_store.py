@@ -0,0 +1,53 @@
+import math
+import os
+
+import pytest
+
+from yscreener.snapshot_store import SnapshotStore
+
+RECORDS = [
+    {'ticker': 'B', 'marketCap': {'raw': 2.5e9, 'fmt': '2.5B'}, 'volume': 300, 'sector': 'Energy',
+     'mixed': True, 'flag': False, 'huge': 2**64, 'tags': ['a', 'b']},
+    {'ticker': 'A', 'marketCap': 1e9, 'volume': 100, 'sector': None,
+     'mixed': 1, 'flag': True, 'huge': -2**63 - 1, 'tags': None},
+    {'ticker': 'C', 'volume': 200, 'sector': 'Utilities', 'mixed': 'x', 'flag': None, 'huge': 5},
+]
+
+
+def test_round_trip(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    run_id = store.append('universe', RECORDS, query={'operator': 'and'}, created=1_700_000_000)
+    assert store.runs('universe') == [run_id]
+    with store.open('universe') as run:
+        assert list(run.symbols) == ['A', 'B', 'C']
+        assert run.query == {'operator': 'and'}
+        assert run.n_rows == 3
+        assert list(run.column('volume')) == [100, 300, 200]
+        caps = run.column('marketCap')
+        assert caps[0] == 1e9 and caps[1] == 2.5e9 and math.isnan(caps[2])
+        assert run.column('sector').decode() == [None, 'Energy', 'Utilities']
+        assert run.get('C', 'marketCap') is None
+        assert run.get('D', 'volume') is None
+        for record in RECORDS:
+            for field in ('mixed', 'flag', 'huge', 'tags'):
+                value = run.get(record['ticker'], field)
+                assert value == record.get(field)
+                assert type(value) is type(record.get(field))
+
+
+def test_json_column_keeps_one_and_true_apart(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    store.append('s', RECORDS, created=1)
+    with store.open('s') as run:
+        column = run.column('mixed')
+        assert column.decode() == [1, True, 'x']
+        assert column[column.code_of(True)] is True
+        assert column.code_of(2) == -1
+
+
+def test_failed_write_leaves_no_temporary_run(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    with pytest.raises(TypeError):
+        store.append('s', [{'ticker': 'A', 'v': object()}], created=1)
+    assert os.listdir(tmp_path / 's') == []
+    assert store.runs('s') == []
@@ -0,0 +1,105 @@
+import asyncio
+import concurrent.futures
+import threading
+
+import aiohttp
+import pytest
+
+from yscreener import CrawlCheckpoint, SyncYahooFClient, YahooFClient
+from yscreener.mock_server import MockYahooServer
+
+EXPR = 'region=="us"'
+
+
+@pytest.fixture
+def server():
+    # the mock server runs on a loop of its own, like a remote host
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    server = MockYahooServer(n_records=5000)
+    asyncio.run_coroutine_threadsafe(server.start(), loop).result()
+    yield server
+    asyncio.run_coroutine_threadsafe(server.close(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def expected(server, expr):
+    async def main():
+        async with aiohttp.ClientSession() as session:
+            return await YahooFClient(base_url=server.url).screen(session, expr)
+
+    return asyncio.run(main())
+
+
+def test_checkpoint_is_used_from_the_loop_thread(server, tmp_path):
+    with CrawlCheckpoint(str(tmp_path / 'crawl.db')) as checkpoint:
+        with SyncYahooFClient(base_url=server.url, checkpoint=checkpoint) as client:
+            rv = client.screen(EXPR)
+    assert rv == expected(server, EXPR)
+
+
+def test_screen_and_count(server):
+    with SyncYahooFClient(base_url=server.url) as client:
+        rv = client.screen(EXPR)
+        assert client.count(EXPR) == len(rv)
+        assert client.screen_many([EXPR, 'region=="gb"']) == [rv, expected(server, 'region=="gb"')]
+    assert rv == expected(server, EXPR)
+
+
+def test_threads_share_one_loop_and_session(server):
+    exprs = [f'region=="us" && beta > {b}' for b in (0.5, 1, 1.5)] * 4
+    with SyncYahooFClient(base_url=server.url) as client:
+        client.count(EXPR)
+        loop, thread = client._loop, client._thread
+        with concurrent.futures.ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(client.screen, exprs))
+        assert (client._loop, client._thread) == (loop, thread)
+        # the cookie and crumb stayed warm across calls and threads
+        assert server.stats['cookie'] == 1 and server.stats['crumb'] == 1
+    assert results == [expected(server, expr) for expr in exprs]
+
+
+def test_iter_pages(server):
+    with SyncYahooFClient(base_url=server.url) as client:
+        pages = list(client.iter_pages(EXPR))
+        assert [len(page) for page in pages[:-1]] == [250] * (len(pages) - 1)
+        assert [r for page in pages for r in page] == list(client.iter_records(EXPR))
+        served = server.stats['served']
+        # stopping early requests no further pages
+        for _ in client.iter_pages(EXPR):
+            break
+        assert server.stats['served'] - served <= YahooFClient.MAX_CONCURRENCY
+    assert sum(map(len, pages)) == len(expected(server, EXPR))
+
+
+def test_close_stops_the_loop_and_a_later_call_restarts_it(server):
+    client = SyncYahooFClient(base_url=server.url)
+    n = client.count(EXPR)
+    thread = client._thread
+    client.close()
+    client.close()
+    assert not thread.is_alive() and client._loop is None
+    assert client.count(EXPR) == n
+    assert client._thread is not thread
+    client.close()
+
+
+def test_timeout(server):
+    server.latency = 0.5
+    with SyncYahooFClient(base_url=server.url, timeout=0.1) as client:
+        with pytest.raises(concurrent.futures.TimeoutError):
+            client.count(EXPR)
+
+
+def test_call_from_the_loop_thread_fails(server):
+    with SyncYahooFClient(base_url=server.url) as client:
+        client.count(EXPR)
+
+        async def nested():
+            return client.count(EXPR)
+
+        with pytest.raises(RuntimeError):
+            asyncio.run_coroutine_threadsafe(nested(), client._loop).result()
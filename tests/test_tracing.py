@@ -0,0 +1,110 @@
+import asyncio
+import json
+import math
+
+import aiohttp
+import pytest
+
+from yscreener import JsonLinesExporter, MemoryExporter, Tracer, YahooFClient
+from yscreener.mock_server import MockYahooServer
+from yscreener.tracing import NULL_SPAN, current_span
+
+EXPR = 'region=="us"'
+
+
+def traced_screen(tracer, **server_kwargs):
+    async def main():
+        async with MockYahooServer(n_records=8000, **server_kwargs) as server, aiohttp.ClientSession() as session:
+            client = YahooFClient(base_url=server.url, tracer=tracer)
+            records = await client.screen(session, EXPR)
+            return records, dict(server.stats)
+
+    return asyncio.run(main())
+
+
+def test_screen_span_tree(tmp_path):
+    memory = MemoryExporter()
+    path = tmp_path / 'spans.jsonl'
+    tracer = Tracer(JsonLinesExporter(str(path)), memory)
+    records, stats = traced_screen(tracer, rate_429=0.2, seed=2)
+    tracer.close()
+
+    spans = memory.spans
+    by_id = {span.span_id: span for span in spans}
+    children = {}
+    for span in spans:
+        children.setdefault(span.parent_id, []).append(span)
+
+    [root] = children[None]
+    assert root.name == 'screen' and root.status == 'ok'
+    assert root.attributes == {'expr': EXPR, 'pages': math.ceil(len(records) / 250), 'records': len(records)}
+    assert {span.trace_id for span in spans} == {root.trace_id}
+
+    [auth] = [s for s in children[root.span_id] if s.name == 'auth']
+    assert sorted(s.name for s in children[auth.span_id]) == ['cookie', 'crumb']
+    pages = [s for s in children[root.span_id] if s.name == 'page']
+    assert len(pages) == root.attributes['pages']
+    assert sum(s.attributes['records'] for s in pages) == len(records)
+
+    https = [s for s in spans if s.name == 'http']
+    assert len(https) == stats['screener']
+    assert sum(s.attributes['status'] == 429 for s in https) == stats['429'] > 0
+    for page in pages:
+        attempts = [s for s in children[page.span_id] if s.name == 'http']
+        assert [s.attributes['attempt'] for s in attempts] == list(range(len(attempts)))
+        assert attempts[-1].attributes['status'] == 200
+        assert [s.name for s in children[page.span_id]].count('decode') == 1
+    for span in spans:
+        assert span.start_ns <= span.end_ns
+        if span.parent_id is not None:
+            parent = by_id[span.parent_id]
+            assert parent.start_ns <= span.start_ns and span.end_ns <= parent.end_ns
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line['span_id'] for line in lines] == [span.span_id for span in spans]
+    assert lines[-1]['name'] == 'screen' and lines[-1]['parent_id'] is None
+    assert memory.tree().splitlines()[0].startswith('screen ')
+
+
+def test_no_tracer_no_spans():
+    async def main():
+        async with MockYahooServer(n_records=2000) as server, aiohttp.ClientSession() as session:
+            client = YahooFClient(base_url=server.url)
+            assert client._span('screen') is NULL_SPAN
+            return await client.screen(session, EXPR)
+
+    assert asyncio.run(main())
+    assert current_span() is NULL_SPAN
+
+
+def test_spans_follow_tasks_and_record_errors():
+    memory = MemoryExporter()
+    tracer = Tracer(memory)
+
+    async def child(i):
+        with tracer.span('child', i=i):
+            await asyncio.sleep(0.01)
+
+    async def main():
+        with tracer.span('parent'):
+            await asyncio.gather(*(child(i) for i in range(3)))
+            with pytest.raises(ValueError):
+                with tracer.span('failing'):
+                    raise ValueError('bad')
+
+    asyncio.run(main())
+    parent = next(s for s in memory.spans if s.name == 'parent')
+    assert [s.parent_id for s in memory.spans if s.name == 'child'] == [parent.span_id] * 3
+    failing = next(s for s in memory.spans if s.name == 'failing')
+    assert failing.status == 'error' and failing.attributes['error'] == 'ValueError: bad'
+    assert parent.status == 'ok'
+
+
+def test_opentelemetry_exporter():
+    pytest.importorskip('opentelemetry')
+    from yscreener import OpenTelemetryExporter
+
+    tracer = Tracer(OpenTelemetryExporter())
+    with tracer.span('screen', expr=EXPR):
+        with tracer.span('page', offset=0):
+            pass
@@ -1,6 +1,8 @@
 import os
 import asyncio
 import hashlib
+import runpy
+from collections import Counter
 
 import aiohttp
 from urllib.parse import urlparse, urljoin
@@ -48,6 +50,37 @@ file__types = """class HttpHeaders(dict):
 
 file_typing = """TYPE_CHECKING=False"""
 
+# Header data yscreener loads, instead of the whole _consts.py
+data_path = os.path.join('.', 'fingerprint_data.py')
+
+data_names = (
+    'COMMON_ACCEPT',
+    'COMMON_ACCEPT_LANGUAGE',
+    'PW_CHROMIUM_HEADLESS_DEFAULT_USER_AGENT',
+    'PW_CHROMIUM_HEADLESS_DEFAULT_SEC_CH_UA',
+    'PW_CHROMIUM_HEADLESS_DEFAULT_SEC_CH_UA_MOBILE',
+    'PW_CHROMIUM_HEADLESS_DEFAULT_SEC_CH_UA_PLATFORM',
+    'PW_FIREFOX_HEADLESS_DEFAULT_USER_AGENT',
+    'PW_WEBKIT_HEADLESS_DEFAULT_USER_AGENT',
+)
+
+def write_fingerprint_data(consts_path, out_path):
+    """Write the header constants and USER_AGENT_POOL as (user agent, weight) pairs."""
+    consts = runpy.run_path(consts_path)
+    lines = [
+        '# Generated by update_fingerprint_suite.py from crawlee/fingerprint_suite/_consts.py',
+        '',
+    ]
+    for name in data_names:
+        lines.append(f'{name} = {consts[name]!r}')
+    # duplicates of the pool become weights, most common first
+    lines += ['', '# USER_AGENT_POOL, deduplicated', 'USER_AGENTS = (']
+    for user_agent, weight in Counter(consts['USER_AGENT_POOL']).most_common():
+        lines.append(f'    ({user_agent!r}, {weight}),')
+    lines.append(')')
+    with open(out_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+
 # crawlee
 # ├── _types.py
 # └── fingerprint_suite
@@ -121,5 +154,7 @@ async def main():
                 f.write(new_content)
                 print(f'{file_name} has been updated.')
 
+        write_fingerprint_data(os.path.join(dir_path, '_consts.py'), data_path)
+
 if __name__ == '__main__':
     asyncio.run(main())
@@ -1,4 +1,52 @@
-from .yscreener_client import YahooFClient
-from .screener_expr import parse_screener_expr
+# Submodules are imported on first access of their names, so that
+# import yscreener doesn't load aiohttp, numpy and the rest up front.
+_exports = {
+    'YahooFClient': 'yscreener_client',
+    'SyncYahooFClient': 'sync_client',
+    'parse_screener_expr': 'screener_expr',
+    'prepare_screener_expr': 'screener_expr',
+    'canonicalize': 'screener_expr',
+    'F': 'screener_builder',
+    'Evaluator': 'screener_eval',
+    'evaluate_screener_expr': 'screener_eval',
+    'ScreenCache': 'screener_cache',
+    'Planner': 'screener_planner',
+    'Delta': 'screener_delta',
+    'DeltaTracker': 'screener_delta',
+    'Scheduler': 'scheduler',
+    'CrawlCheckpoint': 'checkpoint',
+    'RateLimiter': 'ratelimit',
+    'REGIONS': 'universe',
+    'UniverseSnapshot': 'universe',
+    'SnapshotStore': 'snapshot_store',
+    'Bitmap': 'bitmap',
+    'SymbolIndex': 'bitmap',
+    'Aggregation': 'aggregate',
+    'QuantileSketch': 'aggregate',
+    'Estimate': 'sampling',
+    'SampleResult': 'sampling',
+    'Cassette': 'cassette',
+    'Metrics': 'metrics',
+    'Tracer': 'tracing',
+    'JsonLinesExporter': 'tracing',
+    'MemoryExporter': 'tracing',
+    'OpenTelemetryExporter': 'tracing',
+    'Profiler': 'profiling',
+}
 
-__all__ = ['YahooFClient', 'parse_screener_expr']
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    module = _exports.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+
+    value = getattr(import_module('.' + module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted({*globals(), *__all__})
@@ -0,0 +1,310 @@
+import math
+import re
+
+from .screener_eval import raw_value
+
+# count | count(field) | sum(field) | mean(field) | min(field) | max(field)
+# | median(field) | p<percentile>(field), e.g. p90(marketCap), p99.9(x)
+_SPEC = re.compile(r'^\s*(count|sum|mean|min|max|median|p\d+(?:\.\d+)?)\s*(?:\(\s*([\w.]*)\s*\))?\s*$')
+
+
+def _parse_spec(spec):
+    m = _SPEC.match(spec)
+    if not m:
+        raise ValueError(f"Invalid aggregate: {spec}")
+    func, field = m.group(1), m.group(2) or None
+    if field is None and func != 'count':
+        raise ValueError(f"Aggregate needs a field: {spec}")
+    q = None
+    if func == 'median':
+        func, q = 'quantile', 0.5
+    elif func.startswith('p'):
+        q = float(func[1:]) / 100
+        if q > 1:
+            raise ValueError(f"Invalid percentile: {spec}")
+        func = 'quantile'
+    return func, field, q
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with relative error guarantees (DDSketch).
+
+    Values are counted in logarithmic buckets, any quantile is returned
+    within relative_accuracy of a value of that rank. Sketches with the same
+    accuracy merge exactly. Past max_bins buckets per sign the buckets
+    nearest zero are combined.
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_bins=2048):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(f"Invalid relative accuracy: {relative_accuracy}")
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._pos = {}
+        self._neg = {}
+        self.zeros = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, value):
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, index):
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+    def add(self, value):
+        if value == 0:
+            self.zeros += 1
+        else:
+            bins = self._pos if value > 0 else self._neg
+            i = self._index(abs(value))
+            bins[i] = bins.get(i, 0) + 1
+            if len(bins) > self.max_bins:
+                self._collapse(bins)
+        self.count += 1
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def _collapse(self, bins):
+        indexes = sorted(bins)
+        n_merged = len(indexes) - self.max_bins + 1
+        into = indexes[n_merged]
+        bins[into] += sum(bins.pop(i) for i in indexes[:n_merged])
+
+    def merge(self, other):
+        if other._gamma != self._gamma:
+            raise ValueError("Sketches of different accuracy can not be merged")
+        for bins, other_bins in ((self._pos, other._pos), (self._neg, other._neg)):
+            for i, n in other_bins.items():
+                bins[i] = bins.get(i, 0) + n
+            if len(bins) > self.max_bins:
+                self._collapse(bins)
+        self.zeros += other.zeros
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        if not 0 <= q <= 1:
+            raise ValueError(f"Invalid quantile: {q}")
+        if not self.count:
+            return None
+        if q == 0:
+            return self.min
+        if q == 1:
+            return self.max
+        rank = q * (self.count - 1)
+        seen = 0
+        value = None
+        for i in sorted(self._neg, reverse=True):
+            seen += self._neg[i]
+            if seen > rank:
+                value = -self._value(i)
+                break
+        else:
+            seen += self.zeros
+            if seen > rank:
+                value = 0.0
+            else:
+                for i in sorted(self._pos):
+                    seen += self._pos[i]
+                    if seen > rank:
+                        value = self._value(i)
+                        break
+                else:
+                    value = self.max
+        return min(max(value, self.min), self.max)
+
+
+class _Stats:
+    __slots__ = ('count', 'sum', 'min', 'max', 'sketch')
+
+    def __init__(self, sketch=None):
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+        self.sketch = sketch
+
+    def add(self, value):
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if self.sketch is not None:
+            self.sketch.add(value)
+
+    def merge(self, other):
+        self.count += other.count
+        self.sum += other.sum
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        if self.sketch is not None and other.sketch is not None:
+            self.sketch.merge(other.sketch)
+
+
+def _group_value(value):
+    value = raw_value(value)
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+class Aggregation:
+    """Grouped running aggregates, updated one page of records at a time.
+
+    Memory grows with the number of groups, not of records. Values that are
+    missing or not numbers are skipped by every aggregate but count.
+
+        agg = Aggregation('sector', ['count', 'sum(marketCap)', 'p50(marketCap)'])
+        for page in pages:
+            agg.update(page)
+        agg.result()   # {'Technology': {'count': 12, ...}, ...}
+    """
+
+    def __init__(self, group_by=(), aggregates=('count',), relative_accuracy=0.01):
+        if isinstance(group_by, str):
+            group_by = (group_by,)
+        if isinstance(aggregates, str):
+            aggregates = (aggregates,)
+        self.group_by = tuple(group_by)
+        self.relative_accuracy = relative_accuracy
+        self._specs = [(spec, *_parse_spec(spec)) for spec in aggregates]
+        # field -> whether a quantile of it is asked for
+        self._fields = {}
+        for _, func, field, _ in self._specs:
+            if field is not None:
+                self._fields[field] = self._fields.get(field, False) or func == 'quantile'
+        # group key -> [n_records, {field: _Stats}]
+        self._groups = {}
+        self.n_records = 0
+
+    def _new_group(self):
+        return [0, {
+            field: _Stats(QuantileSketch(self.relative_accuracy) if sketch else None)
+            for field, sketch in self._fields.items()
+        }]
+
+    def update(self, records):
+        groups = self._groups
+        group_by = self.group_by
+        fields = list(self._fields)
+        for record in records:
+            key = tuple(_group_value(record.get(name)) for name in group_by)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = self._new_group()
+            group[0] += 1
+            stats = group[1]
+            for field in fields:
+                value = raw_value(record.get(field))
+                if (
+                    isinstance(value, (int, float))
+                    and not isinstance(value, bool)
+                    and not math.isnan(value)
+                ):
+                    stats[field].add(value)
+        self.n_records += len(records)
+        return self
+
+    def merge(self, other):
+        """Add the groups of an Aggregation with the same group_by and aggregates."""
+        if other.group_by != self.group_by or other._specs != self._specs:
+            raise ValueError("Aggregations of different shape can not be merged")
+        for key, (n, other_stats) in other._groups.items():
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = self._new_group()
+            group[0] += n
+            for field, stats in group[1].items():
+                stats.merge(other_stats[field])
+        self.n_records += other.n_records
+        return self
+
+    def __len__(self):
+        return len(self._groups)
+
+    def _summary(self, group):
+        n, stats = group
+        rv = {}
+        for spec, func, field, q in self._specs:
+            if field is None:
+                rv[spec] = n
+                continue
+            s = stats[field]
+            if func == 'count':
+                rv[spec] = s.count
+            elif func == 'sum':
+                rv[spec] = s.sum
+            elif func == 'mean':
+                rv[spec] = s.sum / s.count if s.count else None
+            elif func == 'min':
+                rv[spec] = s.min
+            elif func == 'max':
+                rv[spec] = s.max
+            else:
+                rv[spec] = s.sketch.quantile(q)
+        return rv
+
+    def result(self):
+        """Group -> {aggregate: value}.
+
+        The group is the value of the group_by field when there is one,
+        a tuple of values when there are several, () without group_by.
+        """
+        single = len(self.group_by) == 1
+        return {
+            key[0] if single else key: self._summary(group)
+            for key, group in self._groups.items()
+        }
+
+    def rows(self):
+        """One dict per group, the group_by fields followed by the aggregates."""
+        return [
+            {**dict(zip(self.group_by, key)), **self._summary(group)}
+            for key, group in self._groups.items()
+        ]
+
+
+if __name__ == '__main__':
+    import random
+    import time
+    import tracemalloc
+
+    random.seed(0)
+    sectors = ['Technology', 'Healthcare', 'Energy', 'Utilities', 'Financial Services']
+
+    def page(n_rows):
+        return [
+            {
+                'ticker': f'T{random.randrange(10**6)}',
+                'sector': random.choice(sectors),
+                'marketCap': {'raw': random.lognormvariate(20, 2), 'fmt': ''},
+            }
+            for _ in range(n_rows)
+        ]
+
+    pages = [page(250) for _ in range(240)]
+    tracemalloc.start()
+    start = time.perf_counter()
+    agg = Aggregation('sector', ['count', 'mean(marketCap)', 'p50(marketCap)', 'p99(marketCap)'])
+    for records in pages:
+        agg.update(records)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    caps = sorted(r['marketCap']['raw'] for records in pages for r in records if r['sector'] == 'Energy')
+    exact = caps[int(0.99 * (len(caps) - 1))]
+    print(f"{agg.n_records} records in {elapsed * 1000:.1f} ms, {peak / 1024:.0f} KiB peak")
+    print('Energy p99', agg.result()['Energy']['p99(marketCap)'], 'exact', exact)
@@ -0,0 +1,196 @@
+import os
+import zlib
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _popcount(bits):
+    try:
+        return bits.bit_count()
+    except AttributeError:  # Python 3.9
+        return bin(bits).count('1')
+
+
+class Bitmap:
+    """A set of symbol ids as the bits of one integer.
+
+    Set algebra runs on whole machine words. to_bytes() is zlib compressed,
+    which suits the long zero runs of sparse result sets.
+    """
+
+    __slots__ = ('bits',)
+
+    def __init__(self, bits=0):
+        self.bits = bits
+
+    @classmethod
+    def from_ids(cls, ids):
+        ids = list(ids)
+        if not ids:
+            return cls()
+        if np is not None:
+            ids = np.asarray(ids, dtype=np.int64)
+            flags = np.zeros(int(ids.max()) + 1, dtype=np.uint8)
+            flags[ids] = 1
+            data = np.packbits(flags, bitorder='little').tobytes()
+        else:
+            data = bytearray(max(ids) // 8 + 1)
+            for i in ids:
+                data[i >> 3] |= 1 << (i & 7)
+        return cls(int.from_bytes(data, 'little'))
+
+    def ids(self):
+        if not self.bits:
+            return []
+        data = self.bits.to_bytes((self.bits.bit_length() + 7) // 8, 'little')
+        if np is not None:
+            flags = np.unpackbits(np.frombuffer(data, dtype=np.uint8), bitorder='little')
+            return np.flatnonzero(flags).tolist()
+        rv = []
+        for i, byte in enumerate(data):
+            while byte:
+                low = byte & -byte
+                rv.append((i << 3) + low.bit_length() - 1)
+                byte ^= low
+        return rv
+
+    def __iter__(self):
+        return iter(self.ids())
+
+    def __len__(self):
+        return _popcount(self.bits)
+
+    def __bool__(self):
+        return bool(self.bits)
+
+    def __contains__(self, i):
+        return bool(self.bits >> i & 1)
+
+    def __and__(self, other):
+        return Bitmap(self.bits & other.bits)
+
+    def __or__(self, other):
+        return Bitmap(self.bits | other.bits)
+
+    def __sub__(self, other):
+        return Bitmap(self.bits & ~other.bits)
+
+    def __xor__(self, other):
+        return Bitmap(self.bits ^ other.bits)
+
+    def __eq__(self, other):
+        return isinstance(other, Bitmap) and self.bits == other.bits
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def __repr__(self):
+        return f'Bitmap({len(self)} ids)'
+
+    @staticmethod
+    def union(*bitmaps):
+        bits = 0
+        for bitmap in bitmaps:
+            bits |= bitmap.bits
+        return Bitmap(bits)
+
+    @staticmethod
+    def intersection(first, *bitmaps):
+        bits = first.bits
+        for bitmap in bitmaps:
+            bits &= bitmap.bits
+        return Bitmap(bits)
+
+    def to_bytes(self):
+        data = self.bits.to_bytes((self.bits.bit_length() + 7) // 8, 'little')
+        return zlib.compress(data)
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(int.from_bytes(zlib.decompress(data), 'little'))
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+
+class SymbolIndex:
+    """Stable symbol -> integer id mapping shared by result sets.
+
+    Ids are assigned in order of first appearance and never change. With a
+    path, the index is loaded from the file (one symbol per line) and save()
+    appends the symbols added since.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._ids = {}
+        self._symbols = []
+        self._saved = 0
+        if path is not None and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    self._add(line.rstrip('\n'))
+            self._saved = len(self._symbols)
+
+    def _add(self, symbol):
+        i = self._ids.get(symbol)
+        if i is None:
+            i = self._ids[symbol] = len(self._symbols)
+            self._symbols.append(symbol)
+        return i
+
+    def __len__(self):
+        return len(self._symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self._ids
+
+    def id(self, symbol):
+        if '\n' in symbol:
+            raise ValueError(f"Invalid symbol: {symbol!r}")
+        return self._add(symbol)
+
+    def symbol(self, i):
+        return self._symbols[i]
+
+    def bitmap(self, symbols):
+        return Bitmap.from_ids(self.id(s) for s in symbols)
+
+    def bitmap_of(self, records, key='ticker'):
+        return self.bitmap(r[key] for r in records if r.get(key) is not None)
+
+    def symbols(self, bitmap):
+        return [self._symbols[i] for i in bitmap.ids()]
+
+    def save(self):
+        if self.path is None:
+            raise ValueError("SymbolIndex has no path")
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for symbol in self._symbols[self._saved:]:
+                f.write(symbol + '\n')
+        self._saved = len(self._symbols)
+
+
+if __name__ == '__main__':
+    import random
+    import time
+
+    random.seed(0)
+    index = SymbolIndex()
+    universe = [f'T{i}' for i in range(60_000)]
+    screens = [index.bitmap(random.sample(universe, random.randint(100, 20_000))) for _ in range(300)]
+
+    start = time.perf_counter()
+    hits = Bitmap.intersection(*screens[:3]) - screens[3]
+    total = sum(len(Bitmap.union(a, b)) for a, b in zip(screens, screens[1:]))
+    print(f'{len(hits)} symbols, {total} union total, {(time.perf_counter() - start) * 1000:.1f} ms')
+    print(f'{sum(len(s.to_bytes()) for s in screens) / len(screens):.0f} bytes per stored screen')
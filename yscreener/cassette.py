@@ -0,0 +1,199 @@
+import asyncio
+import gzip
+import json
+import os
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlparse
+
+from aiohttp import ClientResponseError, RequestInfo
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+from .screener_expr import canonicalize
+
+FORMAT_VERSION = 1
+
+
+def interaction_key(method, url, data=None):
+    """Cassette key of a request: method, path and the canonical payload.
+
+    The host and the query string (crumb) are left out, so a cassette
+    recorded against Yahoo replays for any crumb.
+    """
+    key = f"{method.upper()} {urlparse(str(url)).path or '/'}"
+    if data:
+        payload = json.loads(data)
+        if isinstance(payload, dict) and 'query' in payload:
+            payload = {**payload, 'query': canonicalize(payload['query'])}
+        key += ' ' + json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return key
+
+
+class _Response:
+    # The part of aiohttp.ClientResponse YahooFClient uses, over a body
+    # that has been read already.
+    def __init__(self, method, url, status, headers, body):
+        self.method = method
+        self.url = URL(str(url))
+        self.status = status
+        self.headers = CIMultiDictProxy(CIMultiDict(headers))
+        self._body = body
+        self.cookies = SimpleCookie()
+        for value in self.headers.getall('Set-Cookie', []):
+            self.cookies.load(value)
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            info = RequestInfo(self.url, self.method, CIMultiDictProxy(CIMultiDict()), self.url)
+            raise ClientResponseError(info, (), status=self.status, message='', headers=self.headers)
+
+    async def read(self):
+        return self._body
+
+    async def text(self, encoding='utf-8'):
+        return self._body.decode(encoding)
+
+    async def json(self, loads=json.loads, **kwargs):
+        return loads(self._body.decode('utf-8'))
+
+
+class _Request:
+    # async context manager returned by get()/post(), like aiohttp's
+    def __init__(self, coro):
+        self._coro = coro
+
+    async def __aenter__(self):
+        return await self._coro
+
+    async def __aexit__(self, *exc):
+        pass
+
+
+class Cassette:
+    """Recorded cookie, crumb and screener exchanges in a gzipped JSON file.
+
+    recorder(session) and player() stand in for the aiohttp session passed
+    to YahooFClient. Requests with the same key are replayed in the order
+    they were recorded, the last response repeats.
+
+        cassette = Cassette('kr.cassette.gz')
+        rv = await client.screen(cassette.recorder(session), expr)
+        cassette.save()
+
+        rv = await client.screen(Cassette('kr.cassette.gz').player(), expr)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # key -> [{'status', 'headers', 'body', 'elapsed'}]
+        self.interactions = {}
+        if os.path.exists(path):
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                doc = json.load(f)
+            if doc['version'] != FORMAT_VERSION:
+                raise ValueError(f"Unsupported cassette version: {doc['version']}")
+            self.interactions = doc['interactions']
+
+    def __len__(self):
+        return sum(len(responses) for responses in self.interactions.values())
+
+    def recorder(self, session):
+        return _Recorder(self, session)
+
+    def player(self, timing='wire'):
+        """timing='wire' answers at once, 'recorded' waits as long as the original."""
+        if timing not in ('wire', 'recorded'):
+            raise ValueError(f"Invalid timing: {timing}")
+        return _Player(self, timing)
+
+    def save(self):
+        doc = {"version": FORMAT_VERSION, "interactions": self.interactions}
+        tmp = self.path + '.tmp'
+        with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+            json.dump(doc, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+class _Recorder:
+    def __init__(self, cassette, session):
+        self.cassette = cassette
+        self.session = session
+
+    def get(self, url, **kwargs):
+        return _Request(self._request('GET', url, None, kwargs))
+
+    def post(self, url, data=None, **kwargs):
+        return _Request(self._request('POST', url, data, kwargs))
+
+    async def _request(self, method, url, data, kwargs):
+        start = time.perf_counter()
+        async with self.session.request(method, url, data=data, **kwargs) as resp:
+            body = await resp.read()
+            status = resp.status
+            headers = [
+                (name, value) for name, value in resp.headers.items()
+                if name.lower() in ('content-type', 'retry-after', 'set-cookie')
+            ]
+        elapsed = time.perf_counter() - start
+        self.cassette.interactions.setdefault(interaction_key(method, url, data), []).append({
+            "status": status,
+            "headers": headers,
+            "body": body.decode('utf-8'),
+            "elapsed": elapsed,
+        })
+        return _Response(method, url, status, headers, body)
+
+
+class _Player:
+    def __init__(self, cassette, timing):
+        self.cassette = cassette
+        self.timing = timing
+        self._played = {}
+
+    def get(self, url, **kwargs):
+        return _Request(self._request('GET', url, None))
+
+    def post(self, url, data=None, **kwargs):
+        return _Request(self._request('POST', url, data))
+
+    async def _request(self, method, url, data):
+        key = interaction_key(method, url, data)
+        responses = self.cassette.interactions.get(key)
+        if not responses:
+            raise KeyError(f"Not in cassette: {key}")
+        i = self._played.get(key, 0)
+        self._played[key] = i + 1
+        r = responses[min(i, len(responses) - 1)]
+        if self.timing == 'recorded':
+            await asyncio.sleep(r['elapsed'])
+        return _Response(method, url, r['status'], r['headers'], r['body'].encode('utf-8'))
+
+
+if __name__ == '__main__':
+    import tempfile
+
+    from aiohttp import ClientSession
+
+    from .mock_server import MockYahooServer
+    from .yscreener_client import YahooFClient
+
+    async def main():
+        expr = 'region=="us" && intradaymarketcap > 100M'
+        path = os.path.join(tempfile.mkdtemp(), 'us.cassette.gz')
+        async with MockYahooServer(latency=0.02) as server:
+            async with ClientSession() as session:
+                cassette = Cassette(path)
+                start = time.perf_counter()
+                recorded = await YahooFClient(base_url=server.url).screen(cassette.recorder(session), expr)
+                print(f'recorded {len(recorded)} records in {time.perf_counter() - start:.2f}s')
+                cassette.save()
+
+        cassette = Cassette(path)
+        print(f'{len(cassette)} exchanges, {os.path.getsize(path) / 2**20:.1f} MiB')
+        for timing in ('wire', 'recorded'):
+            start = time.perf_counter()
+            rv = await YahooFClient().screen(cassette.player(timing), expr)
+            print(f'{timing}: {len(rv)} records in {time.perf_counter() - start:.2f}s, same: {rv == recorded}')
+
+    asyncio.run(main())
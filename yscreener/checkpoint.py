@@ -0,0 +1,94 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from .screener_expr import canonicalize
+
+
+def crawl_fingerprint(query, opt={}):
+    payload = {"query": canonicalize(query), "opt": opt}
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+class CrawlCheckpoint:
+    """Completed pages of running crawls in a SQLite file.
+
+    A crawl is identified by the fingerprint of its canonical query and opt.
+    Pages older than max_age seconds are not reused, and the pages of a
+    crawl are dropped once it completes. Any thread may use it, e.g. the
+    loop thread of a SyncYahooFClient.
+    """
+
+    def __init__(self, path, max_age=3600):
+        self.path = path
+        self.max_age = max_age
+        # one connection for every thread, calls take turns on the lock
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS crawls ('
+            ' fingerprint TEXT PRIMARY KEY, total INTEGER NOT NULL, created REAL NOT NULL)'
+        )
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS pages ('
+            ' fingerprint TEXT NOT NULL, offset INTEGER NOT NULL, records TEXT NOT NULL,'
+            ' created REAL NOT NULL, PRIMARY KEY (fingerprint, offset))'
+        )
+        self._db.commit()
+
+    def load(self, fingerprint):
+        """Return (total, {offset: records}) of a crawl, total is None if unknown."""
+        oldest = time.time() - self.max_age
+        with self._lock:
+            row = self._db.execute(
+                'SELECT total, created FROM crawls WHERE fingerprint = ?', (fingerprint,)
+            ).fetchone()
+            if row is None or row[1] < oldest:
+                self._discard(fingerprint)
+                return None, {}
+            rows = self._db.execute(
+                'SELECT offset, records FROM pages WHERE fingerprint = ? AND created >= ?',
+                (fingerprint, oldest)
+            ).fetchall()
+        pages = {offset: json.loads(records) for offset, records in rows}
+        return row[0], pages
+
+    def begin(self, fingerprint, total):
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO crawls (fingerprint, total, created) VALUES (?, ?, ?)',
+                (fingerprint, total, time.time())
+            )
+            self._db.commit()
+
+    def save_page(self, fingerprint, offset, records):
+        data = json.dumps(records, ensure_ascii=False)
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO pages (fingerprint, offset, records, created) VALUES (?, ?, ?, ?)',
+                (fingerprint, offset, data, time.time())
+            )
+            self._db.commit()
+
+    def discard(self, fingerprint):
+        with self._lock:
+            self._discard(fingerprint)
+
+    def _discard(self, fingerprint):
+        self._db.execute('DELETE FROM pages WHERE fingerprint = ?', (fingerprint,))
+        self._db.execute('DELETE FROM crawls WHERE fingerprint = ?', (fingerprint,))
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,76 @@
+import itertools
+import random
+from types import MappingProxyType
+
+# The headers of crawlee's HeaderGenerator (crawlee/fingerprint_suite), from
+# fingerprint_data.py, which is imported on first use.
+
+BROWSER_TYPES = ('chromium', 'firefox', 'webkit')
+
+_user_agents = None
+# browser type -> HeaderProfile
+_profiles = {}
+
+
+class HeaderProfile:
+    """The headers of a browser type, read-only and shared by every client."""
+
+    __slots__ = ('browser_type', 'headers', 'json_post_headers')
+
+    def __init__(self, browser_type):
+        headers = browser_headers(browser_type)
+        self.browser_type = browser_type
+        self.headers = MappingProxyType(headers)
+        self.json_post_headers = MappingProxyType({**headers, 'Content-Type': 'application/json'})
+
+
+def header_profile(browser_type):
+    """The HeaderProfile of browser_type, built once per process."""
+    profile = _profiles.get(browser_type)
+    if profile is None:
+        profile = _profiles.setdefault(browser_type, HeaderProfile(browser_type))
+    return profile
+
+
+def browser_headers(browser_type):
+    """Accept, Accept-Language, User-Agent and, for chromium, Sec-Ch-Ua headers."""
+    from . import fingerprint_data as data
+
+    headers = {
+        'Accept': data.COMMON_ACCEPT,
+        'Accept-Language': data.COMMON_ACCEPT_LANGUAGE,
+    }
+    if browser_type == 'chromium':
+        headers['User-Agent'] = data.PW_CHROMIUM_HEADLESS_DEFAULT_USER_AGENT
+        headers['Sec-Ch-Ua'] = data.PW_CHROMIUM_HEADLESS_DEFAULT_SEC_CH_UA
+        headers['Sec-Ch-Ua-Mobile'] = data.PW_CHROMIUM_HEADLESS_DEFAULT_SEC_CH_UA_MOBILE
+        headers['Sec-Ch-Ua-Platform'] = data.PW_CHROMIUM_HEADLESS_DEFAULT_SEC_CH_UA_PLATFORM
+    elif browser_type == 'firefox':
+        headers['User-Agent'] = data.PW_FIREFOX_HEADLESS_DEFAULT_USER_AGENT
+    elif browser_type == 'webkit':
+        headers['User-Agent'] = data.PW_WEBKIT_HEADLESS_DEFAULT_USER_AGENT
+    else:
+        raise ValueError(f"Unsupported browser type: {browser_type}")
+    return headers
+
+
+def random_user_agent(rng=random):
+    """A user agent of crawlee's USER_AGENT_POOL, as likely as in the pool."""
+    global _user_agents
+    if _user_agents is None:
+        from .fingerprint_data import USER_AGENTS
+
+        agents, weights = zip(*USER_AGENTS)
+        _user_agents = agents, tuple(itertools.accumulate(weights))
+    agents, cum_weights = _user_agents
+    return rng.choices(agents, cum_weights=cum_weights)[0]
+
+
+if __name__ == '__main__':
+    import collections
+
+    counts = collections.Counter(random_user_agent() for _ in range(10000))
+    for user_agent, n in counts.most_common(5):
+        print(f'{n:>6} {user_agent}')
+    for browser_type in BROWSER_TYPES:
+        print(browser_type, dict(header_profile(browser_type).json_post_headers))
@@ -0,0 +1,182 @@
+import bisect
+import time
+from types import SimpleNamespace
+from urllib.parse import urlparse
+
+# Events YahooFClient emits to its hooks, hook(event, value, labels):
+#   http_dns_seconds, http_connect_seconds, http_ttfb_seconds   trace_config()
+#   http_body_seconds, http_response_bytes, decode_seconds      screener responses
+#   ratelimit_wait_seconds                                      RateLimiter.acquire()
+#   auth_seconds {step=cookie|crumb}
+#   retries_total {reason=429|401}
+#   cache_hits_total, cache_misses_total
+#   screen_seconds, screen_pages
+# http_* events carry an endpoint label (cookie, crumb or screener).
+# Names ending in _total are counters, the others histograms.
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = tuple(1024 * 4 ** i for i in range(8))
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+
+def _buckets(name):
+    if name.endswith('_seconds'):
+        return SECONDS_BUCKETS
+    if name.endswith('_bytes'):
+        return BYTES_BUCKETS
+    return COUNT_BUCKETS
+
+
+def endpoint(url):
+    path = urlparse(str(url)).path
+    if path.endswith('/screener'):
+        return 'screener'
+    if path.endswith('/getcrumb'):
+        return 'crumb'
+    return 'cookie'
+
+
+class Histogram:
+    __slots__ = ('bounds', 'counts', 'count', 'sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # the last count is the +Inf bucket
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q quantile."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = [*key, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """In-process counters and histograms, a YahooFClient hook.
+
+        metrics = Metrics()
+        client = YahooFClient(hooks=[metrics])
+        ...
+        print(metrics.prometheus())
+    """
+
+    def __init__(self, prefix='yscreener'):
+        self.prefix = prefix
+        # name -> {label key: value or Histogram}
+        self.counters = {}
+        self.histograms = {}
+
+    def __call__(self, event, value, labels):
+        if event.endswith('_total'):
+            self.inc(event, value, **labels)
+        else:
+            self.observe(event, value, **labels)
+
+    def inc(self, name, value=1, **labels):
+        series = self.counters.setdefault(name, {})
+        key = _label_key(labels)
+        series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        series = self.histograms.setdefault(name, {})
+        key = _label_key(labels)
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram(_buckets(name))
+        histogram.observe(value)
+
+    def counter(self, name, **labels):
+        return self.counters.get(name, {}).get(_label_key(labels), 0)
+
+    def histogram(self, name, **labels):
+        return self.histograms.get(name, {}).get(_label_key(labels))
+
+    def clear(self):
+        self.counters.clear()
+        self.histograms.clear()
+
+    def prometheus(self):
+        """Prometheus text exposition format."""
+        lines = []
+        for name in sorted(self.counters):
+            metric = f'{self.prefix}_{name}'
+            lines.append(f'# TYPE {metric} counter')
+            for key, value in sorted(self.counters[name].items()):
+                lines.append(f'{metric}{_format_labels(key)} {_format_number(value)}')
+        for name in sorted(self.histograms):
+            metric = f'{self.prefix}_{name}'
+            lines.append(f'# TYPE {metric} histogram')
+            for key, h in sorted(self.histograms[name].items()):
+                cumulative = 0
+                for bound, n in zip((*h.bounds, float('inf')), h.counts):
+                    cumulative += n
+                    labels = _format_labels(key, (('le', _format_number(bound)),))
+                    lines.append(f'{metric}_bucket{labels} {cumulative}')
+                lines.append(f'{metric}_sum{_format_labels(key)} {_format_number(h.sum)}')
+                lines.append(f'{metric}_count{_format_labels(key)} {h.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def trace_config(emit):
+    """aiohttp TraceConfig reporting DNS, connect and TTFB times to emit(event, value, **labels)."""
+    from aiohttp import TraceConfig
+
+    trace = TraceConfig(trace_config_ctx_factory=lambda trace_request_ctx=None: SimpleNamespace())
+
+    async def on_request_start(session, ctx, params):
+        ctx.start = time.perf_counter()
+        ctx.endpoint = endpoint(params.url)
+
+    async def on_dns_resolvehost_start(session, ctx, params):
+        ctx.dns_start = time.perf_counter()
+
+    async def on_dns_resolvehost_end(session, ctx, params):
+        emit('http_dns_seconds', time.perf_counter() - ctx.dns_start, endpoint=ctx.endpoint)
+
+    async def on_connection_create_start(session, ctx, params):
+        ctx.connect_start = time.perf_counter()
+
+    async def on_connection_create_end(session, ctx, params):
+        emit('http_connect_seconds', time.perf_counter() - ctx.connect_start, endpoint=ctx.endpoint)
+
+    async def on_request_end(session, ctx, params):
+        # response headers are in
+        emit('http_ttfb_seconds', time.perf_counter() - ctx.start, endpoint=ctx.endpoint)
+
+    trace.on_request_start.append(on_request_start)
+    trace.on_dns_resolvehost_start.append(on_dns_resolvehost_start)
+    trace.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+    trace.on_connection_create_start.append(on_connection_create_start)
+    trace.on_connection_create_end.append(on_connection_create_end)
+    trace.on_request_end.append(on_request_end)
+    return trace
@@ -0,0 +1,269 @@
+import asyncio
+import json
+import random
+import secrets
+import time
+from collections import OrderedDict
+
+from aiohttp import web
+
+from .screener_eval import Evaluator, raw_value
+from .screener_expr import canonicalize
+from .yscreener_client import YahooFClient
+
+# Screener fields of the synthetic records. Records use the screener names
+# except for these, which the records response renames.
+RECORD_KEYS = YahooFClient.RECORD_KEYS
+
+_REGIONS = {
+    # region: (weight, exchanges)
+    'us': (40, ('NMS', 'NYQ', 'ASE', 'PNK')),
+    'jp': (12, ('JPX',)),
+    'cn': (10, ('SHH', 'SHZ')),
+    'in': (8, ('NSI', 'BSE')),
+    'kr': (6, ('KSC', 'KOE')),
+    'gb': (5, ('LSE',)),
+    'ca': (5, ('TOR', 'VAN')),
+    'de': (4, ('GER', 'FRA')),
+    'hk': (4, ('HKG',)),
+    'au': (3, ('ASX',)),
+    'fr': (3, ('PAR',)),
+}
+
+_SECTORS = (
+    'Technology', 'Healthcare', 'Financial Services', 'Consumer Cyclical', 'Industrials',
+    'Communication Services', 'Consumer Defensive', 'Energy', 'Basic Materials',
+    'Real Estate', 'Utilities',
+)
+
+
+def _fmt(value):
+    if value is None:
+        return None
+    if isinstance(value, float):
+        return {"raw": value, "fmt": f'{value:.2f}'}
+    return {"raw": value, "fmt": str(value)}
+
+
+def synthetic_universe(n_records=20_000, seed=0):
+    """Records shaped like a formatted records response, in a fixed order."""
+    rng = random.Random(seed)
+    regions = list(_REGIONS)
+    weights = [_REGIONS[r][0] for r in regions]
+    records = []
+    for i in range(n_records):
+        region = rng.choices(regions, weights)[0]
+        price = round(rng.lognormvariate(3, 1.2), 2)
+        marketcap = int(rng.lognormvariate(20, 2.2))
+        eps = rng.gauss(1, 3)
+        record = {
+            'ticker': f'S{i:05d}.{region.upper()}',
+            'companyName': f'Synthetic {i}',
+            'region': region,
+            'exchange': rng.choice(_REGIONS[region][1]),
+            'sector': rng.choice(_SECTORS),
+            'intradaymarketcap': marketcap,
+            'intradayprice': price,
+            'peratio.lasttwelvemonths': round(price / eps, 2) if eps > 0.05 else None,
+            'dividendyield': round(rng.expovariate(1 / 2.5), 2) if rng.random() < 0.6 else None,
+            'beta': round(rng.gauss(1, 0.5), 3),
+            'avgdailyvol3m': int(rng.lognormvariate(12, 2)),
+            'percentchange': round(rng.gauss(0, 2), 2),
+        }
+        records.append({
+            RECORD_KEYS.get(name, name): value if isinstance(value, str) else _fmt(value)
+            for name, value in record.items()
+        })
+    return records
+
+
+class MockYahooServer:
+    """Local stand-in for fc.yahoo.com, getcrumb and the screener endpoint.
+
+    Screens a synthetic universe with the posted query, honoring sortField,
+    sortType, offset and size, and answers with the total like Yahoo.
+    Faults are injected on screener requests: latency plus uniform jitter
+    seconds, a 429 with probability rate_429, a 401 (Invalid Crumb)
+    once a crumb is older than crumb_ttl seconds, and a connection dropped
+    halfway through the response body with probability drop_rate or for
+    every request after the first drop_after.
+
+        async with MockYahooServer() as server:
+            client = YahooFClient(base_url=server.url)
+    """
+
+    def __init__(
+        self,
+        records=None,
+        n_records=20_000,
+        seed=0,
+        latency=0.0,
+        jitter=0.0,
+        rate_429=0.0,
+        retry_after=None,
+        crumb_ttl=None,
+        drop_rate=0.0,
+        drop_after=None,
+        max_size=250,
+        host='127.0.0.1',
+        port=0,
+    ):
+        self.records = synthetic_universe(n_records, seed) if records is None else records
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.crumb_ttl = crumb_ttl
+        self.drop_rate = drop_rate
+        # screener requests served before the server stops answering, None
+        # for no limit; set it back to None to "restart" the server
+        self.drop_after = drop_after
+        self.max_size = max_size
+        self.host = host
+        self.port = port
+        self.url = None
+        self.stats = {'cookie': 0, 'crumb': 0, 'screener': 0, '401': 0, '429': 0, 'dropped': 0, 'served': 0}
+        self._rng = random.Random(seed)
+        self._crumbs = {}
+        # (query, sortField, sortType) -> screened records
+        self._results = OrderedDict()
+        self._runner = None
+
+        self.app = web.Application()
+        self.app.router.add_get('/', self._cookie)
+        self.app.router.add_get('/v1/test/getcrumb', self._crumb)
+        self.app.router.add_post('/v1/finance/screener', self._screener)
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        self.url = f'http://{self.host}:{self.port}'
+        return self.url
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def expire_crumbs(self):
+        self._crumbs.clear()
+
+    def set_records(self, records):
+        # the universe changed, e.g. between two screen_delta() calls
+        self.records = records
+        self._results.clear()
+
+    async def _cookie(self, request):
+        self.stats['cookie'] += 1
+        # fc.yahoo.com answers 404 but sets the cookie
+        response = web.Response(status=404, text='Not Found')
+        response.set_cookie('A3', secrets.token_hex(16), httponly=True)
+        return response
+
+    async def _crumb(self, request):
+        self.stats['crumb'] += 1
+        crumb = secrets.token_urlsafe(8)
+        self._crumbs[crumb] = time.monotonic()
+        return web.Response(text=crumb)
+
+    def _error(self, status, code, description):
+        body = {"finance": {"result": None, "error": {"code": code, "description": description}}}
+        return web.json_response(body, status=status)
+
+    def _screen(self, query, sort_field, sort_type):
+        key = (json.dumps(canonicalize(query), sort_keys=True), sort_field, sort_type)
+        rv = self._results.get(key)
+        if rv is not None:
+            self._results.move_to_end(key)
+            return rv
+        rv = Evaluator(query, RECORD_KEYS).filter(self.records)
+        if sort_field:
+            sort_key = RECORD_KEYS.get(sort_field, sort_field)
+            # records without the field go last either way
+            present = [r for r in rv if raw_value(r.get(sort_key)) is not None]
+            missing = [r for r in rv if raw_value(r.get(sort_key)) is None]
+            present.sort(key=lambda r: raw_value(r.get(sort_key)), reverse=sort_type == 'desc')
+            rv = present + missing
+        self._results[key] = rv
+        if len(self._results) > 64:
+            self._results.popitem(last=False)
+        return rv
+
+    async def _screener(self, request):
+        self.stats['screener'] += 1
+        delay = self.latency + self._rng.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if self.rate_429 and self._rng.random() < self.rate_429:
+            self.stats['429'] += 1
+            headers = {} if self.retry_after is None else {'Retry-After': str(self.retry_after)}
+            return web.Response(status=429, text='Too Many Requests', headers=headers)
+
+        issued = self._crumbs.get(request.query.get('crumb'))
+        if issued is None or (self.crumb_ttl is not None and time.monotonic() - issued > self.crumb_ttl):
+            self.stats['401'] += 1
+            return self._error(401, 'Unauthorized', 'Invalid Crumb')
+
+        try:
+            payload = await request.json()
+            query = payload['query']
+            offset = int(payload.get('offset', 0))
+            size = min(int(payload.get('size', 25)), self.max_size)
+            rv = self._screen(query, payload.get('sortField'), payload.get('sortType', 'desc'))
+        except (ValueError, KeyError, TypeError) as e:
+            return self._error(400, 'Bad Request', str(e))
+
+        records = rv[offset:offset + size]
+        result = {
+            "start": offset,
+            "count": len(records),
+            "total": len(rv),
+            "records": records,
+        }
+        body = json.dumps({"finance": {"result": [result], "error": None}}).encode('utf-8')
+        if (
+            (self.drop_after is not None and self.stats['served'] >= self.drop_after)
+            or (self.drop_rate and self._rng.random() < self.drop_rate)
+        ):
+            return await self._drop(request, body)
+        self.stats['served'] += 1
+        return web.Response(body=body, content_type='application/json')
+
+    async def _drop(self, request, body):
+        # headers and half the body, then the connection goes away
+        self.stats['dropped'] += 1
+        response = web.StreamResponse(headers={'Content-Type': 'application/json'})
+        response.content_length = len(body)
+        await response.prepare(request)
+        await response.write(body[:len(body) // 2])
+        request.transport.abort()
+        return response
+
+
+if __name__ == '__main__':
+    from aiohttp import ClientSession
+
+    from .yscreener_client import YahooFClient
+
+    async def main():
+        async with MockYahooServer(latency=0.01, jitter=0.01, rate_429=0.05, crumb_ttl=0.5) as server:
+            client = YahooFClient(base_url=server.url)
+            async with ClientSession() as session:
+                start = time.perf_counter()
+                rv = await client.screen(session, 'region=="us" && intradaymarketcap > 100M')
+                elapsed = time.perf_counter() - start
+                n = await client.count(session, 'region=="us" && intradaymarketcap > 100M')
+            print(f'{len(rv)} of {n} records in {elapsed:.2f}s, {server.stats}')
+
+    asyncio.run(main())
@@ -0,0 +1,243 @@
+import contextvars
+import io
+import json
+import os
+import re
+import threading
+import time
+
+from .tracing import NULL_SPAN
+
+# Phases the client reports, see phase(). Concurrent pages overlap, so
+# phase times can add up to more than the screen took.
+PHASES = ('parse', 'serialize', 'ratelimit', 'network', 'decode', 'accumulate')
+
+_current = contextvars.ContextVar('yscreener_profile', default=None)
+
+
+class _Phase:
+    __slots__ = ('profile', 'name', 'start')
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def phase(name):
+    """Time a block as a phase of the profile being recorded, if any."""
+    profile = _current.get()
+    if profile is None:
+        return NULL_SPAN
+    return _Phase(profile, name)
+
+
+class Profile:
+    def __init__(self, label):
+        self.label = label
+        self.seconds = None
+        # phase -> [seconds, count]
+        self.phases = {}
+        self.functions = []
+        self.allocations = []
+        self.peak_memory = None
+        self.path = None
+
+    def add(self, name, seconds):
+        entry = self.phases.get(name)
+        if entry is None:
+            self.phases[name] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def to_dict(self):
+        return {
+            "label": self.label,
+            "seconds": self.seconds,
+            "phases": {name: {"seconds": s, "count": n} for name, (s, n) in self.phases.items()},
+            "functions": self.functions,
+            "allocations": self.allocations,
+            "peak_memory": self.peak_memory,
+        }
+
+    def report(self):
+        lines = [f'{self.label}: {self.seconds * 1000:.1f} ms']
+        for name in sorted(self.phases, key=lambda n: -self.phases[n][0]):
+            seconds, count = self.phases[name]
+            lines.append(f'  {name:<12} {seconds * 1000:9.1f} ms {count:>6}x')
+        if self.functions:
+            lines.append('  top functions (tottime):')
+            for f in self.functions[:10]:
+                lines.append(f"    {f['tottime'] * 1000:8.1f} ms {f['ncalls']:>8} {f['function']}")
+        if self.allocations:
+            lines.append('  top allocations:')
+            for a in self.allocations[:10]:
+                lines.append(f"    {a['size'] / 1024:8.1f} KiB {a['count']:>8} {a['location']}")
+        return '\n'.join(lines)
+
+
+class _Recording:
+    def __init__(self, profiler, label):
+        self.profiler = profiler
+        self.profile = Profile(label)
+
+    def __enter__(self):
+        profiler = self.profiler
+        # one cProfile per thread at a time, overlapping screens of the
+        # same thread (or loop) get phases and allocations only
+        self._cprofile = None
+        if profiler.cpu and not getattr(profiler._cpu, 'busy', False):
+            import cProfile
+
+            profiler._cpu.busy = True
+            self._cprofile = cProfile.Profile()
+        if profiler.memory:
+            import tracemalloc
+
+            # tracing is shared by overlapping recordings
+            if not profiler._recording and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                profiler._started_tracing = True
+            profiler._recording += 1
+            tracemalloc.reset_peak()
+            self._before = tracemalloc.take_snapshot()
+        self._token = _current.set(self.profile)
+        self._start = time.perf_counter()
+        if self._cprofile is not None:
+            try:
+                self._cprofile.enable()
+            except ValueError:
+                # Python 3.12+ allows one active profiler per process
+                profiler._cpu.busy = False
+                self._cprofile = None
+        return self.profile
+
+    def __exit__(self, *exc):
+        profiler = self.profiler
+        profile = self.profile
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            profiler._cpu.busy = False
+        profile.seconds = time.perf_counter() - self._start
+        _current.reset(self._token)
+
+        if profiler.memory:
+            import tracemalloc
+
+            after = tracemalloc.take_snapshot()
+            profile.peak_memory = tracemalloc.get_traced_memory()[1]
+            profiler._recording -= 1
+            if not profiler._recording and profiler._started_tracing:
+                tracemalloc.stop()
+                profiler._started_tracing = False
+            for stat in after.compare_to(self._before, 'lineno')[:profiler.top]:
+                frame = stat.traceback[0]
+                profile.allocations.append({
+                    "location": f'{frame.filename}:{frame.lineno}',
+                    "size": stat.size_diff,
+                    "count": stat.count_diff,
+                })
+
+        stats = None
+        if self._cprofile is not None:
+            import pstats
+
+            stats = pstats.Stats(self._cprofile, stream=io.StringIO())
+            rows = sorted(stats.stats.items(), key=lambda item: -item[1][2])[:profiler.top]
+            for (filename, lineno, name), (cc, ncalls, tottime, cumtime, _) in rows:
+                profile.functions.append({
+                    "function": f'{filename}:{lineno}({name})',
+                    "ncalls": ncalls,
+                    "tottime": tottime,
+                    "cumtime": cumtime,
+                })
+
+        profiler.profiles.append(profile)
+        if profiler.output_dir is not None:
+            profiler._dump(profile, stats)
+        return False
+
+
+class Profiler:
+    """Opt-in CPU and allocation profiling, YahooFClient(profiler=Profiler(...)).
+
+    Each screen() is recorded as a Profile: time per phase (parse,
+    serialize, ratelimit, network, decode, accumulate), the top cProfile
+    functions and the top tracemalloc allocation sites. cProfile runs for
+    one recording per thread at a time: of overlapping screens on a loop,
+    the first one. With output_dir, every profile is written as
+    <n>-<label>.json and, with cpu, as a <n>-<label>.prof pstats file.
+    """
+
+    def __init__(self, output_dir=None, top=25, cpu=True, memory=True):
+        self.output_dir = output_dir
+        self.top = top
+        self.cpu = cpu
+        self.memory = memory
+        self.profiles = []
+        # .busy while a recording of the thread runs cProfile
+        self._cpu = threading.local()
+        self._recording = 0
+        self._started_tracing = False
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+
+    def profile(self, label):
+        return _Recording(self, label)
+
+    def parse(self, text, repeat=1):
+        """Profile parse_screener_expr(text), repeat times."""
+        from .screener_expr import parse_screener_expr
+
+        with self.profile(f'parse x{repeat}') as profile:
+            for _ in range(repeat):
+                with phase('parse'):
+                    query = parse_screener_expr(text)
+        return query, profile
+
+    def _dump(self, profile, stats):
+        name = re.sub(r'[^A-Za-z0-9_.=-]+', '_', profile.label)[:60].strip('_') or 'screen'
+        base = os.path.join(self.output_dir, f'{len(self.profiles):04d}-{name}')
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(profile.to_dict(), f, indent=2, ensure_ascii=False)
+        profile.path = base + '.json'
+        if stats is not None:
+            stats.dump_stats(base + '.prof')
+
+
+def compare(base_path, new_path):
+    """Phase by phase change between two dumped profiles, as text."""
+    with open(base_path, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+    lines = [f"{base['label']}: {base['seconds'] * 1000:.1f} -> {new['seconds'] * 1000:.1f} ms"]
+    names = list(base['phases']) + [n for n in new['phases'] if n not in base['phases']]
+    for name in names:
+        b = base['phases'].get(name, {}).get('seconds', 0)
+        n = new['phases'].get(name, {}).get('seconds', 0)
+        change = f'{n / b - 1:+.1%}' if b else 'new'
+        lines.append(f'  {name:<12} {b * 1000:9.1f} -> {n * 1000:9.1f} ms {change}')
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) == 3:
+        print(compare(sys.argv[1], sys.argv[2]))
+    else:
+        profiler = Profiler(memory=True)
+        _, profile = profiler.parse(
+            'region=="us" && intradaymarketcap[2B:100B] && (beta < 0.8 || sector in ["Utilities", "Energy"])',
+            repeat=2000,
+        )
+        print(profile.report())
@@ -0,0 +1,38 @@
+import asyncio
+import time
+
+
+class RateLimiter:
+    """Token bucket shared by every request of a client.
+
+    Allows rate requests per second on average and bursts of up to burst
+    requests. acquire() returns the seconds it waited.
+    """
+
+    def __init__(self, rate, burst=1):
+        if rate <= 0:
+            raise ValueError(f"Rate must be positive: {rate}")
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        if self._lock is None:
+            # created lazily, on the loop that uses it
+            self._lock = asyncio.Lock()
+        start = time.monotonic()
+        # the lock keeps waiters in FIFO order
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+        return time.monotonic() - start
@@ -0,0 +1,263 @@
+import asyncio
+import math
+import random
+import re
+from statistics import NormalDist
+
+from .screener_eval import Evaluator, raw_value
+from .screener_expr import split_in_list
+
+# mean(field) | sum(field) | share(screener expr) | count(screener expr)
+_SPEC = re.compile(r'^\s*(mean|sum|share|count)\s*\((.+)\)\s*$', re.DOTALL)
+
+
+class Estimate:
+    __slots__ = ('value', 'half_width')
+
+    def __init__(self, value, half_width):
+        self.value = value
+        self.half_width = half_width
+
+    @property
+    def low(self):
+        return None if self.value is None else self.value - self.half_width
+
+    @property
+    def high(self):
+        return None if self.value is None else self.value + self.half_width
+
+    def __repr__(self):
+        return f'Estimate({self.value!r} ± {self.half_width!r})'
+
+
+class _Statistic:
+    # A ratio of two page totals, sum(y) / sum(m): y is the value and m is 1
+    # per record with a value for mean(), y is 1 per matching record and m
+    # is 1 per record for share().
+    def __init__(self, spec, fields=None):
+        m = _SPEC.match(spec)
+        if not m:
+            raise ValueError(f"Invalid statistic: {spec}")
+        self.spec = spec
+        self.func, arg = m.group(1), m.group(2).strip()
+        if self.func in ('mean', 'sum'):
+            self.field = arg
+            self.evaluator = None
+        else:
+            self.field = None
+            self.evaluator = Evaluator(arg, fields)
+
+    def page_totals(self, records):
+        if self.evaluator is not None:
+            return sum(1 for r in records if self.evaluator.match(r)), len(records)
+        y = 0
+        m = 0
+        for record in records:
+            value = raw_value(record.get(self.field))
+            if (
+                isinstance(value, (int, float))
+                and not isinstance(value, bool)
+                and not math.isnan(value)
+            ):
+                y += value
+                m += 1
+        return y, m
+
+    def scale(self, m_hat, n_records):
+        # the ratio is a mean or a share, sum() scales it up to the estimated
+        # number of valued records, count() to the number of records, which
+        # the first pages give exactly
+        if self.func == 'sum':
+            return m_hat
+        if self.func == 'count':
+            return n_records
+        return 1
+
+    def relative(self):
+        # mean() and sum() are held to a relative precision, share() and
+        # count() to an absolute one on the share
+        return self.func in ('mean', 'sum')
+
+
+class SampleResult:
+    def __init__(self, estimates, total, n_pages, n_sampled, exact):
+        self.estimates = estimates
+        self.total = total
+        self.n_pages = n_pages
+        # pages fetched, the first one included
+        self.n_sampled = n_sampled
+        self.exact = exact
+
+    def __getitem__(self, spec):
+        return self.estimates[spec]
+
+    def __repr__(self):
+        items = ', '.join(f'{spec}: {e!r}' for spec, e in self.estimates.items())
+        return f'SampleResult({self.n_sampled}/{self.n_pages} pages, {items})'
+
+
+def _estimate(strata, z):
+    # strata holds (first, sampled, n_rest) per 'in' list chunk of the
+    # query. Page 0 of a chunk is always fetched and counted exactly. The
+    # other pages are a simple random sample of its n_rest pages; their
+    # totals are estimated with the ratio estimator of cluster sampling,
+    # stratified by chunk.
+    y_hat = m_hat = 0
+    for (y0, m0), sampled, n_rest in strata:
+        y_hat += y0
+        m_hat += m0
+        n = len(sampled)
+        if n:
+            y_hat += n_rest * sum(y for y, _ in sampled) / n
+            m_hat += n_rest * sum(m for _, m in sampled) / n
+    if not m_hat:
+        return Estimate(None, math.inf), 0
+    ratio = y_hat / m_hat
+
+    var = 0.0
+    for _, sampled, n_rest in strata:
+        n = len(sampled)
+        if n == n_rest:
+            continue
+        if n < 2:
+            return Estimate(ratio, math.inf), m_hat
+        s2 = sum((y - ratio * m) ** 2 for y, m in sampled) / (n - 1)
+        var += n_rest ** 2 * (1 - n / n_rest) * s2 / n
+    return Estimate(ratio, z * math.sqrt(var) / m_hat), m_hat
+
+
+def _precise(stat, estimate, precision):
+    if stat.relative():
+        if not estimate.value:
+            return estimate.half_width == 0
+        return estimate.half_width <= precision * abs(estimate.value)
+    return estimate.half_width <= precision
+
+
+async def sample_screen(
+    client,
+    session,
+    query,
+    statistics,
+    precision=0.02,
+    confidence=0.95,
+    opt={},
+    min_pages=10,
+    max_pages=None,
+    fields=None,
+    seed=None,
+):
+    """Estimate statistics of a screen from a random sample of its pages.
+
+    The first page gives the total, the other pages are fetched in random
+    order, MAX_CONCURRENCY at a time, until every statistic is within
+    precision at the given confidence (relative for mean/sum, absolute for
+    share/count), or max_pages pages are fetched. Pages hold consecutive
+    records of the sort order, so at least min_pages are sampled.
+    An 'in' list longer than client.IN_CHUNK_SIZE is split as screen()
+    splits it, each chunk is a stratum with its own first page.
+    """
+    stats = [_Statistic(spec, fields) for spec in statistics]
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    rng = random.Random(seed)
+    page_size = client.MAX_ITEM
+
+    # an 'in' list longer than IN_CHUNK_SIZE is sampled per chunk, like
+    # screen() requests it
+    queries = split_in_list(query, client.IN_CHUNK_SIZE)
+    url = await client._screener_url(session)
+    firsts = await asyncio.gather(*(
+        client._fetch_page(session, url, q, opt, 0, page_size, total=True) for q in queries
+    ))
+    totals = [total for _, total in firsts]
+    first = [[stat.page_totals(records) for records, _ in firsts] for stat in stats]
+
+    n_rest = [max(1, math.ceil(total / page_size)) - 1 for total in totals]
+    offsets = [(h, i * page_size) for h, n in enumerate(n_rest) for i in range(1, n + 1)]
+    rng.shuffle(offsets)
+    if max_pages is not None:
+        offsets = offsets[:max(0, max_pages - len(queries))]
+    # stat -> chunk -> sampled page totals
+    sampled = [[[] for _ in queries] for _ in stats]
+
+    def estimates(scaled=True):
+        rv = {}
+        for stat, stat_first, stat_sampled in zip(stats, first, sampled):
+            estimate, m_hat = _estimate(list(zip(stat_first, stat_sampled, n_rest)), z)
+            k = stat.scale(m_hat, sum(totals)) if scaled else 1
+            if k != 1 and estimate.value is not None:
+                estimate = Estimate(estimate.value * k, estimate.half_width * k)
+            rv[stat.spec] = estimate
+        return rv
+
+    def n_sampled():
+        return sum(len(pages) for pages in sampled[0]) if stats else 0
+
+    def done():
+        n = n_sampled()
+        if n == sum(n_rest):
+            return True
+        if n + len(queries) < min_pages:
+            return False
+        current = estimates(scaled=False)
+        return all(_precise(stat, current[stat.spec], precision) for stat in stats)
+
+    i = 0
+    while i < len(offsets) and not done():
+        batch = offsets[i:i + client.MAX_CONCURRENCY]
+        i += len(batch)
+        pages = await asyncio.gather(*(
+            client._fetch_page(session, url, queries[h], opt, offset, min(page_size, totals[h] - offset))
+            for h, offset in batch
+        ))
+        for (h, _), records in zip(batch, pages):
+            for stat, stat_sampled in zip(stats, sampled):
+                stat_sampled[h].append(stat.page_totals(records))
+
+    n_pages = len(queries) + sum(n_rest)
+    n_fetched = len(queries) + n_sampled()
+    return SampleResult(estimates(), sum(totals), n_pages, n_fetched, n_fetched == n_pages)
+
+
+if __name__ == '__main__':
+    import time
+
+    class _Client:
+        # serves a synthetic universe sorted by market cap, like the screener
+        MAX_ITEM = 250
+        MAX_CONCURRENCY = 4
+        IN_CHUNK_SIZE = 100
+
+        def __init__(self, records):
+            self.records = records
+            self.n_requests = 0
+
+        async def _screener_url(self, session):
+            return None
+
+        async def _fetch_page(self, session, url, query, opt, offset, size, total=False):
+            self.n_requests += 1
+            page = self.records[offset:offset + size]
+            return (page, len(self.records)) if total else page
+
+    rng = random.Random(0)
+    records = sorted(
+        (
+            {
+                'ticker': f'T{i}',
+                'intradaymarketcap': {'raw': rng.lognormvariate(20, 2)},
+                'peratio.lasttwelvemonths': {'raw': rng.gammavariate(4, 5)},
+                'dividendyield': {'raw': rng.expovariate(1 / 2.5)},
+            }
+            for i in range(20_000)
+        ),
+        key=lambda r: -r['intradaymarketcap']['raw'],
+    )
+    client = _Client(records)
+    start = time.perf_counter()
+    result = asyncio.run(sample_screen(
+        client, None, None, ['mean(peratio.lasttwelvemonths)', 'share(dividendyield > 4)'], seed=1
+    ))
+    print(result, f'{client.n_requests} requests, {(time.perf_counter() - start) * 1000:.1f} ms')
+    pe = [r['peratio.lasttwelvemonths']['raw'] for r in records]
+    print('exact', sum(pe) / len(pe), sum(r['dividendyield']['raw'] > 4 for r in records) / len(records))
@@ -0,0 +1,286 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from datetime import datetime, time as dtime, timezone
+
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from .screener_delta import DeltaTracker
+from .screener_expr import _conjuncts, _value_set
+
+logger = logging.getLogger(__name__)
+
+# Regular trading session per region of screener_identifiers.txt:
+# time zone, open, close and trading weekdays (Monday is 0). Holidays and
+# lunch breaks are not modelled. Regions missing here ('sr') count as
+# always open.
+MON_FRI = (0, 1, 2, 3, 4)
+SUN_THU = (6, 0, 1, 2, 3)
+
+MARKET_HOURS = {
+    'ar': ('America/Argentina/Buenos_Aires', '11:00', '17:00', MON_FRI),
+    'at': ('Europe/Vienna', '09:00', '17:30', MON_FRI),
+    'au': ('Australia/Sydney', '10:00', '16:00', MON_FRI),
+    'be': ('Europe/Brussels', '09:00', '17:30', MON_FRI),
+    'br': ('America/Sao_Paulo', '10:00', '17:00', MON_FRI),
+    'ca': ('America/Toronto', '09:30', '16:00', MON_FRI),
+    'ch': ('Europe/Zurich', '09:00', '17:30', MON_FRI),
+    'cl': ('America/Santiago', '09:30', '16:00', MON_FRI),
+    'cn': ('Asia/Shanghai', '09:30', '15:00', MON_FRI),
+    'cz': ('Europe/Prague', '09:00', '16:20', MON_FRI),
+    'de': ('Europe/Berlin', '09:00', '17:30', MON_FRI),
+    'dk': ('Europe/Copenhagen', '09:00', '17:00', MON_FRI),
+    'ee': ('Europe/Tallinn', '10:00', '16:00', MON_FRI),
+    'eg': ('Africa/Cairo', '10:00', '14:30', SUN_THU),
+    'es': ('Europe/Madrid', '09:00', '17:30', MON_FRI),
+    'fi': ('Europe/Helsinki', '10:00', '18:30', MON_FRI),
+    'fr': ('Europe/Paris', '09:00', '17:30', MON_FRI),
+    'gb': ('Europe/London', '08:00', '16:30', MON_FRI),
+    'gr': ('Europe/Athens', '10:00', '17:20', MON_FRI),
+    'hk': ('Asia/Hong_Kong', '09:30', '16:00', MON_FRI),
+    'hu': ('Europe/Budapest', '09:00', '17:00', MON_FRI),
+    'id': ('Asia/Jakarta', '09:00', '16:00', MON_FRI),
+    'ie': ('Europe/Dublin', '08:00', '16:30', MON_FRI),
+    'il': ('Asia/Jerusalem', '09:59', '17:25', MON_FRI),
+    'in': ('Asia/Kolkata', '09:15', '15:30', MON_FRI),
+    'is': ('Atlantic/Reykjavik', '09:30', '15:30', MON_FRI),
+    'it': ('Europe/Rome', '09:00', '17:30', MON_FRI),
+    'jp': ('Asia/Tokyo', '09:00', '15:00', MON_FRI),
+    'kr': ('Asia/Seoul', '09:00', '15:30', MON_FRI),
+    'kw': ('Asia/Kuwait', '09:00', '12:40', SUN_THU),
+    'lk': ('Asia/Colombo', '09:30', '14:30', MON_FRI),
+    'lt': ('Europe/Vilnius', '10:00', '16:00', MON_FRI),
+    'lv': ('Europe/Riga', '10:00', '16:00', MON_FRI),
+    'mx': ('America/Mexico_City', '08:30', '15:00', MON_FRI),
+    'my': ('Asia/Kuala_Lumpur', '09:00', '17:00', MON_FRI),
+    'nl': ('Europe/Amsterdam', '09:00', '17:30', MON_FRI),
+    'no': ('Europe/Oslo', '09:00', '16:20', MON_FRI),
+    'nz': ('Pacific/Auckland', '10:00', '16:45', MON_FRI),
+    'pe': ('America/Lima', '09:00', '16:00', MON_FRI),
+    'ph': ('Asia/Manila', '09:30', '15:00', MON_FRI),
+    'pk': ('Asia/Karachi', '09:30', '15:30', MON_FRI),
+    'pl': ('Europe/Warsaw', '09:00', '17:00', MON_FRI),
+    'pt': ('Europe/Lisbon', '08:00', '16:30', MON_FRI),
+    'qa': ('Asia/Qatar', '09:30', '13:15', SUN_THU),
+    'ro': ('Europe/Bucharest', '10:00', '17:45', MON_FRI),
+    'ru': ('Europe/Moscow', '10:00', '18:50', MON_FRI),
+    'sa': ('Asia/Riyadh', '10:00', '15:00', SUN_THU),
+    'se': ('Europe/Stockholm', '09:00', '17:30', MON_FRI),
+    'sg': ('Asia/Singapore', '09:00', '17:00', MON_FRI),
+    'th': ('Asia/Bangkok', '10:00', '16:30', MON_FRI),
+    'tr': ('Europe/Istanbul', '10:00', '18:00', MON_FRI),
+    'tw': ('Asia/Taipei', '09:00', '13:30', MON_FRI),
+    'us': ('America/New_York', '09:30', '16:00', MON_FRI),
+    've': ('America/Caracas', '09:00', '13:00', MON_FRI),
+    'vn': ('Asia/Ho_Chi_Minh', '09:00', '15:00', MON_FRI),
+    'za': ('Africa/Johannesburg', '09:00', '17:00', MON_FRI),
+}
+
+
+_missing_zones = set()
+
+
+def _zone(name):
+    try:
+        return ZoneInfo(name)
+    except ZoneInfoNotFoundError:
+        # no system time zone database and no tzdata package
+        if name not in _missing_zones:
+            _missing_zones.add(name)
+            logger.warning("Time zone %s not found, its market counts as always open. Install tzdata.", name)
+        return None
+
+
+def is_market_open(region, now=None):
+    hours = MARKET_HOURS.get(region)
+    if hours is None:
+        return True
+    zone = _zone(hours[0])
+    if zone is None:
+        return True
+    now = now or datetime.now(timezone.utc)
+    local = now.astimezone(zone)
+    if local.weekday() not in hours[3]:
+        return False
+    return dtime.fromisoformat(hours[1]) <= local.time() < dtime.fromisoformat(hours[2])
+
+
+def query_regions(query):
+    """Regions a query is restricted to, or None if it is not."""
+    for term in _conjuncts(query):
+        if isinstance(term, dict):
+            values = _value_set(term)
+            if values is not None and values[0] == 'region':
+                return set(values[1])
+    return None
+
+
+class StandingScreen:
+    def __init__(self, screener_expr, query, freshness, opt, fields, callback):
+        self.screener_expr = screener_expr
+        self.query = query
+        self.regions = query_regions(query)
+        self.freshness = freshness
+        self.opt = opt
+        self.fields = fields
+        self.callback = callback
+        # the last result of this screen only, other screens and
+        # client.screen_delta() of the same query keep their own
+        self.tracker = DeltaTracker(fields)
+        # grows while results stay the same, back to 1 on a change
+        self.backoff = 1.0
+        self.due = 0.0
+        self.runs = 0
+        self.changes = 0
+        self.errors = 0
+        self.last_delta = None
+        self.last_error = None
+
+    def is_open(self, now=None):
+        if not self.regions:
+            return True
+        return any(is_market_open(region, now) for region in self.regions)
+
+
+class Scheduler:
+    """Keeps standing screens fresh without bursts.
+
+    Each screen is polled about every freshness seconds while one of its
+    regions trades, off_hours_factor times slower otherwise, and up to
+    max_backoff times slower while its results do not change. First runs
+    get a random phase offset, every interval a +-jitter share of noise,
+    and launches are at least min_spacing seconds apart.
+    """
+
+    def __init__(self, client, session, off_hours_factor=10, max_backoff=4.0,
+                 backoff_step=1.5, jitter=0.1, min_spacing=0.2):
+        self.client = client
+        self.session = session
+        self.off_hours_factor = off_hours_factor
+        self.max_backoff = max_backoff
+        self.backoff_step = backoff_step
+        self.jitter = jitter
+        self.min_spacing = min_spacing
+        self._heap = []
+        self._order = itertools.count()
+        self._screens = set()
+        # created in run(), on the loop that uses it
+        self._wakeup = None
+        self._running = False
+
+    def add(self, screener_expr, freshness=60, opt={}, fields=(), callback=None):
+        query = self.client._to_query(screener_expr)
+        screen = StandingScreen(screener_expr, query, freshness, opt, fields, callback)
+        # within freshness even off hours, a new screen shouldn't wait a long interval
+        screen.due = time.monotonic() + random.uniform(0, screen.freshness)
+        self._screens.add(screen)
+        self._push(screen)
+        return screen
+
+    def remove(self, screen):
+        self._screens.discard(screen)
+
+    def interval(self, screen, now=None):
+        interval = screen.freshness * screen.backoff
+        if not screen.is_open(now):
+            interval *= self.off_hours_factor
+        return interval
+
+    def _push(self, screen):
+        heapq.heappush(self._heap, (screen.due, next(self._order), screen))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _reschedule(self, screen, changed):
+        if changed:
+            screen.backoff = 1.0
+        else:
+            screen.backoff = min(screen.backoff * self.backoff_step, self.max_backoff)
+        interval = self.interval(screen)
+        interval *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        screen.due = time.monotonic() + interval
+        self._push(screen)
+
+    async def _run_screen(self, screen, sem, delay):
+        changed = True
+        try:
+            await asyncio.sleep(delay)
+            async with sem:
+                rv = await self.client.screen(self.session, screen.query, screen.opt)
+            delta = screen.tracker.update(None, rv)
+            changed = bool(delta)
+            screen.runs += 1
+            screen.changes += changed
+            screen.last_delta = delta
+            if screen.callback is not None:
+                result = screen.callback(screen, delta)
+                if asyncio.iscoroutine(result):
+                    await result
+        except Exception as exc:
+            # keep polling, the next run retries. CancelledError isn't an
+            # Exception, a cancelled run ends here and is not rescheduled
+            logger.exception('standing screen %r failed', screen.screener_expr)
+            screen.errors += 1
+            screen.last_error = exc
+        if screen in self._screens:
+            self._reschedule(screen, changed)
+
+    async def run(self):
+        self._running = True
+        self._wakeup = asyncio.Event()
+        sem = asyncio.Semaphore(self.client.MAX_CONCURRENCY)
+        tasks = set()
+        last_launch = -self.min_spacing
+        try:
+            while self._running:
+                self._wakeup.clear()
+                while self._heap and self._heap[0][2] not in self._screens:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    await self._wakeup.wait()
+                    continue
+
+                delay = self._heap[0][0] - time.monotonic()
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                # every due screen is launched now, each min_spacing after
+                # the one before, so one busy screen can't starve the rest
+                now = time.monotonic()
+                while self._heap and self._heap[0][0] <= now:
+                    _, _, screen = heapq.heappop(self._heap)
+                    if screen not in self._screens:
+                        continue
+                    last_launch = max(now, last_launch + self.min_spacing)
+                    task = asyncio.ensure_future(self._run_screen(screen, sem, last_launch - now))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stop(self):
+        self._running = False
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def stats(self):
+        return [
+            {
+                'screen': screen.screener_expr if isinstance(screen.screener_expr, str) else screen.query,
+                'interval': self.interval(screen),
+                'open': screen.is_open(),
+                'runs': screen.runs,
+                'changes': screen.changes,
+                'errors': screen.errors,
+                'last_error': screen.last_error,
+            }
+            for screen in self._screens
+        ]
@@ -0,0 +1,199 @@
+import math
+
+from .screener_expr import canonicalize, _is_in_list, _literal_value as _value
+
+_PARENTHESES = "'&' and '|' bind tighter than comparisons, wrap them in parentheses: (F.a > 1) & (F.b < 2)"
+
+
+def _format_value(value):
+    if isinstance(value, str):
+        return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or math.isnan(value):
+        raise ValueError(f"{value!r} has no screener expression literal")
+    if math.isinf(value):
+        # parses back as inf
+        return '1e999' if value > 0 else '-1e999'
+    return repr(value)
+
+
+class Expr:
+    def __init__(self, operator, operands):
+        self.operator = operator
+        self.operands = operands
+
+    def __and__(self, other):
+        if not isinstance(other, Expr):
+            return NotImplemented
+        return Expr('and', [self, other])
+
+    def __or__(self, other):
+        if not isinstance(other, Expr):
+            return NotImplemented
+        return Expr('or', [self, other])
+
+    # '&' binds tighter than comparisons: F.a > 1 & F.b < 2 is F.a > (1 & F.b) < 2
+    def __rand__(self, other):
+        raise TypeError(_PARENTHESES)
+
+    __ror__ = __rand__
+
+    def to_dict(self):
+        return {
+            "operator": self.operator,
+            "operands": [
+                operand.to_dict() if isinstance(operand, Expr) else operand
+                for operand in self.operands
+            ]
+        }
+
+    def canonical(self):
+        return canonicalize(self.to_dict())
+
+    def __str__(self):
+        return self.format()
+
+    def __repr__(self):
+        return f'Expr({self.format()!r})'
+
+    def format(self):
+        op = self.operator
+        if op in ('and', 'or'):
+            # an 'or' inside an 'and' needs parentheses, see Parser.and_expr()
+            terms = [
+                f'({operand.format()})' if op == 'and' and operand.operator == 'or' else operand.format()
+                for operand in self.operands
+            ]
+            return (' && ' if op == 'and' else ' || ').join(terms)
+        if op == 'in':
+            field, values = self.operands[0], self.operands[1:]
+            return f'{field} in [{", ".join(_format_value(v) for v in values)}]'
+        if op == 'btwn':
+            field, lower, upper = self.operands
+            return f'{field}[{_format_value(lower)}:{_format_value(upper)}]'
+        field, value = self.operands
+        return f'{field} {_SYMBOLS[op]} {_format_value(value)}'
+
+
+_SYMBOLS = {
+    'eq':   '==',
+    'lt':   '<',
+    'gt':   '>',
+    'lte':  '<=',
+    'gte':  '>=',
+}
+
+
+class _In(Expr):
+    # field in [a, b] is sent as field==a || field==b, see Parser.to_dict()
+    def to_dict(self):
+        field, values = self.operands[0], self.operands[1:]
+        terms = [{"operator": "eq", "operands": [field, value]} for value in values]
+        if len(terms) == 1:
+            return terms[0]
+        return {"operator": "or", "operands": terms}
+
+
+class Field:
+    def __init__(self, name):
+        self.name = name
+
+    # F.short_interest.value -> 'short_interest.value'
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return Field(f'{self.name}.{name}')
+
+    def __repr__(self):
+        return f'Field({self.name!r})'
+
+    def eq(self, value):
+        return Expr('eq', [self.name, _value(value)])
+
+    def ne(self, value):
+        raise TypeError(f"Yahoo's screener has no '!=', screen {self.name} with other comparisons")
+
+    def lt(self, value):
+        return Expr('lt', [self.name, _value(value)])
+
+    def gt(self, value):
+        return Expr('gt', [self.name, _value(value)])
+
+    def lte(self, value):
+        return Expr('lte', [self.name, _value(value)])
+
+    def gte(self, value):
+        return Expr('gte', [self.name, _value(value)])
+
+    def between(self, lower, upper):
+        return Expr('btwn', [self.name, _value(lower), _value(upper)])
+
+    def isin(self, values):
+        values = [_value(value) for value in values]
+        if not values:
+            raise ValueError(f"Empty 'in' list for {self.name}")
+        return _In('in', [self.name, *values])
+
+    __eq__ = eq
+    __ne__ = ne
+    __lt__ = lt
+    __gt__ = gt
+    __le__ = lte
+    __ge__ = gte
+    # == builds an Expr, so a Field can't be a dict key
+    __hash__ = None
+
+    # F.a > 1 & F.b evaluates 1 & F.b first
+    def __and__(self, other):
+        raise TypeError(_PARENTHESES)
+
+    __rand__ = __or__ = __ror__ = __and__
+
+    def __getitem__(self, bounds):
+        # F.beta[0.8:1.2] like the beta[0.8:1.2] expression
+        if not isinstance(bounds, slice) or bounds.step is not None:
+            raise TypeError("Expect field[lower:upper]")
+        return self.between(bounds.start, bounds.stop)
+
+
+def from_dict(query):
+    """Build an Expr from a query dict, e.g. to print it."""
+    op = query['operator']
+    operands = query['operands']
+    if op in ('and', 'or'):
+        if op == 'or' and _is_in_list(query):
+            return _In('in', [operands[0]['operands'][0], *(o['operands'][1] for o in operands)])
+        return Expr(op, [from_dict(operand) for operand in operands])
+    return Expr(op, list(operands))
+
+
+def format_query(query):
+    return from_dict(query).format()
+
+
+class _Fields:
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return Field(name)
+
+    def __getitem__(self, name):
+        return Field(name)
+
+
+F = _Fields()
+
+
+if __name__ == '__main__':
+    from .screener_expr import parse_screener_expr
+
+    exprs = [
+        (F.intradaymarketcap > 600e9) & F.region.eq("kr"),
+        F.region.eq("us") & (F.beta[0.8:1.2] | (F.beta < -0.2)),
+        F.short_interest.value >= 10_000_000,
+        F.ticker.isin(["AAPL", "MSFT"]) & F.sector.eq('Say "hi"'),
+    ]
+    for expr in exprs:
+        print(f"Expression: {expr}")
+        print(f"Dict: {expr.to_dict()}")
+        assert expr.to_dict() == parse_screener_expr(str(expr))
+        print()
@@ -0,0 +1,128 @@
+import json
+import math
+import time
+from collections import OrderedDict
+
+from .screener_expr import canonicalize, query_implies, residual_query
+from .screener_eval import Evaluator
+
+
+def query_key(query, opt={}):
+    query = json.dumps(canonicalize(query), sort_keys=True, ensure_ascii=False)
+    opt = json.dumps(opt, sort_keys=True, ensure_ascii=False)
+    return query, opt
+
+
+class _Entry:
+    def __init__(self, query, records, n_requests):
+        self.query = canonicalize(query)
+        self.records = records
+        self.n_requests = n_requests
+        self.created = time.monotonic()
+        self.keys = set()
+        for record in records:
+            self.keys.update(record)
+
+
+class ScreenCache:
+    """Recent screen results, reused for equal and for narrower screens.
+
+    A screen whose query is contained in a cached one (same opt, younger
+    than ttl seconds) is answered by filtering the cached records locally,
+    as long as the records carry every field the remaining terms test.
+    fields maps screener field names to record keys, see Evaluator.
+    """
+
+    def __init__(self, ttl=60, max_entries=64, fields=None, page_size=250):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.fields = fields or {}
+        self.page_size = page_size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.subsumed = 0
+        self.misses = 0
+        self.requests_avoided = 0
+
+    def _expire(self):
+        now = time.monotonic()
+        for key in [k for k, e in self._entries.items() if now - e.created > self.ttl]:
+            del self._entries[key]
+
+    def get(self, query, opt={}):
+        self._expire()
+        key = query_key(query, opt)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.requests_avoided += entry.n_requests
+            return list(entry.records)
+
+        records = self._get_subsumed(query, key[1])
+        if records is None:
+            self.misses += 1
+            return None
+        self.subsumed += 1
+        # a crawl takes at least one request
+        self.requests_avoided += max(1, math.ceil(len(records) / self.page_size))
+        return records
+
+    def covers(self, query, opt={}):
+        """True if get() would answer the query now, without counting it."""
+        self._expire()
+        key = query_key(query, opt)
+        return key in self._entries or self._find_subsumed(query, key[1]) is not None
+
+    def known_keys(self):
+        """Record keys seen in the cached results."""
+        keys = set()
+        for entry in self._entries.values():
+            keys |= entry.keys
+        return keys
+
+    def _get_subsumed(self, query, opt_key):
+        best = self._find_subsumed(query, opt_key)
+        if best is None:
+            return None
+        entry, evaluator = best
+        if evaluator is None:
+            return list(entry.records)
+        return evaluator.filter(entry.records)
+
+    def _find_subsumed(self, query, opt_key):
+        best = None
+        for (_, entry_opt), entry in self._entries.items():
+            if entry_opt != opt_key:
+                continue
+            if best is not None and len(entry.records) >= len(best[0].records):
+                continue
+            if not query_implies(query, entry.query):
+                continue
+            residual = residual_query(query, entry.query)
+            evaluator = None
+            if residual is not None:
+                evaluator = Evaluator(residual, self.fields)
+                if any(evaluator.key(f) not in entry.keys for f in evaluator.fields_used()):
+                    continue
+            best = entry, evaluator
+        return best
+
+    def put(self, query, opt, records, n_requests=1):
+        key = query_key(query, opt)
+        self._entries[key] = _Entry(query, records, n_requests)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'subsumed': self.subsumed,
+            'misses': self.misses,
+            'requests_avoided': self.requests_avoided,
+        }
@@ -0,0 +1,191 @@
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .screener_eval import raw_value
+
+
+class Delta:
+    def __init__(self, added, removed, changed):
+        # records entering and leaving the result, and current records
+        # whose watched fields moved beyond the tolerance
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def __repr__(self):
+        return f'Delta(added={len(self.added)}, removed={len(self.removed)}, changed={len(self.changed)})'
+
+
+class Snapshot:
+    """Records of one screen run, keyed by symbol, with columns of the watched fields."""
+
+    def __init__(self, records, fields, key='ticker'):
+        by_symbol = {}
+        for record in records:
+            symbol = record.get(key)
+            if symbol is not None:
+                by_symbol[symbol] = record
+        symbols = sorted(by_symbol)
+        self.records = [by_symbol[s] for s in symbols]
+        self.fields = list(fields)
+        if np is not None:
+            # sorted and unique, as diff_snapshots() relies on
+            self.symbols = np.array(symbols, dtype=str)
+            self.columns = {f: _column([r.get(f) for r in self.records]) for f in self.fields}
+        else:
+            self.symbols = symbols
+            self.columns = {f: [raw_value(r.get(f)) for r in self.records] for f in self.fields}
+
+    def __len__(self):
+        return len(self.records)
+
+
+def _column(values):
+    values = [raw_value(v) for v in values]
+    if all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool)) for v in values):
+        return np.array([math.nan if v is None else v for v in values], dtype=np.float64)
+    return np.array(values, dtype=object)
+
+
+def _changed_value(old, new, rtol, atol):
+    if isinstance(old, (int, float)) and isinstance(new, (int, float)):
+        if math.isnan(old) or math.isnan(new):
+            return math.isnan(old) != math.isnan(new)
+        return abs(new - old) > atol + rtol * abs(old)
+    return old != new
+
+
+def diff_snapshots(prev, cur, rtol=0.0, atol=0.0):
+    """Compare two snapshots of the same screen.
+
+    A field changed if |new - old| > atol + rtol * |old|, if it appeared or
+    disappeared, or, for text fields, if it differs.
+    """
+    if prev is None:
+        return Delta(list(cur.records), [], [])
+    if np is None:
+        return _diff_python(prev, cur, rtol, atol)
+
+    # both symbol arrays are sorted: locate each current symbol in prev
+    pos = np.searchsorted(prev.symbols, cur.symbols)
+    pos_clipped = np.minimum(pos, max(len(prev) - 1, 0))
+    if len(prev):
+        common = prev.symbols[pos_clipped] == cur.symbols
+    else:
+        common = np.zeros(len(cur), dtype=bool)
+    cur_idx = np.flatnonzero(common)
+    prev_idx = pos_clipped[common]
+    added = ~common
+    removed = np.ones(len(prev), dtype=bool)
+    removed[prev_idx] = False
+
+    changed = np.zeros(len(cur_idx), dtype=bool)
+    for field in cur.fields:
+        old = prev.columns.get(field)
+        new = cur.columns[field]
+        if old is None:
+            continue
+        old = old[prev_idx]
+        new = new[cur_idx]
+        if old.dtype == np.float64 and new.dtype == np.float64:
+            old_nan = np.isnan(old)
+            new_nan = np.isnan(new)
+            with np.errstate(invalid='ignore'):
+                moved = np.abs(new - old) > atol + rtol * np.abs(old)
+            changed |= (moved & ~old_nan & ~new_nan) | (old_nan != new_nan)
+        else:
+            changed |= np.fromiter(
+                (_changed_value(o, n, rtol, atol) for o, n in zip(old, new)),
+                dtype=bool, count=len(old)
+            )
+
+    return Delta(
+        [cur.records[i] for i in np.flatnonzero(added)],
+        [prev.records[i] for i in np.flatnonzero(removed)],
+        [cur.records[i] for i in cur_idx[changed]],
+    )
+
+
+def _diff_python(prev, cur, rtol, atol):
+    prev_index = {symbol: i for i, symbol in enumerate(prev.symbols)}
+    cur_symbols = set(cur.symbols)
+    added = []
+    changed = []
+    for i, symbol in enumerate(cur.symbols):
+        j = prev_index.get(symbol)
+        if j is None:
+            added.append(cur.records[i])
+            continue
+        for field in cur.fields:
+            old = prev.columns.get(field)
+            if old is None:
+                continue
+            o, n = old[j], cur.columns[field][i]
+            if o is None or n is None:
+                moved = (o is None) != (n is None)
+            else:
+                moved = _changed_value(o, n, rtol, atol)
+            if moved:
+                changed.append(cur.records[i])
+                break
+    removed = [prev.records[j] for j, s in enumerate(prev.symbols) if s not in cur_symbols]
+    return Delta(added, removed, changed)
+
+
+class DeltaTracker:
+    """Keeps the last snapshot per key and diffs each new result against it."""
+
+    def __init__(self, fields=(), rtol=0.0, atol=0.0, key='ticker'):
+        self.fields = list(fields)
+        self.rtol = rtol
+        self.atol = atol
+        self.key = key
+        self._snapshots = {}
+
+    def update(self, key, records, fields=None, rtol=None, atol=None):
+        fields = self.fields if fields is None else fields
+        cur = Snapshot(records, fields, self.key)
+        prev = self._snapshots.get(key)
+        if prev is not None and prev.fields != cur.fields:
+            # other fields are watched now, take their old values from the records
+            prev = Snapshot(prev.records, fields, self.key)
+        self._snapshots[key] = cur
+        return diff_snapshots(
+            prev, cur,
+            self.rtol if rtol is None else rtol,
+            self.atol if atol is None else atol,
+        )
+
+    def forget(self, key):
+        self._snapshots.pop(key, None)
+
+
+if __name__ == '__main__':
+    import random
+    import time
+
+    random.seed(0)
+    fields = ['regularMarketPrice', 'marketCap']
+
+    def records(n_rows):
+        return [
+            {
+                'ticker': f'T{i}',
+                'regularMarketPrice': {'raw': random.uniform(1, 100), 'fmt': ''},
+                'marketCap': {'raw': 1e9 + i, 'fmt': ''},
+            }
+            for i in random.sample(range(n_rows + 1000), n_rows)
+        ]
+
+    prev = Snapshot(records(50_000), fields)
+    cur = Snapshot(records(50_000), fields)
+    start = time.perf_counter()
+    delta = diff_snapshots(prev, cur, rtol=0.5)
+    print(delta, f'{(time.perf_counter() - start) * 1000:.1f} ms')
@@ -0,0 +1,265 @@
+import math
+import operator
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .screener_expr import _is_in_list, canonicalize, parse_screener_expr
+
+
+# Yahoo's btwn includes both bounds. A record without the field (or with a
+# value of another type) matches no comparison, as on the server.
+_COMPARE = {
+    'eq':   operator.eq,
+    'lt':   operator.lt,
+    'gt':   operator.gt,
+    'lte':  operator.le,
+    'gte':  operator.ge,
+}
+
+
+def raw_value(value):
+    # formatted=true responses wrap numbers as {"raw": ..., "fmt": ...}
+    if isinstance(value, dict):
+        return value.get('raw')
+    return value
+
+
+def _comparable(value, operand):
+    if value is None or isinstance(value, bool):
+        return False
+    if isinstance(operand, str):
+        return isinstance(value, str)
+    return isinstance(value, (int, float)) and not math.isnan(value)
+
+
+class Evaluator:
+    """Apply a query dict to screen results locally.
+
+    filter()/match() work on record dicts, mask() on columns (NumPy arrays
+    or sequences keyed by field) and needs NumPy. fields maps screener
+    field names to record keys or column names where they differ, e.g.
+    {'intradaymarketcap': 'marketCap'}.
+    """
+
+    def __init__(self, query, fields=None):
+        if isinstance(query, str):
+            query = parse_screener_expr(query)
+        self.query = canonicalize(query)
+        self.fields = fields or {}
+        self._match = self._compile(self.query)
+
+    def key(self, field):
+        return self.fields.get(field, field)
+
+    def fields_used(self):
+        names = set()
+        self._collect_fields(self.query, names)
+        return names
+
+    def _collect_fields(self, query, names):
+        if query['operator'] in ('and', 'or'):
+            for operand in query['operands']:
+                self._collect_fields(operand, names)
+        else:
+            names.add(query['operands'][0])
+
+    def _compile(self, query):
+        op = query['operator']
+        operands = query['operands']
+
+        if op == 'and':
+            preds = [self._compile(operand) for operand in operands]
+
+            def and_(record):
+                for pred in preds:
+                    if not pred(record):
+                        return False
+                return True
+            return and_
+
+        if op == 'or':
+            if _is_in_list(query):
+                key = self.key(operands[0]['operands'][0])
+                values = [operand['operands'][1] for operand in operands]
+                strings = frozenset(v for v in values if isinstance(v, str))
+                numbers = frozenset(v for v in values if not isinstance(v, str))
+
+                # the eq terms' type check, True doesn't match 1
+                def in_(record):
+                    value = raw_value(record.get(key))
+                    if isinstance(value, str):
+                        return value in strings
+                    return _comparable(value, 0.0) and value in numbers
+                return in_
+            preds = [self._compile(operand) for operand in operands]
+
+            def or_(record):
+                for pred in preds:
+                    if pred(record):
+                        return True
+                return False
+            return or_
+
+        key = self.key(operands[0])
+
+        if op == 'btwn':
+            lower, upper = operands[1], operands[2]
+
+            def btwn(record):
+                value = record.get(key)
+                if value.__class__ is dict:
+                    value = value.get('raw')
+                return _comparable(value, lower) and lower <= value <= upper
+            return btwn
+
+        if op not in _COMPARE:
+            raise ValueError(f"Unsupported operator: {op}")
+        compare = _COMPARE[op]
+        operand = operands[1]
+
+        def comparison(record):
+            value = record.get(key)
+            if value.__class__ is dict:
+                value = value.get('raw')
+            return _comparable(value, operand) and compare(value, operand)
+        return comparison
+
+    def match(self, record):
+        return self._match(record)
+
+    def filter(self, records):
+        match = self._match
+        return [record for record in records if match(record)]
+
+    def mask(self, columns, n_rows=None):
+        if np is None:
+            raise ImportError("Evaluator.mask() requires numpy, use filter() on records instead")
+        cache = {}
+        if n_rows is None:
+            n_rows = len(next(iter(columns.values()))) if columns else 0
+        return self._mask(self.query, columns, cache, n_rows)
+
+    def _column(self, columns, field, numeric, cache):
+        key = self.key(field)
+        cached = cache.get((key, numeric))
+        if cached is not None:
+            return cached
+        if key not in columns:
+            column = None
+        else:
+            column = np.asarray(columns[key])
+            if numeric:
+                column = _numeric_column(column)
+            elif column.dtype.kind not in 'UO':
+                column = column.astype(object)
+        cache[(key, numeric)] = column
+        return column
+
+    def _mask(self, query, columns, cache, n_rows):
+        op = query['operator']
+        operands = query['operands']
+
+        if op == 'and':
+            mask = np.ones(n_rows, dtype=bool)
+            for operand in operands:
+                mask &= self._mask(operand, columns, cache, n_rows)
+            return mask
+
+        if op == 'or':
+            values = [o['operands'][1] for o in operands] if _is_in_list(query) else None
+            if values is not None and all(isinstance(v, str) for v in values):
+                column = self._column(columns, operands[0]['operands'][0], False, cache)
+                if column is None:
+                    return np.zeros(n_rows, dtype=bool)
+                # np.isin() sorts object arrays, which fails on None
+                values = frozenset(values)
+                return np.fromiter((isinstance(v, str) and v in values for v in column), dtype=bool, count=len(column))
+            mask = np.zeros(n_rows, dtype=bool)
+            for operand in operands:
+                mask |= self._mask(operand, columns, cache, n_rows)
+            return mask
+
+        field = operands[0]
+        numeric = not isinstance(operands[1], str)
+        column = self._column(columns, field, numeric, cache)
+        if column is None:
+            return np.zeros(n_rows, dtype=bool)
+
+        # NaN (missing) compares False, like a record without the field
+        if op == 'btwn':
+            return (column >= operands[1]) & (column <= operands[2])
+        if op not in _COMPARE:
+            raise ValueError(f"Unsupported operator: {op}")
+        if not numeric and op != 'eq':
+            compare = _COMPARE[op]
+            return np.fromiter(
+                (isinstance(v, str) and compare(v, operands[1]) for v in column),
+                dtype=bool, count=len(column)
+            )
+        return np.asarray(_COMPARE[op](column, operands[1]), dtype=bool)
+
+
+def _numeric_column(column):
+    if column.dtype.kind in 'fiu':
+        return column.astype(np.float64, copy=False)
+    values = []
+    for value in column:
+        value = raw_value(value)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            values.append(value)
+        else:
+            values.append(math.nan)
+    return np.array(values, dtype=np.float64)
+
+
+def columns_from_records(records, names):
+    """Build NumPy columns for mask() from record dicts.
+
+    Numbers (raw values of formatted fields) become float64 with NaN for
+    missing values, anything else an object array.
+    """
+    if np is None:
+        raise ImportError("columns_from_records() requires numpy")
+    columns = {}
+    for name in names:
+        values = [raw_value(record.get(name)) for record in records]
+        if all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool)) for v in values):
+            columns[name] = np.array([math.nan if v is None else v for v in values], dtype=np.float64)
+        else:
+            columns[name] = np.array(values, dtype=object)
+    return columns
+
+
+def evaluate_screener_expr(query, records, fields=None):
+    return Evaluator(query, fields).filter(records)
+
+
+if __name__ == '__main__':
+    import random
+    import time
+
+    random.seed(0)
+    n_rows = 50_000
+    records = [
+        {
+            'ticker': f'T{i}',
+            'sector': random.choice(['Healthcare', 'Energy', 'Technology']),
+            'beta': {'raw': random.uniform(-1, 3), 'fmt': ''},
+            'dividendyield': random.uniform(0, 8) if i % 10 else None,
+        }
+        for i in range(n_rows)
+    ]
+    evaluator = Evaluator('beta[0.8:1.2] && dividendyield > 2 && sector in ["Energy", "Healthcare"]')
+
+    start = time.perf_counter()
+    rows = evaluator.filter(records)
+    print(f'filter: {len(rows)} rows, {(time.perf_counter() - start) * 1000:.1f} ms')
+
+    if np is not None:
+        columns = columns_from_records(records, evaluator.fields_used())
+        start = time.perf_counter()
+        mask = evaluator.mask(columns)
+        print(f'mask: {int(mask.sum())} rows, {(time.perf_counter() - start) * 1000:.1f} ms')
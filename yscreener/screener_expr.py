@@ -1,3 +1,7 @@
+import json
+import math
+import secrets
+from json.encoder import encode_basestring
 from enum import Enum, auto
 
 class TokenType(Enum):
@@ -5,10 +9,13 @@ class TokenType(Enum):
     NUMBER = auto()
     STRING = auto()
     IDENTIFIER = auto()
+    PARAM = auto()
     AND = '&&'
     OR = '||'
     #BETWEEN = 'BETWEEN'
     EQUAL = '=='
+    LESS_EQUAL = '<='
+    GREATER_EQUAL = '>='
     LESS = '<' 
     GREATER = '>'
     LPAREN = '('
@@ -16,6 +23,8 @@ class TokenType(Enum):
     LBRACKET = '['
     RBRACKET = ']'
     COLON = ':'
+    COMMA = ','
+    IN = 'in'
     EOF = auto()
 
 
@@ -39,10 +48,14 @@ class Scanner:
                 continue
             elif self.text[self.pos].isdigit() or self.text[self.pos] == '.':
                 tokens.append(self.scan_number())
+            elif self.text[self.pos] == '-' and self.is_number_start(self.pos + 1):
+                tokens.append(self.scan_number())
             elif self.text[self.pos] == '"':
                 tokens.append(self.scan_string())
             elif self.text[self.pos].isalpha():
                 tokens.append(self.scan_identifier())
+            elif self.text[self.pos] == '$':
+                tokens.append(self.scan_param())
             elif self.text[self.pos:self.pos+2] == '&&':
                 tokens.append(Token(TokenType.AND))
                 self.pos += 2
@@ -58,9 +71,18 @@ class Scanner:
             elif self.text[self.pos] == ':':
                 tokens.append(Token(TokenType.COLON, ':'))
                 self.pos += 1
+            elif self.text[self.pos] == ',':
+                tokens.append(Token(TokenType.COMMA))
+                self.pos += 1
             elif self.text[self.pos:self.pos + 2] == '==':
                 tokens.append(Token(TokenType.EQUAL))
                 self.pos += 2
+            elif self.text[self.pos:self.pos + 2] == '<=':
+                tokens.append(Token(TokenType.LESS_EQUAL))
+                self.pos += 2
+            elif self.text[self.pos:self.pos + 2] == '>=':
+                tokens.append(Token(TokenType.GREATER_EQUAL))
+                self.pos += 2
             elif self.text[self.pos] == '<':
                 tokens.append(Token(TokenType.LESS))
                 self.pos += 1
@@ -78,15 +100,33 @@ class Scanner:
         tokens.append(Token(TokenType.EOF, ''))
         return tokens
 
+    def is_number_start(self, pos):
+        return pos < len(self.text) and (self.text[pos].isdigit() or self.text[pos] == '.')
+
     def scan_number(self):
         start = self.pos
+        if self.text[self.pos] == '-':
+            self.pos += 1
         while self.pos < len(self.text) and (self.text[self.pos].isdigit() or self.text[self.pos] == '.'):
             self.pos += 1
+        # exponent, e.g. 6e+11 as printed by repr()
+        if self.pos < len(self.text) and self.text[self.pos] in 'eE':
+            exp = self.pos + 1
+            if exp < len(self.text) and self.text[exp] in '+-':
+                exp += 1
+            if exp < len(self.text) and self.text[exp].isdigit():
+                self.pos = exp
+                while self.pos < len(self.text) and self.text[self.pos].isdigit():
+                    self.pos += 1
             
         suffix = ''
         if self.pos < len(self.text) and self.text[self.pos].upper() in ('K', 'M', 'B', 'T'):
             suffix = self.text[self.pos].upper()
             self.pos += 1
+        elif self.pos < len(self.text) and self.text[self.pos] == '%':
+            # Yahoo takes percentage fields in percent units, e.g. 10% -> 10
+            suffix = '%'
+            self.pos += 1
         
         # Convert the number to a float
         num_str = self.text[start:self.pos]
@@ -106,20 +146,55 @@ class Scanner:
 
     def scan_string(self):
         self.pos += 1  # Skip opening quote
-        start = self.pos
+        chars = []
         while self.pos < len(self.text) and self.text[self.pos] != '"':
+            # \" and \\ are the only escapes
+            if self.text[self.pos] == '\\' and self.text[self.pos+1:self.pos+2] in ('"', '\\'):
+                self.pos += 1
+            chars.append(self.text[self.pos])
             self.pos += 1
         if self.pos == len(self.text):
             raise ValueError("Unterminated string")
-        value = self.text[start:self.pos]
+        value = ''.join(chars)
         self.pos += 1  # Skip closing quote
         return Token(TokenType.STRING, value)
 
     def scan_identifier(self):
+        start = self.pos
+        # dotted fields, e.g. short_interest.value
+        while self.pos < len(self.text) and (self.text[self.pos].isalnum() or self.text[self.pos] in '_.'):
+            self.pos += 1
+        if self.text[self.pos - 1] == '.':
+            raise ValueError(f"Unexpected '.' at the end of identifier: {self.text[start:self.pos]}")
+        value = self.text[start:self.pos]
+        if value == 'in':
+            return Token(TokenType.IN)
+        return Token(TokenType.IDENTIFIER, value)
+
+
+    def scan_param(self):
+        self.pos += 1  # Skip '$'
         start = self.pos
         while self.pos < len(self.text) and (self.text[self.pos].isalnum() or self.text[self.pos] == '_'):
             self.pos += 1
-        return Token(TokenType.IDENTIFIER, self.text[start:self.pos])
+        if start == self.pos:
+            raise ValueError("Expect parameter name after '$'")
+        return Token(TokenType.PARAM, self.text[start:self.pos])
+
+
+def _literal_value(value):
+    # the parser yields floats for every number literal
+    if isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+class Param:
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f'${self.name}'
 
 
 class Parser:
@@ -128,7 +203,10 @@ class Parser:
         self.current = 0
 
     def parse(self):
-        return self.to_dict(self.or_expr())
+        expr = self.or_expr()
+        if not self.is_at_end():
+            raise ValueError(f"Unexpected {self.peek().value!r} after expression.")
+        return self.to_dict(expr)
 
     def to_dict(self, expr):
         if isinstance(expr, tuple):
@@ -138,10 +216,22 @@ class Parser:
                     "operator": operator,
                     "operands": [self.to_dict(operand) for operand in expr[1:]]
                 }
+            elif operator == 'in':
+                # Yahoo has no set membership operator: field in [a, b] -> field==a || field==b
+                field = self.to_dict(expr[1])
+                terms = [
+                    {"operator": "eq", "operands": [field, self.to_dict(value)]}
+                    for value in expr[2:]
+                ]
+                if len(terms) == 1:
+                    return terms[0]
+                return {"operator": "or", "operands": terms}
             elif operator in (
                 TokenType.EQUAL,
                 TokenType.LESS,
                 TokenType.GREATER,
+                TokenType.LESS_EQUAL,
+                TokenType.GREATER_EQUAL,
             ):
                 return {
                     "operator": self.operator_to_string(operator),
@@ -158,6 +248,8 @@ class Parser:
             TokenType.EQUAL:    'eq',
             TokenType.LESS:     'lt',
             TokenType.GREATER:  'gt',
+            TokenType.LESS_EQUAL:       'lte',
+            TokenType.GREATER_EQUAL:    'gte',
         }
         return mnemonic[token_type]
 
@@ -177,12 +269,28 @@ class Parser:
 
     def comparison_expr(self):
         expr = self.between_expr()
-        while self.match(TokenType.EQUAL, TokenType.LESS, TokenType.GREATER):
+        while self.match(
+            TokenType.EQUAL,
+            TokenType.LESS,
+            TokenType.GREATER,
+            TokenType.LESS_EQUAL,
+            TokenType.GREATER_EQUAL,
+        ):
             operator = self.previous().type
             right = self.between_expr()
             expr = (operator, expr, right)
+        if self.match(TokenType.IN):
+            expr = ('in', expr, *self.list_expr())
         return expr
 
+    def list_expr(self):
+        self.consume(TokenType.LBRACKET, "Expect '[' after 'in'.")
+        values = [self.primary()]
+        while self.match(TokenType.COMMA):
+            values.append(self.primary())
+        self.consume(TokenType.RBRACKET, "Expect ']' after 'in' list.")
+        return values
+
     def between_expr(self):
         expr = self.primary()
         if self.match(TokenType.LBRACKET):  # Check for opening bracket
@@ -201,6 +309,8 @@ class Parser:
             return self.previous().value
         if self.match(TokenType.IDENTIFIER):
             return self.previous().value
+        if self.match(TokenType.PARAM):
+            return Param(self.previous().value)
         if self.match(TokenType.LPAREN):
             expr = self.or_expr()
             self.consume(TokenType.RPAREN, "Expect ')' after expression.")
@@ -245,10 +355,354 @@ class Parser:
 def parse_screener_expr(text):
     scanner = Scanner(text)
     tokens = scanner.scan_tokens()
+    for token in tokens:
+        if token.type == TokenType.PARAM:
+            raise ValueError(f"Unbound parameter ${token.value}, use prepare_screener_expr()")
     parser = Parser(tokens)
     return parser.parse()
 
 
+class PreparedScreenerExpr:
+    """A screener expression with $name placeholders, scanned and parsed once.
+
+    bind() returns the query dict and dumps()/encode() the JSON text of the
+    query (or of the whole payload if one was given to prepare_screener_expr()),
+    bind_payload() the payload dict. Binding only substitutes the parameter
+    values. YahooFClient.screen() takes encode()'s bytes as they are.
+    """
+
+    def __init__(self, query, payload=None):
+        self.params = []
+        # name -> occurrences in the query
+        self._counts = {}
+        self._query = self._collect(query)
+        self._names = set(self.params)
+        self._payload = payload
+
+        doc = self._query if payload is None else {**payload, "query": self._query}
+        self._segments, self._slots = self._compile(doc)
+
+    def _collect(self, expr):
+        if isinstance(expr, Param):
+            if expr.name not in self.params:
+                self.params.append(expr.name)
+            self._counts[expr.name] = self._counts.get(expr.name, 0) + 1
+        elif isinstance(expr, dict):
+            for operand in expr["operands"]:
+                self._collect(operand)
+        return expr
+
+    # Serialize once with a sentinel string in place of each parameter and
+    # cut the text around them: dumps() then only joins the pieces.
+    def _compile(self, doc):
+        while True:
+            # a string literal could hold any fixed sentinel, a random one
+            # is used and checked to occur once per parameter occurrence
+            token = secrets.token_hex(8)
+
+            def sentinel(obj):
+                if isinstance(obj, Param):
+                    return f'\x00{token}:{obj.name}\x00'
+                raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+            # JSON.stringify(o) == json.dumps(d, ensure_ascii=False)
+            text = json.dumps(doc, ensure_ascii=False, default=sentinel)
+            sentinels = {
+                json.dumps(sentinel(Param(name)), ensure_ascii=False): name
+                for name in self.params
+            }
+            if all(text.count(s) == self._counts[name] for s, name in sentinels.items()):
+                break
+        segments = []
+        slots = []
+        start = 0
+        while True:
+            hits = [(text.find(s, start), s) for s in sentinels]
+            hits = [(pos, s) for pos, s in hits if pos >= 0]
+            if not hits:
+                break
+            pos, sentinel = min(hits)
+            segments.append(text[start:pos])
+            slots.append(sentinels[sentinel])
+            start = pos + len(sentinel)
+        segments.append(text[start:])
+        return segments, slots
+
+    def _check(self, params):
+        if params.keys() != self._names:
+            missing = [f'${name}' for name in self.params if name not in params]
+            unknown = [f'${name}' for name in params if name not in self.params]
+            raise ValueError(f"Parameter mismatch, missing: {missing}, unknown: {unknown}")
+
+    def bind(self, **params):
+        self._check(params)
+        return self._bind(self._query, params)
+
+    def bind_payload(self, **params):
+        query = self.bind(**params)
+        if self._payload is None:
+            return query
+        return {**self._payload, "query": query}
+
+    def _bind(self, expr, params):
+        if isinstance(expr, Param):
+            return _literal_value(params[expr.name])
+        if isinstance(expr, dict):
+            return {**expr, "operands": [self._bind(operand, params) for operand in expr["operands"]]}
+        return expr
+
+    @staticmethod
+    def _dumps_value(value):
+        if isinstance(value, str):
+            return encode_basestring(value)
+        if isinstance(value, float) and math.isfinite(value):
+            return repr(value)
+        return json.dumps(value, ensure_ascii=False)
+
+    def dumps(self, **params):
+        self._check(params)
+        values = {
+            name: self._dumps_value(_literal_value(value))
+            for name, value in params.items()
+        }
+        segments = self._segments
+        out = [segments[0]]
+        for slot, segment in zip(self._slots, segments[1:]):
+            out.append(values[slot])
+            out.append(segment)
+        return ''.join(out)
+
+    def encode(self, **params):
+        return self.dumps(**params).encode('utf-8')
+
+
+def prepare_screener_expr(text, payload=None):
+    scanner = Scanner(text)
+    tokens = scanner.scan_tokens()
+    parser = Parser(tokens)
+    return PreparedScreenerExpr(parser.parse(), payload)
+
+
+_MIRRORED = {'lt': 'gt', 'gt': 'lt', 'lte': 'gte', 'gte': 'lte', 'eq': 'eq'}
+
+
+def _sort_key(query):
+    return json.dumps(query, sort_keys=True, ensure_ascii=False)
+
+
+def canonicalize(query):
+    """Return the canonical form of a query dict.
+
+    Nested 'and'/'or' are flattened, their operands deduplicated and sorted,
+    a single operand replaces its 'and'/'or', comparisons put the field
+    first (50 < eodprice -> eodprice > 50) and numbers are floats. Equal
+    queries have equal canonical forms, so these can serve as cache keys.
+    """
+    if isinstance(query, bool):
+        return query
+    if isinstance(query, (int, float)):
+        return float(query)
+    if not isinstance(query, dict):
+        return query
+
+    operator = query['operator']
+    operands = [canonicalize(operand) for operand in query['operands']]
+
+    if operator in ('and', 'or'):
+        terms = {}
+        for operand in operands:
+            if isinstance(operand, dict) and operand['operator'] == operator:
+                children = operand['operands']
+            else:
+                children = [operand]
+            for child in children:
+                terms.setdefault(_sort_key(child), child)
+        if len(terms) == 1:
+            return next(iter(terms.values()))
+        return {"operator": operator, "operands": [terms[key] for key in sorted(terms)]}
+
+    if operator in _MIRRORED and len(operands) == 2 \
+            and not isinstance(operands[0], str) and isinstance(operands[1], str):
+        return {"operator": _MIRRORED[operator], "operands": [operands[1], operands[0]]}
+
+    return {"operator": operator, "operands": operands}
+
+
+def _eq_field(query):
+    if isinstance(query, dict) and query['operator'] == 'eq':
+        return query['operands'][0]
+    return None
+
+
+def _is_in_list(query):
+    # field==a || field==b || ... on a single field, as produced by 'in [...]'
+    if not isinstance(query, dict) or query['operator'] != 'or':
+        return False
+    fields = {_eq_field(operand) for operand in query['operands']}
+    return len(fields) == 1 and None not in fields
+
+
+def _and_operands(query):
+    # a && b && c parses as (a && b) && c
+    if not isinstance(query, dict) or query['operator'] != 'and':
+        return [query]
+    return [term for operand in query['operands'] for term in _and_operands(operand)]
+
+
+def _chunk_in_list(query, chunk_size):
+    operands = query['operands']
+    chunks = []
+    for i in range(0, len(operands), chunk_size):
+        chunk = operands[i:i + chunk_size]
+        chunks.append(chunk[0] if len(chunk) == 1 else {"operator": "or", "operands": chunk})
+    return chunks
+
+
+def split_in_list(query, chunk_size):
+    """Split the largest 'in' list of a query into queries of at most chunk_size terms.
+
+    Only a top level list or one of the top level 'and' terms is split.
+    The returned queries select disjoint record sets whose union is the
+    original query's result.
+    """
+    if _is_in_list(query):
+        if len(query['operands']) <= chunk_size:
+            return [query]
+        return _chunk_in_list(query, chunk_size)
+
+    operands = _and_operands(query)
+    lists = [
+        (len(operand['operands']), i)
+        for i, operand in enumerate(operands)
+        if _is_in_list(operand)
+    ]
+    if not lists:
+        return [query]
+    n_terms, index = max(lists)
+    if n_terms <= chunk_size:
+        return [query]
+
+    return [
+        {"operator": "and", "operands": [*operands[:index], chunk, *operands[index + 1:]]}
+        for chunk in _chunk_in_list(operands[index], chunk_size)
+    ]
+
+
+
+# Containment between canonical queries. A query is read as a conjunction
+# of terms; a term of the broader query is implied by the narrower one if
+# the same term appears in it, if the narrower numeric range or value set
+# on that field lies within the broader one, or for an 'or' term, if one
+# of its operands is implied.
+
+_INF = float('inf')
+
+
+def _conjuncts(query):
+    query = canonicalize(query)
+    if isinstance(query, dict) and query['operator'] == 'and':
+        return query['operands']
+    return [query]
+
+
+def _interval(term):
+    # (lower, lower included, upper, upper included)
+    op = term['operator']
+    operands = term['operands']
+    if op == 'btwn':
+        return operands[0], (operands[1], True, operands[2], True)
+    if op not in _MIRRORED or isinstance(operands[1], (str, bool)):
+        return None
+    value = operands[1]
+    return operands[0], {
+        'eq':   (value, True, value, True),
+        'lt':   (-_INF, False, value, False),
+        'lte':  (-_INF, False, value, True),
+        'gt':   (value, False, _INF, False),
+        'gte':  (value, True, _INF, False),
+    }[op]
+
+
+def _intersect(a, b):
+    if a[0] != b[0]:
+        lower = max(a[:2], b[:2], key=lambda bound: bound[0])
+    else:
+        lower = (a[0], a[1] and b[1])
+    if a[2] != b[2]:
+        upper = min(a[2:], b[2:], key=lambda bound: bound[0])
+    else:
+        upper = (a[2], a[3] and b[3])
+    return (*lower, *upper)
+
+
+def _within(inner, outer):
+    lower = outer[0] < inner[0] or (outer[0] == inner[0] and (outer[1] or not inner[1]))
+    upper = inner[2] < outer[2] or (outer[2] == inner[2] and (outer[3] or not inner[3]))
+    return lower and upper
+
+
+def _value_set(term):
+    if term['operator'] == 'eq':
+        return term['operands'][0], frozenset([term['operands'][1]])
+    if _is_in_list(term):
+        return _eq_field(term['operands'][0]), frozenset(o['operands'][1] for o in term['operands'])
+    return None
+
+
+def _term_implied(terms, term):
+    if not isinstance(term, dict):
+        return False
+    key = _sort_key(term)
+    if any(_sort_key(t) == key for t in terms):
+        return True
+
+    values = _value_set(term)
+    if values is not None:
+        field, allowed = values
+        narrowed = None
+        for t in terms:
+            v = _value_set(t) if isinstance(t, dict) else None
+            if v is not None and v[0] == field:
+                narrowed = v[1] if narrowed is None else narrowed & v[1]
+        if narrowed is not None and narrowed <= allowed:
+            return True
+
+    interval = _interval(term)
+    if interval is not None:
+        field, allowed = interval
+        narrowed = None
+        for t in terms:
+            i = _interval(t) if isinstance(t, dict) else None
+            if i is not None and i[0] == field:
+                narrowed = i[1] if narrowed is None else _intersect(narrowed, i[1])
+        if narrowed is not None and _within(narrowed, allowed):
+            return True
+
+    if term['operator'] == 'or':
+        return any(_term_implied(terms, operand) for operand in term['operands'])
+    return False
+
+
+def query_implies(narrow, broad):
+    """True if every record matching narrow also matches broad."""
+    terms = _conjuncts(narrow)
+    return all(_term_implied(terms, term) for term in _conjuncts(broad))
+
+
+def residual_query(narrow, broad):
+    """The terms of narrow that broad does not already guarantee.
+
+    Returns None if there are none, that is, if both select the same records.
+    Applied to the result of broad, the residual selects the result of narrow.
+    """
+    terms = _conjuncts(broad)
+    residual = [term for term in _conjuncts(narrow) if not _term_implied(terms, term)]
+    if not residual:
+        return None
+    if len(residual) == 1:
+        return residual[0]
+    return {"operator": "and", "operands": residual}
+
 # Example usage
 if __name__ == "__main__":
     expressions = [
@@ -259,6 +713,11 @@ if __name__ == "__main__":
         'dayvolume > 1.5M && dayvolume < 5M',
         'dayvolume[1.5M: 5M] && eodprice > 50',
         '50 < eodprice',
+        'beta < -0.2',
+        'beta[-0.2:0.2]',
+        'short_interest.value >= 10M',
+        'short_interest_percentage_change.value <= 10%',
+        'region == "us" && ticker in ["AAPL", "MSFT", "NVDA"]',
     ]
 
     for expr in expressions:
@@ -0,0 +1,245 @@
+import asyncio
+import math
+import time
+
+from .screener_builder import Expr, format_query
+from .screener_cache import query_key
+from .screener_eval import Evaluator
+from .screener_expr import canonicalize, residual_query
+
+
+class Step:
+    # kind is 'cached' (answered by the client's ScreenCache), 'crawl'
+    # (server pushdown) or 'broad' (one crawl, split locally into targets).
+    # n_records and n_requests are None for crawls that weren't probed.
+    def __init__(self, kind, query, n_records, n_requests, targets):
+        self.kind = kind
+        self.query = query
+        self.n_records = n_records
+        self.n_requests = n_requests
+        self.targets = targets
+
+
+class Plan:
+    def __init__(self, planner, queries, opt, steps, residuals, n_probes):
+        self._planner = planner
+        self.queries = queries
+        self.opt = opt
+        self.steps = steps
+        self._residuals = residuals
+        self.n_probes = n_probes
+
+    # count probes included, unprobed crawls counted as one page
+    @property
+    def n_requests(self):
+        return sum(_step_pages(step) for step in self.steps) + self.n_probes
+
+    @property
+    def latency(self):
+        return self._planner.estimate_latency([_step_pages(s) for s in self.steps], self.n_probes)
+
+    def explain(self):
+        unknown = any(step.n_requests is None for step in self.steps)
+        lines = [
+            f'Plan: {len(self.queries)} screen(s), {"at least " if unknown else ""}{self.n_requests} request(s), '
+            f'~{self.latency:.2f}s expected, {self.n_probes} count probe(s) spent'
+        ]
+        for step in self.steps:
+            targets = ', '.join(f'#{i}' for i in step.targets)
+            n_requests = '?' if step.n_requests is None else step.n_requests
+            n_records = '?' if step.n_records is None else step.n_records
+            lines.append(
+                f'  {step.kind:<6} {n_requests:>4} req {n_records:>7} rows -> {targets}'
+                f'  {format_query(step.query)}'
+            )
+        return '\n'.join(lines)
+
+    async def execute(self, session):
+        client = self._planner.client
+        rv = [None] * len(self.queries)
+        sem = asyncio.Semaphore(client.MAX_CONCURRENCY)
+
+        async def run(step):
+            async with sem:
+                records = await client.screen(session, step.query, self.opt)
+            if step.kind != 'broad':
+                rv[step.targets[0]] = records
+                return
+            for i in step.targets:
+                residual = self._residuals[i]
+                if residual is None:
+                    rv[i] = list(records)
+                else:
+                    rv[i] = Evaluator(residual, self._planner.fields).filter(records)
+
+        await asyncio.gather(*(run(step) for step in self.steps))
+        return rv
+
+
+class Planner:
+    """Chooses between server pushdown and local evaluation for screens.
+
+    For each screen the planner considers the client's ScreenCache, a crawl
+    of its own, or, for each group of screens sharing '&&' terms, one crawl
+    of the shared terms split locally with Evaluator. Page counts come from
+    count probes (cached for count_ttl seconds), spent only on the screens of
+    such groups and their shared terms. The plan with the fewest requests,
+    probes included, or with objective='latency' the lowest expected
+    latency, wins.
+
+    Local splits need the crawled records to carry the fields of the
+    remaining terms: local_fields lists such fields, in addition to the
+    record keys the client's cache has seen.
+    """
+
+    def __init__(self, client, objective='requests', page_latency=0.5,
+                 local_fields=None, fields=None, count_ttl=60):
+        if objective not in ('requests', 'latency'):
+            raise ValueError(f"Unsupported objective: {objective}")
+        self.client = client
+        self.objective = objective
+        self.page_latency = page_latency
+        self.local_fields = set(local_fields or ())
+        cache = client.cache
+        self.fields = fields if fields is not None else (cache.fields if cache is not None else {})
+        self.count_ttl = count_ttl
+        self._counts = {}
+
+    def estimate_latency(self, pages, n_probes=0):
+        # probes run before the crawls, crawls page sequentially, up to
+        # MAX_CONCURRENCY requests at a time
+        waves = math.ceil(n_probes / self.client.MAX_CONCURRENCY)
+        pages = [n for n in pages if n]
+        if pages:
+            waves += max(max(pages), math.ceil(sum(pages) / self.client.MAX_CONCURRENCY))
+        return waves * self.page_latency
+
+    def _pages(self, n_records):
+        return max(1, math.ceil(n_records / self.client.MAX_ITEM))
+
+    def _cost(self, steps, n_probes):
+        pages = [_step_pages(step) for step in steps]
+        if self.objective == 'latency':
+            return self.estimate_latency(pages, n_probes), sum(pages) + n_probes
+        return sum(pages) + n_probes, self.estimate_latency(pages, n_probes)
+
+    async def _count(self, session, query, opt):
+        key = query_key(query, opt)
+        cached = self._counts.get(key)
+        if cached is not None and time.monotonic() - cached[0] <= self.count_ttl:
+            return cached[1], 0
+        n_records = await self.client.count(session, query, opt)
+        self._counts[key] = time.monotonic(), n_records
+        return n_records, 1
+
+    async def _counts_for(self, session, queries, opt):
+        results = await asyncio.gather(*(self._count(session, q, opt) for q in queries))
+        return [n for n, _ in results], sum(probes for _, probes in results)
+
+    def _local_keys(self):
+        keys = set(self.local_fields)
+        cache = self.client.cache
+        if cache is not None:
+            keys |= cache.known_keys()
+        return keys
+
+    async def plan(self, session, screener_exprs, opt={}):
+        client = self.client
+        queries = [canonicalize(client._to_query(expr)) for expr in screener_exprs]
+        cache = client.cache
+
+        steps = []
+        pending = []
+        for i, query in enumerate(queries):
+            if cache is not None and cache.covers(query, opt):
+                steps.append(Step('cached', query, 0, 0, [i]))
+            else:
+                pending.append(i)
+
+        residuals = [None] * len(queries)
+        groups = []
+        keys = self._local_keys()
+        for broad, members in self._broad_groups(queries, pending):
+            local = []
+            for i in members:
+                residual = residual_query(queries[i], broad)
+                if residual is not None:
+                    evaluator = Evaluator(residual, self.fields)
+                    if any(evaluator.key(f) not in keys for f in evaluator.fields_used()):
+                        continue
+                residuals[i] = residual
+                local.append(i)
+            if len(local) >= 2:
+                groups.append((broad, local))
+
+        # only a group's screens and shared terms are probed, every other
+        # screen is crawled on its own whatever it costs
+        grouped = [i for _, local in groups for i in local]
+        counts, n_probes = await self._counts_for(
+            session, [queries[i] for i in grouped] + [broad for broad, _ in groups], opt
+        )
+        n_records = dict(zip(grouped, counts))
+        crawl = {
+            i: Step('crawl', queries[i], n_records[i], self._pages(n_records[i]), [i])
+            if i in n_records else Step('crawl', queries[i], None, None, [i])
+            for i in pending
+        }
+
+        # each group's broad crawl replaces its screens' own crawls if that
+        # lowers the cost of the whole plan
+        split = dict(crawl)
+        for (broad, local), n_broad in zip(groups, counts[len(grouped):]):
+            broad_step = Step('broad', broad, n_broad, self._pages(n_broad), local)
+            candidate = {
+                i: broad_step if i == local[0] else step
+                for i, step in split.items() if i == local[0] or i not in local
+            }
+            if self._cost(candidate.values(), n_probes) < self._cost(split.values(), n_probes):
+                split = candidate
+
+        return Plan(self, queries, opt, steps + list(split.values()), residuals, n_probes)
+
+    # Groups of queries sharing '&&' terms, each with the query of the terms
+    # all its members share. The term shared by the most queries seeds a
+    # group, so one unrelated query doesn't break up the others.
+    def _broad_groups(self, queries, indices):
+        terms = {i: {query_key(t)[0]: t for t in _and_terms(queries[i])} for i in indices}
+        remaining = list(indices)
+        groups = []
+        while True:
+            counts = {}
+            for i in remaining:
+                for key in terms[i]:
+                    counts[key] = counts.get(key, 0) + 1
+            seed = max(counts, key=counts.get, default=None)
+            if seed is None or counts[seed] < 2:
+                return groups
+            members = [i for i in remaining if seed in terms[i]]
+            common = [t for key, t in terms[members[0]].items() if all(key in terms[i] for i in members)]
+            groups.append((common[0] if len(common) == 1 else {"operator": "and", "operands": common}, members))
+            remaining = [i for i in remaining if i not in members]
+
+    async def screen(self, session, screener_expr, opt={}):
+        return (await self.screen_many(session, [screener_expr], opt))[0]
+
+    async def screen_many(self, session, screener_exprs, opt={}):
+        plan = await self.plan(session, screener_exprs, opt)
+        return await plan.execute(session)
+
+    async def explain(self, session, screener_exprs, opt={}):
+        if isinstance(screener_exprs, (str, dict, Expr)):
+            screener_exprs = [screener_exprs]
+        text = (await self.plan(session, screener_exprs, opt)).explain()
+        print(text)
+        return text
+
+
+def _step_pages(step):
+    # an unprobed crawl takes at least one request
+    return 1 if step.n_requests is None else step.n_requests
+
+
+def _and_terms(query):
+    if isinstance(query, dict) and query['operator'] == 'and':
+        return query['operands']
+    return [query]
@@ -0,0 +1,332 @@
+import bisect
+import json
+import mmap
+import os
+import re
+import shutil
+import sys
+import time
+from array import array
+from datetime import datetime, timezone
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .screener_eval import raw_value
+
+FORMAT_VERSION = 2
+
+# Layout of a run, <root>/<name>/<run id>/:
+#   header.json   row count, creation time, query and column types
+#   symbols.off   uint64 end offsets into symbols.txt, rows are sorted by symbol
+#   symbols.txt   UTF-8 symbols back to back
+#   <i>.f8|<i>.i8 numeric column i, NaN for missing floats
+#   <i>.codes     int32 dictionary codes of text column i, -1 for missing
+#   <i>.dict.off, <i>.dict.txt   the dictionary, stored like the symbols
+#   a json column is a text column whose dictionary holds JSON texts, for
+#   booleans, lists, objects, integers past int64 and mixed types
+# A run is written to a temporary directory and renamed into place, runs
+# are never modified afterwards.
+
+_NAME = re.compile(r'^[A-Za-z0-9_.=-]+$')
+
+
+def _run_id(created):
+    return datetime.fromtimestamp(created, timezone.utc).strftime('%Y%m%dT%H%M%S.%fZ')
+
+
+def _write_array(path, typecode, values):
+    with open(path, 'wb') as f:
+        array(typecode, values).tofile(f)
+
+
+def _write_strings(path, strings):
+    offsets = []
+    end = 0
+    with open(path + '.txt', 'wb') as f:
+        for s in strings:
+            data = s.encode('utf-8')
+            f.write(data)
+            end += len(data)
+            offsets.append(end)
+    _write_array(path + '.off', 'Q', offsets)
+
+
+_INT64 = range(-2**63, 2**63)
+
+
+def _column_type(values):
+    present = [v for v in values if v is not None]
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        if any(isinstance(v, int) and v not in _INT64 for v in present):
+            return 'json'
+        if present and len(present) == len(values) and all(isinstance(v, int) for v in present):
+            return 'i8'
+        return 'f8'
+    if all(isinstance(v, str) for v in present):
+        return 'dict'
+    return 'json'
+
+
+class SnapshotStore:
+    """Screen runs stored as memory-mappable columnar files."""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _dir(self, name):
+        if not _NAME.match(name):
+            raise ValueError(f"Invalid snapshot name: {name}")
+        return os.path.join(self.root, name)
+
+    def append(self, name, records, query=None, created=None, key='ticker'):
+        created = time.time() if created is None else created
+        run_id = _run_id(created)
+        directory = self._dir(name)
+        os.makedirs(directory, exist_ok=True)
+        final = os.path.join(directory, run_id)
+        if os.path.exists(final):
+            raise ValueError(f"Snapshot run exists: {name}/{run_id}")
+        tmp = os.path.join(directory, f'.{run_id}.tmp')
+        os.makedirs(tmp)
+        try:
+            self._write_run(tmp, records, query, created, key)
+            os.replace(tmp, final)
+        finally:
+            if os.path.exists(tmp):
+                shutil.rmtree(tmp, ignore_errors=True)
+        return run_id
+
+    def _write_run(self, tmp, records, query, created, key):
+        by_symbol = {}
+        for record in records:
+            symbol = record.get(key)
+            if symbol is not None:
+                by_symbol[str(symbol)] = record
+        symbols = sorted(by_symbol)
+        rows = [by_symbol[s] for s in symbols]
+        _write_strings(os.path.join(tmp, 'symbols'), symbols)
+
+        fields = {}
+        for record in rows:
+            for field in record:
+                fields.setdefault(field, None)
+        fields.pop(key, None)
+
+        columns = []
+        for i, field in enumerate(fields):
+            values = [raw_value(record.get(field)) for record in rows]
+            kind = _column_type(values)
+            path = os.path.join(tmp, str(i))
+            if kind == 'i8':
+                _write_array(path + '.i8', 'q', values)
+            elif kind == 'f8':
+                _write_array(path + '.f8', 'd', [float('nan') if v is None else v for v in values])
+            else:
+                codes = {}
+                encoded = []
+                for v in values:
+                    if v is None:
+                        encoded.append(-1)
+                        continue
+                    if kind == 'json':
+                        v = json.dumps(v, ensure_ascii=False)
+                    encoded.append(codes.setdefault(v, len(codes)))
+                _write_array(path + '.codes', 'i', encoded)
+                _write_strings(path + '.dict', list(codes))
+            columns.append({"name": field, "type": kind})
+
+        header = {
+            "version": FORMAT_VERSION,
+            "byteorder": sys.byteorder,
+            "created": created,
+            "n_rows": len(rows),
+            "key": key,
+            "query": query,
+            "columns": columns,
+        }
+        with open(os.path.join(tmp, 'header.json'), 'w', encoding='utf-8') as f:
+            json.dump(header, f, ensure_ascii=False)
+
+    def runs(self, name):
+        directory = self._dir(name)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(d for d in os.listdir(directory) if not d.startswith('.'))
+
+    def open(self, name, run_id=None):
+        if run_id is None:
+            runs = self.runs(name)
+            if not runs:
+                raise KeyError(f"No snapshot runs: {name}")
+            run_id = runs[-1]
+        return SnapshotReader(os.path.join(self._dir(name), run_id))
+
+
+class _Strings:
+    # strings stored by _write_strings(), decoded on access
+    def __init__(self, offsets, data):
+        self._offsets = offsets
+        self._data = data
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        start = self._offsets[i - 1] if i else 0
+        return bytes(self._data[start:self._offsets[i]]).decode('utf-8')
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class DictColumn:
+    def __init__(self, codes, dictionary):
+        self.codes = codes
+        self.dictionary = dictionary
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        code = int(self.codes[i])
+        return None if code < 0 else self.dictionary[code]
+
+    def decode(self):
+        values = list(self.dictionary)
+        return [None if code < 0 else values[code] for code in self.codes]
+
+    def code_of(self, value):
+        for code, v in enumerate(self.dictionary):
+            if v == value:
+                return code
+        return -1
+
+
+class JsonColumn(DictColumn):
+    """A DictColumn of JSON texts, decoded on access."""
+
+    def __getitem__(self, i):
+        code = int(self.codes[i])
+        return None if code < 0 else json.loads(self.dictionary[code])
+
+    def decode(self):
+        values = [json.loads(v) for v in self.dictionary]
+        return [None if code < 0 else values[code] for code in self.codes]
+
+    def code_of(self, value):
+        # compared as JSON text, so 1 and True stay apart
+        return super().code_of(json.dumps(value, ensure_ascii=False))
+
+
+class SnapshotReader:
+    """One stored run. Columns are memory-mapped, not copied.
+
+    Numeric columns are NumPy arrays when numpy is installed, memoryviews
+    otherwise. Text columns are DictColumns, other values JsonColumns.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'header.json'), encoding='utf-8') as f:
+            self.header = json.load(f)
+        if not 1 <= self.header['version'] <= FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot version: {self.header['version']}")
+        self.n_rows = self.header['n_rows']
+        self.created = self.header['created']
+        self.query = self.header.get('query')
+        self._index = {c['name']: (i, c['type']) for i, c in enumerate(self.header['columns'])}
+        self._maps = []
+        self._columns = {}
+        self._swap = self.header['byteorder'] != sys.byteorder
+        self.symbols = self._strings('symbols')
+
+    @property
+    def fields(self):
+        return list(self._index)
+
+    def _map(self, filename, typecode):
+        path = os.path.join(self.path, filename)
+        if os.path.getsize(path) == 0:
+            buffer = b''
+        else:
+            with open(path, 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps.append(buffer)
+        if self._swap:
+            # written on a machine of the other byte order: copy and swap
+            values = array(typecode)
+            values.frombytes(bytes(buffer))
+            values.byteswap()
+            buffer = values.tobytes()
+        if np is not None:
+            return np.frombuffer(buffer, dtype=np.dtype(typecode))
+        return memoryview(buffer).cast('B').cast(typecode)
+
+    def _strings(self, name):
+        offsets = self._map(name + '.off', 'Q')
+        path = os.path.join(self.path, name + '.txt')
+        if os.path.getsize(path) == 0:
+            data = memoryview(b'')
+        else:
+            with open(path, 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps.append(buffer)
+            data = memoryview(buffer)
+        return _Strings(offsets, data)
+
+    def column(self, field):
+        column = self._columns.get(field)
+        if column is not None:
+            return column
+        if field not in self._index:
+            raise KeyError(field)
+        i, kind = self._index[field]
+        if kind == 'f8':
+            column = self._map(f'{i}.f8', 'd')
+        elif kind == 'i8':
+            column = self._map(f'{i}.i8', 'q')
+        elif kind == 'json':
+            column = JsonColumn(self._map(f'{i}.codes', 'i'), self._strings(f'{i}.dict'))
+        else:
+            column = DictColumn(self._map(f'{i}.codes', 'i'), self._strings(f'{i}.dict'))
+        self._columns[field] = column
+        return column
+
+    def row(self, symbol):
+        """Row index of a symbol, or -1."""
+        i = bisect.bisect_left(self.symbols, symbol)
+        if i < len(self.symbols) and self.symbols[i] == symbol:
+            return i
+        return -1
+
+    def get(self, symbol, field):
+        i = self.row(symbol)
+        if i < 0:
+            return None
+        value = self.column(field)[i]
+        if isinstance(value, float) and value != value:
+            return None
+        return value.item() if hasattr(value, 'item') else value
+
+    def close(self):
+        self._columns.clear()
+        self.symbols = None
+        for buffer in self._maps:
+            try:
+                buffer.close()
+            except BufferError:
+                # an array handed out still points into the map
+                pass
+        self._maps = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,170 @@
+import asyncio
+import concurrent.futures
+import os
+import threading
+
+from .yscreener_client import YahooFClient
+
+
+class SyncYahooFClient:
+    """Blocking YahooFClient for sync code (Celery tasks, notebooks, scripts).
+
+        client = SyncYahooFClient()
+        rv = client.screen('region=="us" && intradaymarketcap > 10B')
+        n = client.count('region=="kr"')
+        client.close()
+
+    One event loop runs in a background thread for the life of the client,
+    with one aiohttp session, so the connection pool, cookie and crumb stay
+    warm between calls. Every call runs on that loop, so any number of
+    threads can call at once. The loop starts on the first call and again
+    after a fork.
+    """
+
+    def __init__(self, client=None, timeout=None, **kwargs):
+        # kwargs are YahooFClient's if no client is given
+        self.client = client if client is not None else YahooFClient(**kwargs)
+        # seconds a call may take, None waits as long as it takes
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._pid = None
+
+    def _start(self):
+        with self._lock:
+            if self._loop is not None and self._pid == os.getpid():
+                return
+            # a forked child has the parent's loop but not its thread
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name='yscreener-loop', daemon=True)
+            thread.start()
+            self._session = asyncio.run_coroutine_threadsafe(self._open_session(), loop).result()
+            self._loop, self._thread, self._pid = loop, thread, os.getpid()
+
+    async def _open_session(self):
+        from aiohttp import ClientSession
+
+        trace_configs = [self.client.trace_config()] if self.client._hooks else None
+        return ClientSession(trace_configs=trace_configs)
+
+    def _run(self, coro):
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result(self.timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def _ready(self):
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("SyncYahooFClient called from its own event loop, await the YahooFClient instead")
+        self._start()
+        return self._session
+
+    def _call(self, method, *args, **kwargs):
+        session = self._ready()
+        return self._run(method(session, *args, **kwargs))
+
+    def screen(self, screener_expr, opt={}):
+        return self._call(self.client.screen, screener_expr, opt)
+
+    def screen_many(self, screener_exprs, opt={}):
+        return self._call(self.client.screen_many, screener_exprs, opt)
+
+    def screen_delta(self, screener_expr, fields=(), opt={}, rtol=0.0, atol=0.0):
+        return self._call(self.client.screen_delta, screener_expr, fields, opt, rtol, atol)
+
+    def count(self, screener_expr, opt={}):
+        return self._call(self.client.count, screener_expr, opt)
+
+    def aggregate(self, screener_expr, group_by=(), aggregates=('count',), opt={}):
+        return self._call(self.client.aggregate, screener_expr, group_by, aggregates, opt)
+
+    def estimate(self, screener_expr, statistics, precision=0.02, confidence=0.95, opt={}, **kwargs):
+        return self._call(self.client.estimate, screener_expr, statistics, precision, confidence, opt, **kwargs)
+
+    def snapshot_universe(self, screener_expr=None, regions=None, opt={}, shard_size=5000):
+        return self._call(self.client.snapshot_universe, screener_expr, regions, opt, shard_size)
+
+    # Pages as they arrive, see YahooFClient.iter_pages(). The next page is
+    # requested when the previous one has been consumed.
+    def iter_pages(self, screener_expr, opt={}):
+        pages = self.client.iter_pages(self._ready(), screener_expr, opt)
+        try:
+            while True:
+                page = self._run(self._anext(pages))
+                if page is _DONE:
+                    return
+                yield page
+        finally:
+            self._run(pages.aclose())
+
+    def iter_records(self, screener_expr, opt={}):
+        for page in self.iter_pages(screener_expr, opt):
+            yield from page
+
+    @staticmethod
+    async def _anext(pages):
+        try:
+            return await pages.__anext__()
+        except StopAsyncIteration:
+            return _DONE
+
+    def close(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+            if loop is None or self._pid != os.getpid():
+                return
+            asyncio.run_coroutine_threadsafe(self._session.close(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join()
+            loop.close()
+            self._session = self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_DONE = object()
+
+
+if __name__ == '__main__':
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    from aiohttp import ClientSession
+
+    from .mock_server import MockYahooServer
+
+    # the mock server gets a loop of its own, the sync client doesn't share it
+    server_loop = asyncio.new_event_loop()
+    threading.Thread(target=server_loop.run_forever, daemon=True).start()
+    server = MockYahooServer(n_records=5000, latency=0.01)
+    asyncio.run_coroutine_threadsafe(server.start(), server_loop).result()
+    exprs = [f'intradaymarketcap > {cap}' for cap in ('50B', '20B', '10B', '5B')] * 5
+
+    async def screen_once(expr):
+        async with ClientSession() as session:
+            return await YahooFClient(base_url=server.url).screen(session, expr)
+
+    start = time.perf_counter()
+    n_records = sum(len(asyncio.run(screen_once(expr))) for expr in exprs)
+    print(f'asyncio.run() per call: {n_records} records in {time.perf_counter() - start:.2f}s')
+
+    with SyncYahooFClient(base_url=server.url) as client:
+        start = time.perf_counter()
+        n_records = sum(len(client.screen(expr)) for expr in exprs)
+        print(f'SyncYahooFClient:       {n_records} records in {time.perf_counter() - start:.2f}s')
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(8) as pool:
+            n_records = sum(len(rv) for rv in pool.map(client.screen, exprs))
+        print(f'8 threads:              {n_records} records in {time.perf_counter() - start:.2f}s')
+
+        pages = list(client.iter_pages('intradaymarketcap > 1B'))
+        print(f'iter_pages: {len(pages)} pages, count() {client.count("intradaymarketcap > 1B")}')
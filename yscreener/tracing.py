@@ -0,0 +1,187 @@
+import contextvars
+import json
+import os
+import time
+
+_current = contextvars.ContextVar('yscreener_span', default=None)
+
+
+class _NullSpan:
+    # stands in for a span when tracing is off
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+def current_span():
+    span = _current.get()
+    return NULL_SPAN if span is None else span
+
+
+class Span:
+    __slots__ = (
+        'tracer', 'name', 'trace_id', 'span_id', 'parent_id',
+        'start_ns', 'end_ns', 'attributes', 'status', '_token',
+    )
+
+    def __init__(self, tracer, name, attributes):
+        parent = _current.get()
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start_ns = None
+        self.end_ns = None
+        self.attributes = {k: v for k, v in attributes.items() if v is not None}
+        self.status = 'ok'
+        self._token = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @property
+    def duration(self):
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        self._token = _current.set(self)
+        for exporter in self.tracer.exporters:
+            exporter.on_start(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        _current.reset(self._token)
+        if exc is not None:
+            self.status = 'error'
+            self.attributes['error'] = f'{exc_type.__name__}: {exc}'
+        for exporter in self.tracer.exporters:
+            exporter.on_end(self)
+        return False
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class Tracer:
+    """Spans of screens, YahooFClient(tracer=Tracer(exporter, ...)).
+
+    A screen() gives the tree screen -> auth -> cookie/crumb and
+    screen -> page -> ratelimit/http/decode, a page has one http span per
+    attempt. Spans nest through contextvars, so they follow asyncio tasks.
+    """
+
+    def __init__(self, *exporters):
+        self.exporters = list(exporters)
+
+    def span(self, name, **attributes):
+        return Span(self, name, attributes)
+
+    def close(self):
+        for exporter in self.exporters:
+            exporter.close()
+
+
+class Exporter:
+    def on_start(self, span):
+        pass
+
+    def on_end(self, span):
+        pass
+
+    def close(self):
+        pass
+
+
+class MemoryExporter(Exporter):
+    def __init__(self):
+        self.spans = []
+
+    def on_end(self, span):
+        self.spans.append(span)
+
+    def clear(self):
+        self.spans = []
+
+    def tree(self):
+        """The finished spans as an indented text tree, children in start order."""
+        children = {}
+        for span in self.spans:
+            children.setdefault(span.parent_id, []).append(span)
+        lines = []
+
+        def walk(parent_id, depth):
+            for span in sorted(children.get(parent_id, ()), key=lambda s: s.start_ns):
+                attributes = ' '.join(f'{k}={v}' for k, v in span.attributes.items())
+                lines.append(f"{'  ' * depth}{span.name} {span.duration * 1000:.1f} ms {attributes}".rstrip())
+                walk(span.span_id, depth + 1)
+
+        known = {span.span_id for span in self.spans}
+        for root in {span.parent_id for span in self.spans if span.parent_id not in known}:
+            walk(root, 0)
+        return '\n'.join(lines)
+
+
+class JsonLinesExporter(Exporter):
+    """One JSON object per finished span, appended to a file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def on_end(self, span):
+        self._file.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + '\n')
+
+    def close(self):
+        self._file.close()
+
+
+class OpenTelemetryExporter(Exporter):
+    """Mirrors the spans to an OpenTelemetry tracer (opentelemetry-api)."""
+
+    def __init__(self, tracer=None):
+        try:
+            from opentelemetry import trace
+            from opentelemetry.trace import Status, StatusCode
+        except ImportError:
+            raise ImportError("OpenTelemetryExporter requires opentelemetry-api") from None
+        self._trace = trace
+        self._error = Status(StatusCode.ERROR)
+        self._tracer = tracer or trace.get_tracer('yscreener')
+        self._live = {}
+
+    def on_start(self, span):
+        parent = self._live.get(span.parent_id)
+        context = self._trace.set_span_in_context(parent) if parent is not None else None
+        self._live[span.span_id] = self._tracer.start_span(span.name, context=context, start_time=span.start_ns)
+
+    def on_end(self, span):
+        otel_span = self._live.pop(span.span_id, None)
+        if otel_span is None:
+            return
+        for key, value in span.attributes.items():
+            if not isinstance(value, (bool, int, float, str)):
+                value = str(value)
+            otel_span.set_attribute(key, value)
+        if span.status == 'error':
+            otel_span.set_status(self._error)
+        otel_span.end(end_time=span.end_ns)
@@ -0,0 +1,199 @@
+import asyncio
+import gzip
+import json
+import math
+import time
+
+from .screener_eval import raw_value
+
+# Region codes of screener_identifiers.txt
+REGIONS = (
+    'za', 've', 'vn', 'us', 'tw', 'th', 'tr', 'sr', 'sg', 'sa', 'se', 'ru', 'ro', 'qa', 'pt', 'pk', 'pl',
+    'ph', 'nz', 'nl', 'mx', 'pe', 'no', 'my', 'lv', 'lt', 'kw', 'jp', 'is', 'il', 'lk', 'kr', 'it', 'in',
+    'ie', 'hu', 'id', 'hk', 'gb', 'fi', 'eg', 'dk', 'gr', 'fr', 'es', 'ee', 'de', 'cz', 'cl', 'ca', 'be',
+    'at', 'cn', 'br', 'au', 'ar', 'ch',
+)
+
+# Market cap brackets large regions are sharded by. Neighbouring brackets
+# share their bound (btwn includes both), duplicates are dropped on merge.
+MARKETCAP_EDGES = (1e7, 1e8, 3e8, 1e9, 3e9, 1e10, 1e11)
+
+
+def _and(*terms):
+    terms = [t for t in terms if t is not None]
+    if len(terms) == 1:
+        return terms[0]
+    return {"operator": "and", "operands": list(terms)}
+
+
+def _bracket(field, lower, upper):
+    if lower is None:
+        return {"operator": "lt", "operands": [field, upper]}
+    if upper is None:
+        return {"operator": "gt", "operands": [field, lower]}
+    return {"operator": "btwn", "operands": [field, lower, upper]}
+
+
+def marketcap_brackets(edges=MARKETCAP_EDGES):
+    # (lower, upper) pairs, None is unbounded
+    bounds = [None, *edges, None]
+    return list(zip(bounds, bounds[1:]))
+
+
+def split_bracket(lower, upper):
+    """Two brackets covering (lower, upper), None if it can't be split."""
+    if lower is None:
+        middle = upper // 10
+    elif upper is None:
+        middle = lower * 10
+    else:
+        middle = int(math.sqrt(lower * upper)) if lower > 0 else upper // 10
+    if middle < 1 or (lower is not None and middle <= lower) or (upper is not None and middle >= upper):
+        return None
+    return [(lower, middle), (middle, upper)]
+
+
+def marketcap_shards(query, field='intradaymarketcap', edges=MARKETCAP_EDGES):
+    return [_and(query, _bracket(field, lower, upper)) for lower, upper in marketcap_brackets(edges)]
+
+
+class UniverseSnapshot:
+    def __init__(self, records, timings, started, finished):
+        self.records = records
+        # region -> {'records', 'shards', 'requests', 'seconds', 'wait'},
+        # seconds while the region had a request in flight, wait in the
+        # queue for MAX_CONCURRENCY summed over its requests
+        self.timings = timings
+        self.started = started
+        self.finished = finished
+
+    def __len__(self):
+        return len(self.records)
+
+    def fields(self):
+        names = {}
+        for record in self.records:
+            for name in record:
+                names.setdefault(name, None)
+        return list(names)
+
+    def columns(self, fields=None):
+        """Field -> list of raw values, None where a record lacks the field."""
+        fields = self.fields() if fields is None else fields
+        return {
+            name: [raw_value(record.get(name)) for record in self.records]
+            for name in fields
+        }
+
+    def write(self, path):
+        # one consolidated columnar file, gzipped JSON
+        doc = {
+            "started": self.started,
+            "finished": self.finished,
+            "timings": self.timings,
+            "columns": self.columns(),
+        }
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            json.dump(doc, f, ensure_ascii=False)
+
+    def report(self):
+        lines = [f'{len(self.records)} records in {self.finished - self.started:.1f}s']
+        slowest = sorted(self.timings.items(), key=lambda item: -item[1]['seconds'])
+        for region, t in slowest:
+            lines.append(
+                f"  {region}: {t['seconds']:7.2f}s ({t['wait']:.2f}s queued) {t['records']:>6} records "
+                f"{t['shards']:>2} shard(s) {t['requests']:>4} request(s)"
+            )
+        return '\n'.join(lines)
+
+
+async def snapshot_universe(client, session, query=None, regions=REGIONS, opt={}, shard_size=5000):
+    """Screen every region concurrently and merge the results.
+
+    Regions with more than shard_size records are split into market cap
+    brackets, if the brackets' counts show that they cover the region,
+    and brackets with more than shard_size records are split again.
+    All crawls share the client's MAX_CONCURRENCY and rate limiter.
+    Records listed under several regions or shards are kept once.
+    """
+    started = time.time()
+    sem = asyncio.Semaphore(client.MAX_CONCURRENCY)
+    field = 'intradaymarketcap'
+
+    async def screen_region(region):
+        timing = {'records': 0, 'shards': 0, 'requests': 0, 'seconds': 0.0, 'wait': 0.0}
+        active = 0
+        busy_since = None
+
+        async def run(method, shard):
+            nonlocal active, busy_since
+            queued = time.monotonic()
+            async with sem:
+                now = time.monotonic()
+                timing['wait'] += now - queued
+                if not active:
+                    busy_since = now
+                active += 1
+                try:
+                    return await method(session, shard, opt)
+                finally:
+                    active -= 1
+                    if not active:
+                        timing['seconds'] += time.monotonic() - busy_since
+
+        async def counted(shard):
+            timing['requests'] += 1
+            return await run(client.count, shard)
+
+        region_query = _and({"operator": "eq", "operands": ["region", region]}, query)
+        n_records = await counted(region_query)
+        if not n_records:
+            return [], timing
+
+        shards = [region_query]
+        if n_records > shard_size:
+            brackets = marketcap_brackets()
+            counts = await asyncio.gather(*(counted(_and(region_query, _bracket(field, *b))) for b in brackets))
+            # records without a market cap fall in no bracket
+            if sum(counts) >= n_records:
+                shards = []
+                pending = [(b, n) for b, n in zip(brackets, counts) if n]
+                # brackets still over shard_size are split until they fit
+                while pending:
+                    shards += [_and(region_query, _bracket(field, *b)) for b, n in pending if n <= shard_size]
+                    brackets = []
+                    for (lower, upper), n in pending:
+                        if n <= shard_size:
+                            continue
+                        halves = split_bracket(lower, upper)
+                        if halves is None:
+                            raise ValueError(
+                                f"Can't shard region {region}: {n} records with {field} "
+                                f"{lower}..{upper}, shard_size is {shard_size}"
+                            )
+                        brackets += halves
+                    counts = await asyncio.gather(*(counted(_and(region_query, _bracket(field, *b))) for b in brackets))
+                    pending = [(b, n) for b, n in zip(brackets, counts) if n]
+
+        results = await asyncio.gather(*(run(client.screen, shard) for shard in shards))
+        rv = [record for result in results for record in result]
+        timing['records'] = len(rv)
+        timing['shards'] = len(shards)
+        timing['requests'] += sum(max(1, -(-len(r) // client.MAX_ITEM)) for r in results)
+        return rv, timing
+
+    results = await asyncio.gather(*(screen_region(region) for region in regions))
+
+    records = []
+    seen = set()
+    timings = {}
+    for region, (rv, timing) in zip(regions, results):
+        timings[region] = timing
+        for record in rv:
+            symbol = record.get('ticker')
+            if symbol is not None:
+                if symbol in seen:
+                    continue
+                seen.add(symbol)
+            records.append(record)
+    return UniverseSnapshot(records, timings, started, time.time())
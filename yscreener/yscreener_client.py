@@ -1,265 +1,522 @@
 import asyncio
+import heapq
 import json
-from aiohttp import ClientSession
-from urllib.parse import urlparse, urljoin
+import math
+import random
+import sys
+import time
 
 # https://stackoverflow.com/questions/45600579/asyncio-event-loop-is-closed-when-getting-loop
-import platform
-if platform.system()=='Windows':
+if sys.platform == 'win32':
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-from .crawlee.fingerprint_suite._header_generator import HeaderGenerator
-
-header_gen = HeaderGenerator()
+from .fingerprint import BROWSER_TYPES, header_profile
+from .screener_expr import parse_screener_expr, split_in_list
+from .screener_builder import Expr
+from .tracing import NULL_SPAN, current_span
+from .profiling import phase
 
-import random
-
-from .screener_expr import parse_screener_expr
+# aiohttp, numpy (screener_delta, screener_eval), sqlite3 (checkpoint) and
+# the modules behind aggregate(), estimate() and snapshot_universe() are
+# imported where they are used, import yscreener stays cheap.
 
 class YahooFClient:
     MAX_ITEM = 250
+    # 'in' lists longer than this are fanned out as several queries. One
+    # chunk fills one page, fewer requests aren't possible past MAX_ITEM
+    # (bench_screen.py chunks).
+    IN_CHUNK_SIZE = 250
+    MAX_CONCURRENCY = 4
+    # retries of a request answered with 429 or 401 (expired crumb)
+    MAX_RETRIES = 3
 
-    def __init__(self):
-        browser_type = random.choice(['chromium', 'firefox', 'webkit'])
-        common_headers = header_gen.get_common_headers()
-        ua_header = header_gen.get_user_agent_header(
-            browser_type=browser_type
-        )
-        sec_headers = header_gen.get_sec_ch_ua_headers(
-            browser_type=browser_type
-        ) 
-        self._headers = {
-            **common_headers,
-            **ua_header,
-            **sec_headers,
-            #"Origin": "https://finance.yahoo.com",
-            #"Referrer Policy": "no-referrer-when-downgrade",
-        }
+    # sortField -> record key, where the records response renames the field
+    RECORD_KEYS = {
+        'intradaymarketcap': 'marketCap',
+        'intradayprice': 'regularMarketPrice',
+    }
+
+    COOKIE_URL = "https://fc.yahoo.com"
+    CRUMB_URL = "https://query1.finance.yahoo.com/v1/test/getcrumb"
+    SCREENER_URL = "https://query1.finance.yahoo.com/v1/finance/screener"
+
+    def __init__(self, cache=None, checkpoint=None, rate_limiter=None, base_url=None, hooks=None, tracer=None, profiler=None):
+        # read-only, shared by every client of the same browser type
+        profile = header_profile(random.choice(BROWSER_TYPES))
+        self._headers = profile.headers
+        self._post_headers = profile.json_post_headers
         self._cookie = None
         self._crumb = None
+        # ScreenCache, answers repeated and narrower screens locally
+        self._cache = cache
+        # screener_delta.DeltaTracker, last result per screen for
+        # screen_delta(), created by the first one
+        self._delta = None
+        # CrawlCheckpoint, lets an interrupted crawl resume at the missing pages
+        self._checkpoint = checkpoint
+        # RateLimiter shared by every screener request of this client
+        self._rate_limiter = rate_limiter
+        self._url = None
+        # semaphore of MAX_CONCURRENCY screener requests in flight, shared by
+        # every call of the client, made per event loop by _request_slots()
+        self._slots = None
+        self._slots_loop = None
+        # hook(event, value, labels) callables, e.g. metrics.Metrics, see
+        # metrics.py for the events
+        self._hooks = list(hooks or ())
+        # tracing.Tracer, a span tree per screen
+        self._tracer = tracer
+        # profiling.Profiler, CPU and allocation profile per screen
+        self._profiler = profiler
+        # one host serving all three endpoints, e.g. mock_server.MockYahooServer
+        if base_url is not None:
+            base_url = base_url.rstrip('/')
+            self.COOKIE_URL = base_url + '/'
+            self.CRUMB_URL = base_url + '/v1/test/getcrumb'
+            self.SCREENER_URL = base_url + '/v1/finance/screener'
+
+    def _emit(self, event, value=1, **labels):
+        for hook in self._hooks:
+            hook(event, value, labels)
+
+    def _span(self, name, **attributes):
+        if self._tracer is None:
+            return NULL_SPAN
+        return self._tracer.span(name, **attributes)
+
+    # for ClientSession(trace_configs=[client.trace_config()]), adds DNS,
+    # connect and TTFB timings to the hooks
+    def trace_config(self):
+        from .metrics import trace_config
+
+        return trace_config(self._emit)
 
     async def cookie(self, session):
         # TODO: if the session doesn't have the cookie...
         if self._cookie:
             return self._cookie
-        async with session.get(
-            "https://fc.yahoo.com",
-            headers=self._headers,
-            allow_redirects=True
-        ) as response:
-            cookies = response.cookies
-            if not cookies:
-                raise Exception("Failed to obtain Yahoo auth cookie.")
-            self._cookie = list(cookies.values())[0]
-            return self._cookie
+        start = time.perf_counter() if self._hooks else None
+        with self._span('cookie') as span:
+            async with session.get(
+                self.COOKIE_URL,
+                headers=self._headers,
+                allow_redirects=True
+            ) as response:
+                span.set(status=response.status)
+                cookies = response.cookies
+                if not cookies:
+                    raise Exception("Failed to obtain Yahoo auth cookie.")
+                self._cookie = list(cookies.values())[0]
+        if self._hooks:
+            self._emit('auth_seconds', time.perf_counter() - start, step='cookie')
+        return self._cookie
 
     async def crumb(self, session):
         if self._crumb:
             return self._crumb
-        async with session.get(
-            "https://query1.finance.yahoo.com/v1/test/getcrumb",
-            headers=self._headers,
-            # We don't need this
-            cookies={self._cookie.key: self._cookie.value},
-            allow_redirects=True
-        ) as response:
-            crumb = await response.text()
-            if crumb is None:
-                raise Exception("Failed to retrieve Yahoo crumb.")
-            self._crumb = crumb
-            return crumb
+        start = time.perf_counter() if self._hooks else None
+        with self._span('crumb') as span:
+            async with session.get(
+                self.CRUMB_URL,
+                headers=self._headers,
+                # We don't need this
+                cookies={self._cookie.key: self._cookie.value},
+                allow_redirects=True
+            ) as response:
+                span.set(status=response.status)
+                crumb = await response.text()
+                if crumb is None:
+                    raise Exception("Failed to retrieve Yahoo crumb.")
+                self._crumb = crumb
+        if self._hooks:
+            self._emit('auth_seconds', time.perf_counter() - start, step='crumb')
+        return crumb
 
     # JSON.stringify(o) != json.dumps(d)
     # JSON.stringify(o) == json.dumps(d, ensure_ascii=False)
     def _json_request(self, payload):
-        headers = {**self._headers, 'Content-Type': 'application/json'}
-        payload = json.dumps(payload, ensure_ascii=False)
-        return headers, payload
-
-#    async def screen(self, session, screener_expr, opt={}):
-#        await self.cookie(session)
-#        crumb = await self.crumb(session)
-#
-#        url = f"https://query1.finance.yahoo.com/v1/finance/screener?formatted=true&useRecordsResponse=true&lang=en-US&crumb={crumb}"
-#
-#        query = parse_screener_expr(screener_expr)
-#        print(query)
-#        default_payload = {
-#            "quoteType": "equity",
-#            "sortField": "intradaymarketcap",
-#            "sortType": "desc",
-#            "query": query,
-#        }
-#
-#        n_records = -1
-#        n_left = 0
-#        offset = 0
-#        size = self.MAX_ITEM
-#
-#        rv = []
-#
-#        while True:
-#            payload = {**default_payload, **opt, "offset": offset, "size": size}
-#            headers, data = self._json_request(payload)
-#
-#            async with session.post(
-#                url,
-#                headers=headers,
-#                data=data
-#            ) as resp:
-#                resp.raise_for_status()
-#                resp_body = await resp.json()
-#                error = resp_body.get('finance').get('error')
-#                if error:
-#                    raise Exception(f'Failed to retrieve data: {error}')
-#
-#                if n_records < 0:
-#                    n_records = resp_body.get('finance').get('result')[0].get('total')
-#                    n_left = n_records
-#
-#                stock_infos = resp_body.get('finance').get('result')[0].get('records')
-#                rv.extend(stock_infos)
-#
-#                count = resp_body.get('finance').get('result')[0].get('count')
-#                n_left -= count
-#                if n_left <= 0:
-#                    break
-#                size = min(n_left, self.MAX_ITEM)
-#                offset += count
-#
-#        return rv
+        with phase('serialize'):
+            payload = json.dumps(payload, ensure_ascii=False)
+        return self._post_headers, payload
+
+    # JSON text of a screen's payload without offset and size, serialized
+    # once per query; _page_request() adds them for each page
+    def _payload_text(self, query, opt):
+        payload = {**self._default_payload(query), **opt}
+        payload.pop('offset', None)
+        payload.pop('size', None)
+        with phase('serialize'):
+            return json.dumps(payload, ensure_ascii=False)
+
+    def _page_request(self, text, offset, size):
+        return self._post_headers, f'{{"offset": {offset}, "size": {size}, {text[1:]}'
+
+    # The bytes of PreparedScreenerExpr.encode(), a query or a whole payload.
+    # They are decoded for the cache and 'in' list chunking but sent as
+    # encoded: (query, opt, payload text or None).
+    def _from_encoded(self, data, opt):
+        text = bytes(data).decode('utf-8')
+        doc = json.loads(text)
+        if not isinstance(doc, dict) or 'query' not in doc:
+            head = {**self._default_payload(None), **opt}
+            for name in ('query', 'offset', 'size'):
+                head.pop(name, None)
+            head = json.dumps(head, ensure_ascii=False)
+            return doc, opt, f'{head[:-1]}, "query": {text}}}'
+        # the payload's other fields act as opt, opt given here overrides them
+        payload_opt = {name: value for name, value in doc.items() if name != 'query'}
+        if opt or 'offset' in payload_opt or 'size' in payload_opt:
+            return doc['query'], {**payload_opt, **opt}, None
+        return doc['query'], payload_opt, text
 
     async def screen(self, session, screener_expr, opt={}):
-        await self.cookie(session)
-        crumb = await self.crumb(session)
+        if self._tracer is None and self._profiler is None:
+            return await self._screen(session, screener_expr, opt)
+        expr = screener_expr if isinstance(screener_expr, str) else None
+        profile = self._profiler.profile(expr or 'screen') if self._profiler is not None else NULL_SPAN
+        with self._span('screen', expr=expr) as span, profile:
+            rv = await self._screen(session, screener_expr, opt)
+            span.set(records=len(rv))
+            return rv
+
+    async def _screen(self, session, screener_expr, opt):
+        start = time.perf_counter() if self._hooks else None
+        text = None
+        if isinstance(screener_expr, (bytes, bytearray)):
+            query, opt, text = self._from_encoded(screener_expr, opt)
+        else:
+            query = self._to_query(screener_expr)
+        if self._cache is not None:
+            rv = self._cache.get(query, opt)
+            if rv is not None:
+                if self._hooks:
+                    self._emit('cache_hits_total')
+                current_span().set(cache='hit')
+                return rv
+            if self._hooks:
+                self._emit('cache_misses_total')
+
+        url = await self._screener_url(session)
+
+        queries = split_in_list(query, self.IN_CHUNK_SIZE)
+        if len(queries) == 1:
+            rv = await self._screen_query(session, url, query, opt, text)
+        else:
+            rv = await self._screen_chunks(session, url, queries, opt)
+
+        n_requests = max(len(queries), math.ceil(len(rv) / self.MAX_ITEM))
+        if self._cache is not None:
+            self._cache.put(query, opt, rv, n_requests)
+        current_span().set(pages=n_requests)
+        if self._hooks:
+            self._emit('screen_pages', n_requests)
+            self._emit('screen_seconds', time.perf_counter() - start)
+        return rv
+
+    # at most MAX_CONCURRENCY requests in flight across all the screens
+    async def screen_many(self, session, screener_exprs, opt={}):
+        return await asyncio.gather(*(self.screen(session, expr, opt) for expr in screener_exprs))
+
+    # Entries, exits and records whose fields moved by more than
+    # atol + rtol * |old| since the previous screen_delta() of the same query
+    async def screen_delta(self, session, screener_expr, fields=(), opt={}, rtol=0.0, atol=0.0):
+        from .screener_cache import query_key
+        from .screener_delta import DeltaTracker
+
+        query = self._to_query(screener_expr)
+        rv = await self.screen(session, query, opt)
+        if self._delta is None:
+            self._delta = DeltaTracker()
+        return self._delta.update(query_key(query, opt), rv, fields, rtol, atol)
+
+    # every region (narrowed by screener_expr if given), see universe.snapshot_universe()
+    async def snapshot_universe(self, session, screener_expr=None, regions=None, opt={}, shard_size=5000):
+        from .universe import REGIONS, snapshot_universe
+
+        query = None if screener_expr is None else self._to_query(screener_expr)
+        return await snapshot_universe(self, session, query, REGIONS if regions is None else regions, opt, shard_size)
+
+    # Pages (lists of records) as they arrive, nothing is kept after a page
+    # is consumed. The cache and checkpoint are bypassed.
+    async def iter_pages(self, session, screener_expr, opt={}):
+        query = self._to_query(screener_expr)
+        url = await self._screener_url(session)
+        for chunk in split_in_list(query, self.IN_CHUNK_SIZE):
+            async for stock_infos in self._iter_query_pages(session, url, chunk, opt):
+                yield stock_infos
+
+    # grouped summary of a screen, see aggregate.Aggregation
+    async def aggregate(self, session, screener_expr, group_by=(), aggregates=('count',), opt={}):
+        from .aggregate import Aggregation
+
+        aggregation = Aggregation(group_by, aggregates)
+        async for stock_infos in self.iter_pages(session, screener_expr, opt):
+            aggregation.update(stock_infos)
+        return aggregation
+
+    # approximate statistics from a random sample of pages, see
+    # sampling.sample_screen(); long 'in' lists are sampled per chunk
+    async def estimate(self, session, screener_expr, statistics, precision=0.02, confidence=0.95, opt={}, **kwargs):
+        from .sampling import sample_screen
+
+        query = self._to_query(screener_expr)
+        return await sample_screen(self, session, query, statistics, precision, confidence, opt, **kwargs)
+
+    # one request for the first record, the response carries the total. The
+    # chunks of a long 'in' list select disjoint records, their totals add up.
+    async def count(self, session, screener_expr, opt={}):
+        query = self._to_query(screener_expr)
+        url = await self._screener_url(session)
+
+        async def count_query(query):
+            payload = {**self._default_payload(query), **opt, "offset": 0, "size": 1}
+            headers, data = self._json_request(payload)
+            _, n_records = await self._fetch(session, url, headers, data, total=True, offset=0, size=1)
+            return n_records
+
+        counts = await asyncio.gather(*(count_query(q) for q in split_in_list(query, self.IN_CHUNK_SIZE)))
+        return sum(counts)
+
+    @property
+    def cache(self):
+        return self._cache
+
+    def _to_query(self, screener_expr):
+        # a query dict, e.g. from PreparedScreenerExpr.bind(), or a builder
+        # expression skips parsing
+        if isinstance(screener_expr, dict):
+            return screener_expr
+        if isinstance(screener_expr, Expr):
+            return screener_expr.to_dict()
+        if isinstance(screener_expr, (bytes, bytearray)):
+            return self._from_encoded(screener_expr, {})[0]
+        with phase('parse'):
+            query = parse_screener_expr(screener_expr)
+        return query
 
-        url = f"https://query1.finance.yahoo.com/v1/finance/screener?formatted=true&useRecordsResponse=true&lang=en-US&crumb={crumb}"
+    async def _screener_url(self, session):
+        with self._span('auth') if self._crumb is None else NULL_SPAN:
+            await self.cookie(session)
+            crumb = await self.crumb(session)
 
-        query = parse_screener_expr(screener_expr)
-        #print(query)
-        default_payload = {
+        self._url = f"{self.SCREENER_URL}?formatted=true&useRecordsResponse=true&lang=en-US&crumb={crumb}"
+        return self._url
+
+    # The chunks select disjoint records, so merging the sorted chunks by
+    # the sort field gives the unchunked screen's result and order.
+    async def _screen_chunks(self, session, url, queries, opt):
+        results = await asyncio.gather(*(self._screen_query(session, url, q, opt) for q in queries))
+
+        payload = {**self._default_payload(None), **opt}
+        sort_field = payload.get('sortField')
+        with phase('accumulate'):
+            if not sort_field:
+                return [stock_info for stock_infos in results for stock_info in stock_infos]
+            key = self.RECORD_KEYS.get(sort_field, sort_field)
+            descending = payload.get('sortType', 'desc') == 'desc'
+
+            # records without the field come last either way, as on the server
+            def sort_key(stock_info):
+                value = stock_info.get(key)
+                if isinstance(value, dict):
+                    value = value.get('raw')
+                if value is None:
+                    return (not descending, 0)
+                return (descending, value)
+
+            return list(heapq.merge(*results, key=sort_key, reverse=descending))
+
+    def _request_slots(self):
+        loop = asyncio.get_running_loop()
+        if self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.MAX_CONCURRENCY)
+            self._slots_loop = loop
+        return self._slots
+
+    def _default_payload(self, query):
+        return {
             "quoteType": "equity",
             "sortField": "intradaymarketcap",
             "sortType": "desc",
             "query": query,
         }
 
+    async def _screen_query(self, session, url, query, opt, text=None):
+        if self._checkpoint is not None:
+            return await self._screen_query_resumable(session, url, query, opt, text)
+
+        rv = []
+        async for stock_infos in self._iter_query_pages(session, url, query, opt, text):
+            with phase('accumulate'):
+                rv.extend(stock_infos)
+        return rv
+
+    async def _iter_query_pages(self, session, url, query, opt, text=None):
+        if text is None:
+            text = self._payload_text(query, opt)
+
         offset = 0
         size = self.MAX_ITEM
 
-        payload = {**default_payload, **opt, "offset": offset, "size": size}
-        headers, data = self._json_request(payload)
+        headers, data = self._page_request(text, offset, size)
 
-        rv, n_records = await self._fetch(
+        stock_infos, n_records = await self._fetch(
             session,
             url,
             headers,
             data,
-            total = True
+            total = True,
+            offset = offset,
+            size = size
         )
 
-        #print('n_records', n_records)
-
-        count = len(rv)
+        yield stock_infos
+        count = len(stock_infos)
         n_left = n_records - count
-        if n_left <= 0:
-            return rv
 
         offset = count
         size = min(n_left, self.MAX_ITEM)
-        while n_left > 0:
-            payload = {**default_payload, **opt, "offset": offset, "size": size}
-            headers, data = self._json_request(payload)
+        # an empty page means the total shrank while paging
+        while n_left > 0 and count:
+            headers, data = self._page_request(text, offset, size)
 
             stock_infos = await self._fetch(
                 session,
                 url,
                 headers,
                 data,
+                offset = offset,
+                size = size
             )
-            rv.extend(stock_infos)
+            yield stock_infos
             count = len(stock_infos)
             n_left -= count
             offset += count
             size = min(n_left, self.MAX_ITEM)
+
+    # Pages are requested at fixed offsets (multiples of MAX_ITEM) and saved
+    # as they complete, a rerun after a failure only fetches the missing ones.
+    async def _screen_query_resumable(self, session, url, query, opt, text=None):
+        from .checkpoint import crawl_fingerprint
+
+        checkpoint = self._checkpoint
+        fingerprint = crawl_fingerprint(query, opt)
+        n_records, pages = checkpoint.load(fingerprint)
+        if text is None:
+            text = self._payload_text(query, opt)
+
+        if n_records is None:
+            headers, data = self._page_request(text, 0, self.MAX_ITEM)
+            stock_infos, n_records = await self._fetch(
+                session,
+                url,
+                headers,
+                data,
+                total = True,
+                offset = 0,
+                size = self.MAX_ITEM
+            )
+            if len(stock_infos) != min(self.MAX_ITEM, n_records):
+                raise Exception(f'Short first page: {len(stock_infos)} records of {n_records}')
+            checkpoint.begin(fingerprint, n_records)
+            checkpoint.save_page(fingerprint, 0, stock_infos)
+            pages = {0: stock_infos}
+
+        for offset in range(0, n_records, self.MAX_ITEM):
+            if offset in pages:
+                continue
+            size = min(self.MAX_ITEM, n_records - offset)
+            headers, data = self._page_request(text, offset, size)
+
+            stock_infos, total = await self._fetch(
+                session,
+                url,
+                headers,
+                data,
+                total = True,
+                offset = offset,
+                size = size
+            )
+            # pages at fixed offsets only fit together while the total holds
+            if total != n_records or len(stock_infos) != size:
+                checkpoint.discard(fingerprint)
+                raise Exception(
+                    f'Result changed while crawling: {len(stock_infos)} of {size} records at offset {offset}, '
+                    f'total {total} instead of {n_records}; rerun to crawl again'
+                )
+            checkpoint.save_page(fingerprint, offset, stock_infos)
+            pages[offset] = stock_infos
+
+        rv = []
+        for offset in sorted(pages):
+            rv.extend(pages[offset])
+        checkpoint.discard(fingerprint)
         return rv
 
-#
-# parallel version but rate limit may cause failure
-# https://www.reddit.com/r/learnpython/comments/121oq0c/yahoo_fin_request_limit/
-#
-#    async def screen_parallel(self, session, screener_expr, opt={}):
-#        await self.cookie(session)
-#        crumb = await self.crumb(session)
-#
-#        url = f"https://query1.finance.yahoo.com/v1/finance/screener?formatted=true&useRecordsResponse=true&lang=en-US&crumb={crumb}"
-#
-#        query = parse_screener_expr(screener_expr)
-#        print(query)
-#        default_payload = {
-#            "quoteType": "equity",
-#            "sortField": "intradaymarketcap",
-#            "sortType": "desc",
-#            "query": query,
-#        }
-#
-#        n_records = -1
-#        n_left = 0
-#        offset = 0
-#        size = self.MAX_ITEM
-#
-#        #rv = []
-#
-#        payload = {**default_payload, **opt, "offset": offset, "size": size}
-#        headers, data = self._json_request(payload)
-#        rv, n_records = await self._fetch(
-#            session,
-#            url,
-#            headers,
-#            data,
-#            total=True
-#        )
-#
-#        #print('n_records', n_records)
-#
-#        offset = len(rv)
-#        n_left = n_records - offset
-#        if not n_left:
-#            return rv
-#
-#        tasks = []
-#        rounds = int((n_left+self.MAX_ITEM-1)/self.MAX_ITEM)
-#        #print('rounds', rounds)
-#
-#        #size = min(self.MAX_ITEM, n_left)
-#        for i in range(rounds):
-#            #print('offset', offset, 'size', size)
-#            payload = {**default_payload, **opt, "offset": offset, "size": size}
-#            headers, data = self._json_request(payload)
-#            tasks.append(self._fetch(session, url, headers, data))
-#
-#            offset += self.MAX_ITEM
-#
-#        results = await asyncio.gather(*tasks)
-#        for r in results:
-#            rv.extend(r)
-#        return rv
-
-    async def _fetch(self, session, url, headers, data, total=False):
-        async with session.post(
-            url,
-            headers=headers,
-            data=data
-        ) as resp:
-            resp.raise_for_status()
-            resp_body = await resp.json()
+    async def _fetch_page(self, session, url, query, opt, offset, size, total=False):
+        headers, data = self._page_request(self._payload_text(query, opt), offset, size)
+        return await self._fetch(session, url, headers, data, total=total, offset=offset, size=size)
+
+    async def _fetch(self, session, url, headers, data, total=False, offset=None, size=None):
+        with self._span('page', offset=offset, size=size) as page:
+            for attempt in range(self.MAX_RETRIES + 1):
+                # the crumb may have been renewed since url was built
+                if self._url is not None:
+                    url = self._url
+                if self._rate_limiter is not None:
+                    with self._span('ratelimit'), phase('ratelimit'):
+                        waited = await self._rate_limiter.acquire()
+                    if self._hooks:
+                        self._emit('ratelimit_wait_seconds', waited)
+                async with self._request_slots():
+                    with self._span('http', attempt=attempt) as http, phase('network'):
+                        async with session.post(
+                            url,
+                            headers=headers,
+                            data=data
+                        ) as resp:
+                            status = resp.status
+                            http.set(status=status)
+                            retry = attempt < self.MAX_RETRIES and status in (401, 429)
+                            if not retry:
+                                resp.raise_for_status()
+                                start = time.perf_counter() if self._hooks else None
+                                body = await resp.read()
+                                http.set(bytes=len(body))
+                                if self._hooks:
+                                    self._emit('http_body_seconds', time.perf_counter() - start, endpoint='screener')
+                                    self._emit('http_response_bytes', len(body), endpoint='screener')
+                                break
+                            retry_after = resp.headers.get('Retry-After')
+
+                if self._hooks:
+                    self._emit('retries_total', reason=str(status))
+
+                if status == 401:
+                    # expired crumb, get a new one unless another request already has
+                    if url == self._url:
+                        self._cookie = None
+                        self._crumb = None
+                        await self._screener_url(session)
+                else:
+                    try:
+                        delay = float(retry_after)
+                    except (TypeError, ValueError):
+                        delay = 0.5 * 2 ** attempt
+                    await asyncio.sleep(delay)
+
+            with self._span('decode'), phase('decode'):
+                start = time.perf_counter() if self._hooks else None
+                resp_body = json.loads(body)
+                if self._hooks:
+                    self._emit('decode_seconds', time.perf_counter() - start)
+
             error = resp_body.get('finance').get('error')
             if error:
                 raise Exception(f'Failed to retrieve data: {error}')
 
             stock_infos = resp_body.get('finance').get('result')[0].get('records')
-            #rv.extend(stock_infos)
-            #count = resp_body.get('finance').get('result')[0].get('count')
+            page.set(records=len(stock_infos))
 
             if total:
                 n_records = resp_body.get('finance').get('result')[0].get('total')
@@ -267,10 +524,11 @@ class YahooFClient:
 
             return stock_infos
 
-
 if __name__ == '__main__':
     from pprint import pprint
 
+    from aiohttp import ClientSession
+
     async def main():
         client = YahooFClient()
         #query = 'region=="kr" && sector=="Healthcare" && industry=="Drug Manufacturers—General"'